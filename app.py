@@ -1,3 +1,5 @@
+import os
+import logging
 import streamlit as st
 import pandas as pd
 from datetime import datetime
@@ -5,8 +7,31 @@ from st_keyup import st_keyup
 from matplotlib import pyplot as plt
 from streamlit_option_menu import option_menu
 import time
+import urllib.error
 import numpy as np
 import streamlit.components.v1 as components
+from dashboard.carrito import Carrito, ItemCarrito
+from dashboard.consultas import AGREGACIONES, OPERADORES, Consulta, Filtro, MotorConsultas
+from dashboard.datos import DatosSilver
+from dashboard.exportar import FORMATOS, exportar
+from dashboard.graficos import CacheGraficos
+from ml_developers.modelo import cargar_modelo
+from ml_developers.prediccion import UMBRAL_ABANDONO, PredictorCarrito
+from ml_developers.servidor import ClientePredictor
+from data_engineer.clientes import TABLA_CLIENTES, StoreClientes
+from data_engineer.silver import version_silver
+from data_engineer.gold import TABLA_PRODUCTOS, TABLA_TRANSACCIONES, ESTADO_CANCELADO, ESTADO_CONCRETADO, top_productos
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+PATH_GOLD = 'data/gold'
+PATH_CACHE = 'data/silver/_cache'
+PATH_MODELOS = 'ml_developers/modelos'
+FILAS_POR_PAGINA = [50, 100, 500, 1000]
+# Si esta definida, el carrito se predice con el servidor de inferencia (python -m ml_developers.servidor) en lugar de cargar el modelo
+PREDICTOR_URL = os.environ.get('PREDICTOR_URL')
+
+logger = logging.getLogger(__name__)
 
 st.set_page_config(page_title="Analisis de abandono de carrito", 
                    layout="centered",
@@ -15,40 +40,182 @@ st.set_page_config(page_title="Analisis de abandono de carrito",
                    
 
 @st.cache_resource
-def load_model():
+def load_predictor()->PredictorCarrito | ClientePredictor | None:
     """
+    Cargamos el modelo de abandono una sola vez por proceso (se comparte entre las sesiones).
+    Se entrena y se guarda desde ml_developers/Model_Final.ipynb o con python -m ml_developers.entrenamiento.
+    Si esta definida PREDICTOR_URL se usa el servidor de inferencia, que junta en lotes los carritos de todas las sesiones.
+    Returns:
+        PredictorCarrito | ClientePredictor | None: El predictor del carrito, o None si todavia no se entreno el modelo
+    """
+    if PREDICTOR_URL:
+        return ClientePredictor(PREDICTOR_URL)
+    try:
+        return PredictorCarrito(*cargar_modelo(PATH_MODELOS))
+    except FileNotFoundError:
+        return None
 
+predictor = load_predictor()
+
+def version_datos(*paths: str)->str | None:
+    """
+    Version de los datasets (un hash de los nombres, tamaños y fechas de sus archivos, ver version_silver).
+    Es solo un stat de cada archivo, asi que se calcula en cada rerun: cuando el ETL escribe algo nuevo
+    cambia la version, y las funciones cacheadas que la reciben vuelven a cargar los datos.
     Returns:
+        str | None: La version, o None si alguno de los datasets no existe
     """
-    modelo = "path" # cargar modelo como .pkl o .joblib
-    return modelo
+    try:
+        return version_silver(*paths)
+    except FileNotFoundError:
+        return None
 
-model = load_model()
+version_silver_actual = version_datos(PATH_CANCELADAS, PATH_CONCRETADAS)
+version_gold_actual = version_datos(f'{PATH_GOLD}/{TABLA_TRANSACCIONES}', f'{PATH_GOLD}/{TABLA_PRODUCTOS}')
+# La consulta avanzada puede leer cualquier tabla de gold, no solo las que carga el dashboard
+version_consultas_actual = f'{version_silver_actual}-{version_datos(PATH_GOLD)}'
+version_clientes_actual = version_datos(f'{PATH_GOLD}/{TABLA_CLIENTES}')
+
+# Una sola entrada: cuando cambia la version las sesiones pasan a los datos nuevos y los viejos se liberan
+@st.cache_resource(show_spinner=True, max_entries=1)
+def load_datos_silver(version: str | None)->DatosSilver:
+    """
+    Abrimos los datos de silver una sola vez por proceso y por version de silver. El objeto se comparte entre todas las sesiones
+    sin copiarse (st.cache_resource no serializa lo que devuelve), y la tabla esta mapeada en memoria
+    desde un archivo Arrow. No hay que modificar los dataframes que devuelve.
+    Args:
+        version (str | None): Version de silver (version_datos), None si no existe
+    Returns:
+        DatosSilver: Datos de silver con las vistas de canceladas, concretadas y ambas
+    """
+    if version is None:
+        raise FileNotFoundError('No existen los datasets de silver')
+    return DatosSilver.abrir(PATH_CANCELADAS, PATH_CONCRETADAS, PATH_CACHE, version)
 
-@st.cache_data(show_spinner=True)
 def load_data()->tuple[pd.DataFrame]:
     """
-    Cargamos los datos desde archivo parquet, y los dejamos en memoria
+    Cargamos los datos de silver, compartidos entre todas las sesiones (no hay que modificarlos).
     Returns:
         Tuple[pd.DataFrame]: Devuelve un tuple con 3 dataframes
     """
     try:
-        df_canceladas = pd.read_parquet('data/silver/transacciones_canceladas.parquet')
-        df_concretadas = pd.read_parquet('data/silver/transacciones_concretadas.parquet')
-        df_ambas = pd.concat([df_canceladas, df_concretadas])
+        datos = load_datos_silver(version_silver_actual)
     except FileNotFoundError:
         st.error("No se encontraron los archivos parquet en la carpeta data/silver")
-        return None, None, None
+        st.stop()
+    
+    # Si algun render modifico los dataframes compartidos, los volvemos a cargar en lugar de mostrar datos corruptos a otras sesiones
+    if not datos.sin_modificar():
+        logger.warning('Los dataframes compartidos de silver fueron modificados, se vuelven a cargar. Hay que trabajar sobre una copia, o agregar la columna en DatosSilver')
+        load_datos_silver.clear()
+        datos = load_datos_silver(version_silver_actual)
     
-    return df_canceladas, df_concretadas, df_ambas
+    return datos.canceladas, datos.concretadas, datos.ambas
 
 df_canceladas, df_concretadas, df_ambas = load_data()
 
+@st.cache_resource(max_entries=1)
+def load_productos(version: str | None)->dict:
+    """
+    ProductNo de cada ProductName (el primero que aparece en silver), para armar las lineas del carrito
+    con las mismas columnas que usa el modelo.
+    Args:
+        version (str | None): Version de silver (version_datos)
+    Returns:
+        dict: ProductName -> ProductNo
+    """
+    productos = load_datos_silver(version).ambas[['ProductName', 'ProductNo']].drop_duplicates('ProductName')
+    return dict(zip(productos['ProductName'].astype(str), productos['ProductNo'].astype(str)))
+
+@st.cache_data(show_spinner=True, max_entries=1)
+def load_gold(version: str | None)->tuple[pd.DataFrame]:
+    """
+    Cargamos las tablas agregadas de gold que usan los graficos. Son tablas chicas (por pais y mes),
+    asi que los graficos no dependen de la cantidad de transacciones.
+    Args:
+        version (str | None): Version de las tablas de gold (version_datos), None si no existen
+    Returns:
+        Tuple[pd.DataFrame]: Devuelve un tuple con la tabla de transacciones por pais y mes, y la de productos por pais
+    """
+    try:
+        df_transacciones = pd.read_parquet(f'{PATH_GOLD}/{TABLA_TRANSACCIONES}')
+        df_productos = pd.read_parquet(f'{PATH_GOLD}/{TABLA_PRODUCTOS}')
+    except FileNotFoundError:
+        st.error("No se encontraron las tablas de gold en la carpeta data/gold")
+        return None, None
+    
+    return df_transacciones, df_productos
+
+df_transacciones_gold, df_productos_gold = load_gold(version_gold_actual)
+
+@st.cache_resource(max_entries=1)
+def load_store_clientes(version: str | None)->StoreClientes | None:
+    """
+    Cargamos el store de features por cliente de gold (lo actualiza el ETL) una sola vez por version.
+    Args:
+        version (str | None): Version del store (version_clientes_actual), None si no existe
+    Returns:
+        StoreClientes | None: El store, o None si el ETL todavia no lo genero
+    """
+    if version is None:
+        return None
+    try:
+        return StoreClientes.abrir(f'{PATH_GOLD}/{TABLA_CLIENTES}')
+    except FileNotFoundError:
+        return None
+
+@st.cache_resource(max_entries=1)
+def load_motor_consultas(version: str)->MotorConsultas:
+    """
+    Motor de consultas sobre los parquet de silver y gold, compartido entre todas las sesiones (solo abre los datasets).
+    Los datasets listan sus archivos al abrirse, asi que el motor se vuelve a abrir cuando cambia la version.
+    Args:
+        version (str): Version de silver y de gold (version_consultas_actual)
+    Returns:
+        MotorConsultas: Motor de la consulta avanzada
+    """
+    return MotorConsultas.abrir(PATH_CANCELADAS, PATH_CONCRETADAS, PATH_GOLD)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def ejecutar_consulta(sql: str, version: str, _consulta: Consulta)->tuple:
+    """
+    Ejecuta una consulta avanzada. El resultado se guarda por el SQL de la consulta (que la describe completa)
+    y la version de silver y de gold, asi repetir una consulta (o cambiar de pagina) no vuelve a escanear los parquet,
+    y cuando el ETL escribe datos nuevos la consulta se vuelve a ejecutar.
+    Returns:
+        tuple: (resultado, segundos que tardo la consulta)
+    """
+    inicio = time.perf_counter()
+    resultado = load_motor_consultas(version).ejecutar(_consulta).to_pandas()
+    return resultado, time.perf_counter() - inicio
+
+@st.cache_resource
+def load_cache_graficos()->CacheGraficos:
+    """
+    Cache de graficos ya renderizados, compartida entre todas las sesiones.
+    Returns:
+        CacheGraficos: Cache LRU de imagenes de graficos
+    """
+    return CacheGraficos()
+
+def mostrar_grafico(id_grafico: str, dibujar, *parametros):
+    """
+    Muestra un grafico desde la cache de graficos. Solo se dibuja (con dibujar()) la primera vez que se pide
+    con esos parametros y esa version de los datos de silver y de gold.
+    Args:
+        id_grafico (str): Identificador del grafico
+        dibujar (Callable[[], Figure]): Funcion que crea la figura
+        parametros: Parametros que cambian el grafico
+    """
+    imagen = load_cache_graficos().render(id_grafico, parametros, f'{version_silver_actual}-{version_gold_actual}', dibujar)
+    st.image(imagen, use_column_width=True)
+
 global paises
 global opciones_paises
     
-paises = df_ambas['Country'].unique()
-opciones_paises = paises.tolist()
+# Los paises salen del indice de paises, sin recorrer el dataframe
+paises = load_datos_silver(version_silver_actual).paises
+opciones_paises = list(paises)
 opciones_paises.insert(0, 'Todos')
 
 col1, col2 = st.columns([4, 1])
@@ -132,41 +299,120 @@ match menu:
         col1,col2 = st.columns([1,1])
         with col1:
             opcion = st.selectbox('Selecciona un tipo de compra', ['Ambas','Canceladas','Concretadas'])
-        match opcion:
-            case 'Ambas':
-                df = df_ambas
-            case 'Canceladas':
-                df = df_canceladas
-            case 'Concretadas':
-                df = df_concretadas
-
 
         # Filtro de pais, DEFAULT: Todos
         with col2:
             pais = st.selectbox('Selecciona un país', opciones_paises, index=0)
 
-        if pais in opciones_paises and pais != 'Todos':
-            df = df[df['Country'] == pais]
+        # El filtro de pais usa el indice de paises: es un corte de las filas del pais, no un recorrido del dataframe
+        datos = load_datos_silver(version_silver_actual)
+        pais = pais if pais in opciones_paises and pais != 'Todos' else None
+        vista = opcion.lower()
+        df = datos.filtrar_pais(pais, vista)
 
         # Buscar transaccion especifica
         transaccion = st_keyup('Buscar Numero de transaccion',value='',debounce=500,key="1",placeholder='Buscar transaccion')
 
+        # La busqueda usa el indice de numeros de transaccion (construido al cargar los datos) en lugar de recorrer el dataframe
         if transaccion not in ['', None]:
-            df = df[df['TransactionNo'].str.contains(transaccion.upper())]
+            df = datos.buscar_transaccion(transaccion.upper(), vista, pais)
     
         
-        # Mostramos el df resultante
+        # Paginacion: solo se manda al navegador la pagina visible
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            filas_por_pagina = st.selectbox('Filas por pagina', FILAS_POR_PAGINA, index=1)
+        paginas = max(1, -(-len(df) // filas_por_pagina))
+        with col2:
+            pagina = st.number_input('Pagina', min_value=1, max_value=paginas, value=1, step=1)
+        inicio = (pagina - 1) * filas_por_pagina
+        with col3:
+            st.write('')
+            st.caption(f'Mostrando filas {min(inicio + 1, len(df)):,} - {min(inicio + filas_por_pagina, len(df)):,} de {len(df):,}')
+
+        # Mostramos la pagina del df resultante
         with st.spinner('Cargando...'):
-            st.dataframe(df)
+            st.dataframe(df.iloc[inicio:inicio + filas_por_pagina])
         
-        # Boton para descargar el dataframe resultante
+        # Descarga del dataframe resultante: el archivo se genera (por chunks) solo cuando se pide, y se guarda en la sesion
+        # mientras no cambien los filtros
         col1, col2, col3 = st.columns([1, 1, 1])
+        clave_exportacion = (vista, pais, transaccion)
 
         with col1:
-            st.download_button(label='Descargar CSV', data=df.to_csv(index=False), file_name='transacciones.csv', mime='text/csv',icon='⬇️')
+            formato = st.selectbox('Formato', list(FORMATOS.keys()), label_visibility='collapsed')
 
         with col2:
-            st.download_button(label='Descargar JSON', data=df.to_json(orient='records'), file_name='transacciones.json', mime='application/json', icon='⬇️')
+            if st.button('Generar archivo', icon='⚙️'):
+                with st.spinner('Generando archivo...'):
+                    st.session_state.exportacion = {'clave': clave_exportacion, 'formato': formato, 'datos': exportar(df, formato)}
+
+        exportacion = st.session_state.get('exportacion')
+        with col3:
+            if exportacion is not None and exportacion['clave'] == clave_exportacion and exportacion['formato'] == formato:
+                file_name, mime = FORMATOS[formato]
+                st.download_button(label=f'Descargar {formato}', data=exportacion['datos'], file_name=file_name, mime=mime, icon='⬇️')
+
+        # Consulta avanzada: filtros, agrupaciones y agregaciones que se ejecutan sobre los parquet de silver / gold
+        # (solo se leen las columnas y particiones que hacen falta), sin cargar las tablas enteras
+        with st.expander('Consulta avanzada', icon='🔎'):
+            motor = load_motor_consultas(version_consultas_actual)
+            tabla_consulta = st.selectbox('Tabla', motor.tablas, key='consulta-tabla')
+            esquema = motor.esquema(tabla_consulta)
+            columnas_tabla = esquema.names
+
+            cantidad_filtros = st.number_input('Cantidad de filtros', min_value=0, max_value=5, value=1, step=1, key='consulta-filtros')
+            filtros_texto = []
+            for i in range(cantidad_filtros):
+                col1, col2, col3 = st.columns([2, 1, 3])
+                columna = col1.selectbox('Columna', columnas_tabla, key=f'consulta-columna-{i}')
+                operador = col2.selectbox('Operador', OPERADORES, key=f'consulta-operador-{i}')
+                texto = col3.text_input('Valor', key=f'consulta-valor-{i}', help='Fechas como YYYY-MM-DD. Para "entre" y "en" separar los valores con comas')
+                if texto.strip():
+                    filtros_texto.append((columna, operador, texto))
+
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                agrupar = st.multiselect('Agrupar por', columnas_tabla, key='consulta-agrupar')
+            with col2:
+                columnas_agregadas = st.multiselect('Columnas a agregar', columnas_tabla, key='consulta-agregadas')
+            with col3:
+                funciones = st.multiselect('Agregaciones', list(AGREGACIONES), key='consulta-funciones')
+            contar_filas = st.checkbox('Contar filas', key='consulta-contar')
+            agregaciones = [(columna, funcion) for columna in columnas_agregadas for funcion in funciones]
+            if contar_filas:
+                agregaciones.append((None, 'cantidad'))
+
+            if agrupar or agregaciones:
+                columnas_resultado = agrupar + [f'{c}_{f}' if c is not None else 'cantidad_filas' for c, f in agregaciones]
+                columnas_consulta = None
+            else:
+                columnas_consulta = st.multiselect('Columnas', columnas_tabla, key='consulta-columnas', placeholder='Todas')
+                columnas_resultado = columnas_consulta or columnas_tabla
+
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                ordenar = st.selectbox('Ordenar por', [None] + columnas_resultado, key='consulta-ordenar')
+            with col2:
+                descendente = st.checkbox('Descendente', key='consulta-descendente')
+            with col3:
+                limite = st.number_input('Limite de filas', min_value=1, max_value=motor.filas_maximas, value=1000, step=100, key='consulta-limite')
+
+            try:
+                consulta = Consulta(
+                    tabla_consulta,
+                    filtros=[Filtro.desde_texto(columna, operador, texto, esquema.field(columna).type) for columna, operador, texto in filtros_texto],
+                    columnas=columnas_consulta, agrupar=agrupar, agregaciones=agregaciones,
+                    ordenar=ordenar, descendente=descendente, limite=limite
+                )
+                st.code(consulta.a_sql(), language='sql')
+                with st.spinner('Consultando...'):
+                    resultado, segundos = ejecutar_consulta(consulta.a_sql(), version_consultas_actual, consulta)
+            except ValueError as error:
+                st.error(str(error))
+            else:
+                st.caption(f'{len(resultado):,} filas en {segundos * 1000:,.0f} ms')
+                st.dataframe(resultado)
 
     case "Visualizaciones":
         
@@ -174,19 +420,23 @@ match menu:
         col1, col2 = st.columns([1, 1])
         with col1:   
             # Grafico de barras
-            fig, ax = plt.subplots()
-            df_canceladas['Country'].value_counts().plot(kind='bar', ax=ax)
-            ax.set_title('Transacciones Canceladas por país')
-            ax.set_xlabel('Paises')
+            def grafico_canceladas_por_pais():
+                fig, ax = plt.subplots()
+                df_gold = df_transacciones_gold[df_transacciones_gold['Estado'] == ESTADO_CANCELADO]
+                df_gold.groupby('Country')['Cantidad'].sum().sort_values(ascending=False).plot(kind='bar', ax=ax)
+                ax.set_title('Transacciones Canceladas por país')
+                ax.set_xlabel('Paises')
+                return fig
             # mostrar el grafico
-            st.pyplot(fig)
+            mostrar_grafico('canceladas_por_pais', grafico_canceladas_por_pais)
         with col2:
                 
             st.write("Este grafico muestra la cantidad de transacciones canceladas por país")
             with st.expander("Codigo"):
                 code = """
                         fig, ax = plt.subplots()
-                        df_canceladas['Country'].value_counts().plot(kind='bar', ax=ax)
+                        df_gold = df_transacciones_gold[df_transacciones_gold['Estado'] == ESTADO_CANCELADO]
+                        df_gold.groupby('Country')['Cantidad'].sum().sort_values(ascending=False).plot(kind='bar', ax=ax)
                         ax.set_title('Transacciones Canceladas por país')
                         ax.set_xlabel('Paises')
                     """
@@ -201,7 +451,8 @@ match menu:
             with st.expander("Codigo"):
                 code = """
                         fig, ax = plt.subplots()
-                        df_concretadas['Country'].value_counts().plot(kind='bar', ax=ax)
+                        df_gold = df_transacciones_gold[df_transacciones_gold['Estado'] == ESTADO_CONCRETADO]
+                        df_gold.groupby('Country')['Cantidad'].sum().sort_values(ascending=False).plot(kind='bar', ax=ax)
                         ax.set_title('Transacciones Concretadas por país')
                         ax.set_xlabel('Paises')
                         st.pyplot(fig)
@@ -210,12 +461,15 @@ match menu:
             
         with col2:
             # Grafico de barras
-            fig, ax = plt.subplots()
-            df_concretadas['Country'].value_counts().plot(kind='bar', ax=ax)
-            ax.set_title('Transacciones Concretadas por país')
-            ax.set_xlabel('Paises')
+            def grafico_concretadas_por_pais():
+                fig, ax = plt.subplots()
+                df_gold = df_transacciones_gold[df_transacciones_gold['Estado'] == ESTADO_CONCRETADO]
+                df_gold.groupby('Country')['Cantidad'].sum().sort_values(ascending=False).plot(kind='bar', ax=ax)
+                ax.set_title('Transacciones Concretadas por país')
+                ax.set_xlabel('Paises')
+                return fig
             # mostrar el grafico
-            st.pyplot(fig)
+            mostrar_grafico('concretadas_por_pais', grafico_concretadas_por_pais)
         
         st.divider()       
         
@@ -226,28 +480,19 @@ match menu:
         # Filtro de país
         pais_seleccionado = st.selectbox('Selecciona un país para ver los productos que mas generaron ganancias', opciones_paises)
 
-        # Filtrar el dataframe por el país seleccionado
-        if pais_seleccionado != 'Todos':
-            df = df_ambas[df_ambas['Country'] == pais_seleccionado]
-        else:
-            df = df_ambas
-        # Agrupar por producto y calcular la cantidad total comprada y el precio total
-        df_productos = df.groupby('ProductName').agg({'Quantity': 'sum', 'Price': 'sum'}).reset_index()
-
-        # Crear una nueva columna para el total recaudado (Cantidad * Precio)
-        df_productos['TotalRecaudado'] = df_productos['Quantity'] * df_productos['Price']
-
-        # Ordenar por TotalRecaudado y agarra los primeros 10
-        df_productos = df_productos.sort_values(by='TotalRecaudado', ascending=False).head(10)
-
-        with st.spinner('Cargando...'):
+        def grafico_top_productos():
+            # Los 10 productos con mas recaudado (Cantidad * Precio), a partir de la tabla de gold de productos por pais
+            df_productos = top_productos(df_productos_gold, None if pais_seleccionado == 'Todos' else pais_seleccionado)
             fig, ax = plt.subplots()
             df_productos_sorted = df_productos.sort_values(by='TotalRecaudado', ascending=True)
             ax.barh(df_productos_sorted['ProductName'], df_productos_sorted['TotalRecaudado']) 
             ax.set_title(f'Precio £ x Cantidad: Productos que mas recaudaron de {pais_seleccionado}')
             ax.set_xlabel('$ total recaudado')
             ax.set_ylabel('Producto')       
-            st.pyplot(fig)
+            return fig
+
+        with st.spinner('Cargando...'):
+            mostrar_grafico('top_productos', grafico_top_productos, pais_seleccionado)
         
         with st.expander("Codigo"):
                 code = """
@@ -268,29 +513,25 @@ match menu:
                  El gráfico muestra la cantidad de transacciones realizadas cada mes. Cada punto en la línea indica cuántas transacciones ocurrieron en un mes específico, 
                  y la línea conecta estos puntos para mostrar cómo cambian las transacciones con el tiempo. """)
         
-        df_ambas['Date'] = pd.to_datetime(df_ambas['Date'])
-        df_ambas['Month'] = df_ambas['Date'].dt.to_period('M')
-
-        # Contar transacciones por mes
-        transactions_per_month = df_ambas['Month'].value_counts().sort_index()
-
-        # Crear el gráfico
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.plot(transactions_per_month.index.astype(str), transactions_per_month, marker='o', color='orange')
-        ax.set_title("Transacciones por Mes")
-        ax.set_xlabel("Mes")
-        ax.set_ylabel("Cantidad de Transacciones")
-        ax.tick_params(axis='x', rotation=45)  # Rotar etiquetas del eje x
-        plt.tight_layout()  # Ajustar el layout
+        def grafico_transacciones_por_mes():
+            # Contar transacciones por mes
+            transactions_per_month = df_transacciones_gold.groupby('YearMonth')['Cantidad'].sum().sort_index()
+
+            # Crear el gráfico
+            fig, ax = plt.subplots(figsize=(12, 6))
+            ax.plot(transactions_per_month.index.astype(str), transactions_per_month, marker='o', color='orange')
+            ax.set_title("Transacciones por Mes")
+            ax.set_xlabel("Mes")
+            ax.set_ylabel("Cantidad de Transacciones")
+            ax.tick_params(axis='x', rotation=45)  # Rotar etiquetas del eje x
+            fig.tight_layout()  # Ajustar el layout
+            return fig
 
         # Mostrar el gráfico en Streamlit
-        st.pyplot(fig)
+        mostrar_grafico('transacciones_por_mes', grafico_transacciones_por_mes)
         with st.expander("Codigo"):
             code = """
-                    df_ambas['Date'] = pd.to_datetime(df_ambas['Date'])
-                    df_ambas['Month'] = df_ambas['Date'].dt.to_period('M')
-
-                    transactions_per_month = df_ambas['Month'].value_counts().sort_index()
+                    transactions_per_month = df_transacciones_gold.groupby('YearMonth')['Cantidad'].sum().sort_index()
 
                     fig, ax = plt.subplots(figsize=(12, 6))
                     ax.plot(transactions_per_month.index.astype(str), transactions_per_month, marker='o', color='orange')
@@ -308,26 +549,27 @@ match menu:
         col1, col2 = st.columns([1, 1])
         with col1:
             
-            df_ambas['Status'] = df_ambas['TransactionNo'].apply(lambda x: 'Cancelado' if str(x).startswith('C') else 'Concretado')            
-            transaction_counts = df_ambas['Status'].value_counts()
+            def grafico_concretadas_vs_canceladas():
+                transaction_counts = df_transacciones_gold.groupby('Estado')['Cantidad'].sum().sort_values(ascending=False)
 
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.bar(transaction_counts.index, transaction_counts.values, color=['green', 'red'])            
-            ax.set_title("Cantidad de Transacciones: Concretadas vs. Canceladas")
-            ax.set_xlabel("Estado de la Transacción")
-            ax.set_ylabel("Cantidad de Transacciones")
-            ax.set_xticks(transaction_counts.index)  
+                fig, ax = plt.subplots(figsize=(8, 6))
+                ax.bar(transaction_counts.index, transaction_counts.values, color=['green', 'red'])            
+                ax.set_title("Cantidad de Transacciones: Concretadas vs. Canceladas")
+                ax.set_xlabel("Estado de la Transacción")
+                ax.set_ylabel("Cantidad de Transacciones")
+                ax.set_xticks(transaction_counts.index)  
 
-            plt.tight_layout()
-            st.pyplot(fig)
+                fig.tight_layout()
+                return fig
+
+            mostrar_grafico('concretadas_vs_canceladas', grafico_concretadas_vs_canceladas)
         
         with col2:
             st.write("Este gráfico muestra la cantidad de transacciones concretadas y canceladas.")
             with st.expander("Codigo"):
                 code = """
             
-                    df_ambas['Status'] = df_ambas['TransactionNo'].apply(lambda x: 'Cancelado' if str(x).startswith('C') else 'Concretado')
-                    transaction_counts = df_ambas['Status'].value_counts()
+                    transaction_counts = df_transacciones_gold.groupby('Estado')['Cantidad'].sum().sort_values(ascending=False)
                     
                     fig, ax = plt.subplots(figsize=(8, 6))
 
@@ -351,16 +593,19 @@ match menu:
         with col1:
             producto_seleccionado = st.selectbox("Producto", df_ambas['ProductName'].unique())
 
-            df_producto = df_ambas[df_ambas['ProductName'] == producto_seleccionado]
-            
-            fig, ax = plt.subplots(figsize=(10, 6))
-            ax.hist(df_producto['Price'], bins=20, color='skyblue', edgecolor='black')
-            ax.set_title(f'Histograma de Precios: {producto_seleccionado}')
-            ax.set_xlabel('Precio')
-            ax.set_ylabel('Frecuencia')
-            ax.grid(axis='y', alpha=0.75)
-            plt.tight_layout()
-            st.pyplot(fig)
+            def grafico_histograma_precios():
+                df_producto = df_ambas[df_ambas['ProductName'] == producto_seleccionado]
+                
+                fig, ax = plt.subplots(figsize=(10, 6))
+                ax.hist(df_producto['Price'], bins=20, color='skyblue', edgecolor='black')
+                ax.set_title(f'Histograma de Precios: {producto_seleccionado}')
+                ax.set_xlabel('Precio')
+                ax.set_ylabel('Frecuencia')
+                ax.grid(axis='y', alpha=0.75)
+                fig.tight_layout()
+                return fig
+
+            mostrar_grafico('histograma_precios', grafico_histograma_precios, producto_seleccionado)
         
         with col2:
             st.write("Este gráfico muestra la distribución de precios para un producto seleccionado. Osea la cantidad de veces que se vendió un producto a un precio determinado.")
@@ -384,27 +629,26 @@ match menu:
         st.divider()
         
         # Grafico 7
-        df_canceladas['Date'] = pd.to_datetime(df_canceladas['Date'])
+        def grafico_canceladas_por_mes():
+            df_gold = df_transacciones_gold[df_transacciones_gold['Estado'] == ESTADO_CANCELADO]
+            transacciones_por_mes_canceladas = df_gold.groupby('YearMonth')['Cantidad'].sum()
 
-        df_canceladas['Month'] = df_canceladas['Date'].dt.to_period('M')
-        transacciones_por_mes_canceladas = df_canceladas.groupby('Month').size()
+            fig, ax = plt.subplots(figsize=(12, 6))
+            transacciones_por_mes_canceladas.plot(kind='bar', ax=ax, color='red')
 
-        fig, ax = plt.subplots(figsize=(12, 6))
-        transacciones_por_mes_canceladas.plot(kind='bar', ax=ax, color='red')
+            ax.set_title('Cantidad de Transacciones Canceladas por Mes')
+            ax.set_xlabel('Mes')
+            ax.set_ylabel('Cantidad de Transacciones Canceladas')
+            ax.set_xticklabels(transacciones_por_mes_canceladas.index.astype(str), rotation=45)
+            fig.tight_layout()
+            return fig
 
-        ax.set_title('Cantidad de Transacciones Canceladas por Mes')
-        ax.set_xlabel('Mes')
-        ax.set_ylabel('Cantidad de Transacciones Canceladas')
-        ax.set_xticklabels(transacciones_por_mes_canceladas.index.astype(str), rotation=45)
-        plt.tight_layout()
-        st.pyplot(fig)
+        mostrar_grafico('canceladas_por_mes', grafico_canceladas_por_mes)
         
         with st.expander("Codigo"):
             code = """
-                df_canceladas['Date'] = pd.to_datetime(df_canceladas['Date'])
-
-                df_canceladas['Month'] = df_canceladas['Date'].dt.to_period('M')
-                transacciones_por_mes_canceladas = df_canceladas.groupby('Month').size()
+                df_gold = df_transacciones_gold[df_transacciones_gold['Estado'] == ESTADO_CANCELADO]
+                transacciones_por_mes_canceladas = df_gold.groupby('YearMonth')['Cantidad'].sum()
 
                 fig, ax = plt.subplots(figsize=(12, 6))
                 transacciones_por_mes_canceladas.plot(kind='bar', ax=ax, color='red')
@@ -482,12 +726,15 @@ match menu:
                 'Precio Promedio': 0.027731145485730177
                 }
             
-            fig, ax = plt.subplots()
-            ax.bar(dict_importancia.keys(), dict_importancia.values())
-            ax.set_title('Peso de las caracteristicas a la hora de predecir')
-            ax.set_xlabel('Features')
-            ax.set_ylabel('Importancia')
-            st.pyplot(fig)
+            def grafico_importancia():
+                fig, ax = plt.subplots()
+                ax.bar(dict_importancia.keys(), dict_importancia.values())
+                ax.set_title('Peso de las caracteristicas a la hora de predecir')
+                ax.set_xlabel('Features')
+                ax.set_ylabel('Importancia')
+                return fig
+
+            mostrar_grafico('importancia_caracteristicas', grafico_importancia)
         
         
         st.divider()
@@ -495,100 +742,6 @@ match menu:
         st.html(
             "<h3 style='text-align: center; color: #1c95cd;'>Simulacion de carrito de compras</h3>"
         )
-        class Carrito:
-            """
-                Clase que representa un carrito de compras, con metodos para agregar, eliminar y obtener los items del carrito
-            """
-            def __init__(self):
-                self.__carrito = []
-
-            def vaciar_carrito(self):
-                self.__carrito = []
-                
-            def agregar_item(self, item: 'ItemCarrito'):
-                if not isinstance(item, ItemCarrito):
-                    raise ValueError("El item debe ser una instancia de la clase ItemCarrito")
-                self.__carrito.append(item)
-            
-            def eliminar_item(self, item: 'ItemCarrito'):
-                if not isinstance(item, ItemCarrito):
-                    raise ValueError("El item debe ser una instancia de la clase ItemCarrito")
-                if item in self.__carrito:
-                    self.__carrito.remove(item)
-            
-            def obtener_carrito(self):
-                return self.__carrito
-
-            def calcular_total_precio(self):
-                total = 0
-                for item in self.__carrito:
-                    total += item.calcular_total()
-                return total 
-            
-            def calcular_cantidad_total(self):
-                total = 0
-                for item in self.__carrito:
-                    total += item.cantidad
-                return total
-            
-            def predecir_carrito(self):
-                """
-                Simula un modelo de ML para predecir si el carrito va a ser concretado
-                """
-                # TODO - Implementar modelo de ML para predecir si el carrito va a ser concretado
-                cantidad_total = self.calcular_cantidad_total()
-                precio_total = self.calcular_total_precio()
-                
-                st.write(f"Total de productos: {cantidad_total}")
-                st.write(f"Total de precio: £{precio_total:,.2f}")
-                
-                # Simulación de predicción basada en la importancia de las características
-                importancia_cantidad = dict_importancia['Cantidad']
-                importancia_precio = dict_importancia['Precio']
-                importancia_pais = dict_importancia['Pais']
-                importancia_precio_promedio = dict_importancia['Precio Promedio']
-
-                # Calcular el precio promedio
-                precio_promedio = precio_total / cantidad_total if cantidad_total > 0 else 0
-
-                # Simulación de un umbral de decisión
-                umbral = 0.5
-
-                
-                puntuacion = (
-                    (cantidad_total * importancia_cantidad) +
-                    (precio_total * importancia_precio) +
-                    (importancia_pais) +  # Asumimos que el país tiene un valor constante
-                    (precio_promedio * importancia_precio_promedio)
-                )
-
-                
-                puntuacion_normalizada = puntuacion / (importancia_cantidad + importancia_precio + importancia_pais + importancia_precio_promedio)
-
-                # Comparar la puntuación normalizada con el umbral
-                if puntuacion_normalizada > umbral:
-                    return False
-                
-                return True
-            
-        class ItemCarrito:
-            """
-            Clase que representa un item en el carrito de compras
-            """
-            def __init__(self, producto,cantidad, precio_unitario, pais):
-                self.producto = producto
-                self.cantidad = cantidad
-                self.precio_unitario = precio_unitario
-                self.pais = pais
-                
-            def __str__(self):
-                total = self.precio_unitario * self.cantidad
-                return f"{self.producto} ({self.pais}) - {self.cantidad} unidades x £{self.precio_unitario:,.2f}/u = £{total:,.2f}"
-                
-            def calcular_total(self):
-                return item.cantidad * item.precio_unitario
-        
-            
         if not 'carrito' in st.session_state:
             st.session_state.carrito = Carrito()
             
@@ -603,24 +756,54 @@ match menu:
                 producto_seleccionado = st.selectbox("Producto", df_ambas['ProductName'].unique())
                 cantidad_productos = st.number_input("Cantidad de Productos", min_value=1, max_value=10000)
                 precio_unitario = st.number_input("Precio x Unidad", min_value=1, max_value=10000)
-                pais_seleccionado = st.selectbox("Pais", df_ambas['Country'].unique())
+                pais_seleccionado = st.selectbox("Pais", paises)
                 
-                item = ItemCarrito(producto_seleccionado,cantidad_productos, precio_unitario, pais_seleccionado)
+                item = ItemCarrito(producto_seleccionado,cantidad_productos, precio_unitario, pais_seleccionado, load_productos(version_silver_actual).get(producto_seleccionado))
                 
                 if st.form_submit_button("Agregar al carrito",icon='🛒',):
                     st.session_state.carrito.agregar_item(item)
             
+            cliente = st.number_input("Cliente (CustomerNo, opcional)", min_value=0, value=0, step=1)
+            
             if st.button("Predecir carrito", key="predict",type='primary'):
                 if len(st.session_state.carrito.obtener_carrito()) == 0:
                     st.error("No hay productos en el carrito")
+                elif predictor is None:
+                    st.error("Todavia no hay un modelo entrenado en ml_developers/modelos")
                 else:   
                     
-                    if st.session_state.carrito.predecir_carrito():
-                        st.success("El carrito va a ser concretado")
+                    carrito = st.session_state.carrito
+                    st.write(f"Total de productos: {carrito.calcular_cantidad_total()}")
+                    st.write(f"Total de precio: £{carrito.calcular_total_precio():,.2f}")
+                    try:
+                        probabilidad = predictor.predecir(carrito.lineas())
+                    except urllib.error.HTTPError as error:
+                        # El servidor respondio pero rechazo el pedido (400) o fallo al predecir (500): HTTPError es un
+                        # OSError, asi que va antes para no mostrarlo como un problema de conexion
+                        st.error(f"El servidor de inferencia respondio {error.code}: {ClientePredictor.mensaje_error(error)}")
+                    except OSError:
+                        # Solo pasa con el servidor de inferencia (PREDICTOR_URL), el carrito no se vacia
+                        st.error(f"No se pudo conectar con el servidor de inferencia en {PREDICTOR_URL}")
                     else:
-                        st.error("El carrito no va a ser concretado")
+                        if probabilidad <= UMBRAL_ABANDONO:
+                            st.success(f"El carrito va a ser concretado (probabilidad de abandono: {probabilidad:.0%})")
+                        else:
+                            st.error(f"El carrito no va a ser concretado (probabilidad de abandono: {probabilidad:.0%})")
                         
-                    st.session_state.carrito.vaciar_carrito()
+                        # Historial del cliente en el store de gold
+                        store_clientes = load_store_clientes(version_clientes_actual)
+                        historial = store_clientes.buscar(cliente) if cliente and store_clientes is not None else None
+                        if historial is not None:
+                            st.caption(
+                                f"Cliente {cliente}: {historial['transacciones']} compras, "
+                                f"{historial['tasa_cancelacion']:.0%} de transacciones canceladas, "
+                                f"ticket promedio £{historial['ticket_promedio']:,.2f}, "
+                                f"ultima compra hace {historial['recencia_dias']:.0f} dias"
+                            )
+                        elif cliente:
+                            st.caption(f"El cliente {cliente} no tiene historial")
+                            
+                        st.session_state.carrito.vaciar_carrito()
                        
         with col2:
             with st.container(height=480,border=None):
@@ -636,16 +819,18 @@ match menu:
                     "<h4 style='text-align: center; color: #1c95cd;'>Carrito de compras </h4>"
                 )
                 
-                if st.session_state.carrito.obtener_carrito():
-                    carrito = st.session_state.carrito.obtener_carrito()
-                        
-                            
-                    for index, item in enumerate(carrito, start=1):
-                        st.write(f'<div class="texto-blanco">{index}. {item}</div>', unsafe_allow_html=True)
+                if len(st.session_state.carrito):
+                    for index, (clave, item) in enumerate(st.session_state.carrito.obtener_items(), start=1):
+                        col_item, col_quitar = st.columns([6,1])
+                        col_item.write(f'<div class="texto-blanco">{index}. {item}</div>', unsafe_allow_html=True)
+                        # La clave del item (y no su posicion) identifica el boton entre reruns
+                        if col_quitar.button("", key=f"quitar-{clave}", icon='❌'):
+                            st.session_state.carrito.eliminar_item(clave)
+                            st.rerun()
                             
                     st.divider()   
-                        
-                    df = pd.DataFrame(carrito)
+                    st.write(f'<div class="texto-blanco">Total: {st.session_state.carrito.calcular_cantidad_total()} unidades, '
+                             f'£{st.session_state.carrito.calcular_total_precio():,.2f}</div>', unsafe_allow_html=True)
             if st.button("Limpiar Carrito", key="limpiar",icon='🗑️'):
                         st.session_state.carrito.vaciar_carrito()           
             
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Generador de carga para el servidor de inferencia (ml_developers/servidor.py): N clientes concurrentes, cada uno
+con una conexion keep-alive, mandan carritos reales de silver a POST /predecir. Al final se reportan el throughput,
+los percentiles de latencia vistos por los clientes y las metricas del servidor (tamaños de lote y cola).
+
+Uso (desde la raiz del repo, con el servidor corriendo):
+    python -m ml_developers.servidor --puerto 8502 &
+    python -m benchmarks.carga_predictor --url http://127.0.0.1:8502 --clientes 1 16 64 --pedidos 2000
+
+Con --lineas-por-carrito N, en lugar de transacciones de silver se mandan carritos armados con N lineas al azar
+(Carrito.aleatorio del dashboard), para medir el servidor con carritos mas grandes que los reales.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.carrito import Carrito
+from ml_developers.modelo import leer_lineas
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+URL_DEFAULT = 'http://127.0.0.1:8502'
+CARRITOS_DEFAULT = 1000
+SEMILLA = 42
+
+
+def muestrear_carritos(cantidad: int, semilla: int = SEMILLA) -> list:
+    """
+    Toma transacciones al azar de silver y las devuelve como carritos (listas de lineas) para mandar al servidor.
+    """
+    lineas = leer_lineas(PATH_CANCELADAS, PATH_CONCRETADAS)
+    transacciones = lineas['TransactionNo'].unique()
+    elegidas = set(np.random.default_rng(semilla).choice(np.asarray(transacciones), min(cantidad, len(transacciones)), replace=False))
+    lineas = lineas[lineas['TransactionNo'].isin(elegidas)]
+    columnas = ['ProductNo', 'ProductName', 'Country', 'Price', 'Quantity']
+    return [grupo[columnas].astype({'ProductNo': str, 'ProductName': str, 'Country': str}).to_dict('records')
+            for _, grupo in lineas.groupby('TransactionNo', observed=True)]
+
+
+def carritos_aleatorios(cantidad: int, lineas_por_carrito: int, semilla: int = SEMILLA) -> list:
+    """
+    Carritos sinteticos de lineas_por_carrito lineas, con los productos y paises de silver.
+    """
+    lineas = leer_lineas(PATH_CANCELADAS, PATH_CONCRETADAS)
+    productos = dict(zip(lineas['ProductName'].astype(str), lineas['ProductNo'].astype(str)))
+    paises = sorted(lineas['Country'].astype(str).unique())
+    return [Carrito.aleatorio(lineas_por_carrito, productos, paises, semilla + i).lineas() for i in range(cantidad)]
+
+
+async def _cliente(host: str, puerto: int, cuerpos: list, indices, latencias: list):
+    reader, writer = await asyncio.open_connection(host, puerto)
+    try:
+        for i in indices:
+            cuerpo = cuerpos[i]
+            inicio = time.perf_counter()
+            writer.write(
+                f'POST /predecir HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(cuerpo)}\r\n\r\n'.encode('ascii') + cuerpo
+            )
+            await writer.drain()
+            estado = await reader.readline()
+            largo = 0
+            while (linea := await reader.readline()) not in (b'\r\n', b''):
+                nombre, _, valor = linea.decode('latin-1').partition(':')
+                if nombre.strip().lower() == 'content-length':
+                    largo = int(valor)
+            await reader.readexactly(largo)
+            if b' 200 ' not in estado:
+                raise RuntimeError(f'Respuesta inesperada del servidor: {estado!r}')
+            latencias.append(time.perf_counter() - inicio)
+    finally:
+        writer.close()
+
+
+async def generar_carga(url: str, carritos: list, clientes: int, pedidos: int) -> dict:
+    """
+    Manda pedidos carritos (repetidos en orden) repartidos entre clientes conexiones concurrentes.
+
+    Returns:
+        dict: clientes, pedidos, segundos, pedidos por segundo y latencia p50 / p99 en ms
+    """
+    destino = urllib.parse.urlsplit(url)
+    cuerpos = [json.dumps({'lineas': carrito}).encode('utf-8') for carrito in carritos]
+    latencias = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        _cliente(destino.hostname, destino.port, cuerpos, (i % len(cuerpos) for i in range(c, pedidos, clientes)), latencias)
+        for c in range(clientes)
+    ])
+    segundos = time.perf_counter() - inicio
+    latencias = np.array(latencias) * 1000
+    return {
+        'clientes': clientes,
+        'pedidos': len(latencias),
+        'segundos': segundos,
+        'pedidos_por_segundo': len(latencias) / segundos,
+        'latencia_p50_ms': float(np.percentile(latencias, 50)),
+        'latencia_p99_ms': float(np.percentile(latencias, 99))
+    }
+
+
+def metricas_servidor(url: str) -> dict:
+    with urllib.request.urlopen(f'{url.rstrip("/")}/metricas', timeout=5) as respuesta:
+        return json.loads(respuesta.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera carga concurrente contra el servidor de inferencia del modelo de abandono')
+    parser.add_argument('--url', default=URL_DEFAULT, help='URL del servidor')
+    parser.add_argument('--clientes', type=int, nargs='+', default=[1, 16, 64], help='Cantidad de clientes concurrentes (una corrida por valor)')
+    parser.add_argument('--pedidos', type=int, default=2000, help='Pedidos por corrida')
+    parser.add_argument('--carritos', type=int, default=CARRITOS_DEFAULT, help='Cantidad de transacciones de silver que se usan como carritos')
+    parser.add_argument('--lineas-por-carrito', type=int, default=None, help='Manda carritos sinteticos con esta cantidad de lineas')
+    args = parser.parse_args()
+
+    if args.lineas_por_carrito:
+        carritos = carritos_aleatorios(args.carritos, args.lineas_por_carrito)
+    else:
+        carritos = muestrear_carritos(args.carritos)
+    for clientes in args.clientes:
+        antes = metricas_servidor(args.url)
+        resultado = asyncio.run(generar_carga(args.url, carritos, clientes, args.pedidos))
+        despues = metricas_servidor(args.url)
+        lotes = despues['lotes'] - antes['lotes']
+        print(f'{clientes:>4} clientes: {resultado["pedidos_por_segundo"]:>8,.0f} pedidos/s   '
+              f'latencia p50 {resultado["latencia_p50_ms"]:>7.2f} ms   p99 {resultado["latencia_p99_ms"]:>7.2f} ms   '
+              f'{resultado["pedidos"] / max(lotes, 1):>5.1f} carritos por lote   cola maxima {despues["cola_maxima"]}')
+    print(json.dumps(metricas_servidor(args.url), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark de la consulta avanzada del dashboard: MotorConsultas (escaneo de los parquet con los filtros y las columnas
+empujados, en varios threads) contra mascaras booleanas y groupby de pandas sobre los dataframes ya cargados en memoria,
+con los datos de silver repetidos N veces.
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.consultas --escalas 1 10
+
+Los datos escalados se escriben una vez en un directorio temporal con el mismo particionado que silver (YearMonth / Country).
+Para pandas se reporta aparte lo que tarda cargar los dataframes, que el motor no necesita.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pyarrow.dataset as ds
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.consultas import Consulta, Filtro, MotorConsultas
+from data_engineer.silver import COLUMNAS_SILVER, ESQUEMA_PARTICION, concatenar_silver, leer_silver
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+REPETICIONES_DEFAULT = 3
+
+# Cada consulta: (nombre, Consulta del motor, la misma consulta con pandas sobre el dataframe de ambas)
+CONSULTAS = [
+    (
+        'rango de fechas + cantidad',
+        Consulta('transacciones', [Filtro('Date', 'entre', ('2019-06-01', '2019-08-31')), Filtro('Quantity', '>=', 12)],
+                 columnas=['TransactionNo', 'Date', 'ProductName', 'Quantity', 'CustomerNo']),
+        lambda df: df.loc[(df['Date'] >= '2019-06-01') & (df['Date'] < '2019-09-01') & (df['Quantity'] >= 12),
+                          ['TransactionNo', 'Date', 'ProductName', 'Quantity', 'CustomerNo']]
+    ),
+    (
+        'importe por producto',
+        Consulta('transacciones', [Filtro('Estado', '=', 'Concretado')], agrupar=['ProductName'],
+                 agregaciones=[('Importe', 'suma')], ordenar='Importe_suma', descendente=True, limite=20),
+        lambda df: df[~df['TransactionNo'].str.startswith('C')].assign(Importe=lambda d: d['Price'] * d['Quantity'])
+                   .groupby('ProductName', observed=True)['Importe'].sum().nlargest(20)
+    ),
+    (
+        'clientes de un pais',
+        Consulta('transacciones', [Filtro('Country', '=', 'France')], agrupar=['CustomerNo'],
+                 agregaciones=[('TransactionNo', 'distintos'), ('Quantity', 'suma')]),
+        lambda df: df[df['Country'] == 'France'].groupby('CustomerNo').agg(
+            transacciones=('TransactionNo', 'nunique'), unidades=('Quantity', 'sum'))
+    ),
+]
+
+
+def _medir(funcion, repeticiones: int) -> tuple:
+    """
+    Ejecuta funcion varias veces y devuelve (mediana en segundos, resultado de la ultima ejecucion).
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos)), resultado
+
+
+def escribir_escalado(path_origen: str, path_destino: str, escala: int):
+    """
+    Escribe el dataset de silver repetido escala veces, particionado como silver.
+    """
+    origen = ds.dataset(path_origen, format='parquet', partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive'))
+    tabla = origen.to_table(columns=COLUMNAS_SILVER + ['YearMonth'])
+    ds.write_dataset(
+        [tabla] * escala, path_destino, schema=tabla.schema, format='parquet',
+        partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive'), max_partitions=4096,
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+
+def correr(escala: int, repeticiones: int, directorio: str) -> list:
+    path_canceladas, path_concretadas = PATH_CANCELADAS, PATH_CONCRETADAS
+    if escala > 1:
+        path_canceladas = os.path.join(directorio, f'canceladas-{escala}')
+        path_concretadas = os.path.join(directorio, f'concretadas-{escala}')
+        escribir_escalado(PATH_CANCELADAS, path_canceladas, escala)
+        escribir_escalado(PATH_CONCRETADAS, path_concretadas, escala)
+
+    tiempo_carga, df = _medir(lambda: concatenar_silver([leer_silver(path_canceladas), leer_silver(path_concretadas)]), 1)
+    print(f'Escala {escala}x: {len(df):,} lineas, cargar los dataframes para pandas: {tiempo_carga * 1000:,.0f} ms')
+
+    motor = MotorConsultas.abrir(path_canceladas, path_concretadas, directorio)
+    resultados = []
+    for nombre, consulta, con_pandas in CONSULTAS:
+        tiempo_pandas, esperado = _medir(lambda: con_pandas(df), repeticiones)
+        tiempo_motor, obtenido = _medir(lambda: motor.ejecutar(consulta), repeticiones)
+        assert obtenido.num_rows == len(esperado), f'{nombre}: {obtenido.num_rows} filas, pandas {len(esperado)}'
+        print(f'  {nombre:<28} pandas {tiempo_pandas * 1000:>8.1f} ms   motor {tiempo_motor * 1000:>8.1f} ms   {obtenido.num_rows:>8,} filas')
+        resultados.append({'escala': escala, 'consulta': nombre, 'pandas_ms': tiempo_pandas * 1000, 'motor_ms': tiempo_motor * 1000})
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara la consulta avanzada (escaneo de parquet) contra pandas sobre los dataframes en memoria')
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10], help='Cantidad de veces que se repiten los datos de silver')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_DEFAULT, help='Repeticiones por medicion (se reporta la mediana)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for escala in args.escalas:
+            correr(escala, args.repeticiones, directorio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark del ETL en paralelo: tiempo de pared de procesar_bronze (escritura de silver + tablas de gold) con 1 worker
+(el recorrido serial de siempre) contra 2, 4 y 8 workers, dentro de un flow de Prefect con el mismo task runner que etl.
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.etl_paralelo --csv data/bronze/transactions.csv --workers 1 2 4 8 --chunksize 100000
+
+Cada corrida escribe silver y gold en un directorio temporal, no toca data/. Con --escala N el csv se repite N veces.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from prefect import flow
+from prefect.task_runners import ThreadPoolTaskRunner
+from data_engineer import main as etl
+
+
+def escalar_csv(path: str, escala: int, directorio: str) -> str:
+    if escala == 1:
+        return path
+    df = pd.read_csv(path, dtype=str)
+    path_escalado = os.path.join(directorio, f'bronze-{escala}x.csv')
+    pd.concat([df] * escala, ignore_index=True).to_csv(path_escalado, index=False)
+    return path_escalado
+
+
+@flow(name='benchmark-etl-paralelo', task_runner=ThreadPoolTaskRunner())
+def correr(path_csv: str, directorio: str, workers: int, chunksize: int | None, path_modelos: str) -> float:
+    inicio = time.perf_counter()
+    etl.procesar_bronze(
+        path_csv, chunksize, workers=workers,
+        path_canceladas=os.path.join(directorio, 'silver', 'transacciones_canceladas.parquet'),
+        path_concretadas=os.path.join(directorio, 'silver', 'transacciones_concretadas.parquet'),
+        path_gold=os.path.join(directorio, 'gold'),
+        path_modelos=path_modelos
+    )
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara el tiempo del ETL (silver + gold) con distintas cantidades de workers')
+    parser.add_argument('--csv', default='data/bronze/transactions.csv', help='csv de bronze')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Cantidades de workers (una corrida por valor)')
+    parser.add_argument('--chunksize', type=int, default=None, help='Procesar el csv en chunks de esta cantidad de filas')
+    parser.add_argument('--escala', type=int, default=1, help='Cantidad de veces que se repite el csv')
+    parser.add_argument('--modelos', default='ml_developers/modelos', help='Directorio del modelo (si no hay, no se puntua)')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} cores')
+    with tempfile.TemporaryDirectory() as directorio:
+        path_csv = escalar_csv(args.csv, args.escala, directorio)
+        tiempos = {}
+        for workers in args.workers:
+            tiempos[workers] = correr(path_csv, os.path.join(directorio, f'w{workers}'), workers, args.chunksize, args.modelos)
+            print(f'{workers:>3} workers: {tiempos[workers]:>7.2f} s   x{tiempos[args.workers[0]] / tiempos[workers]:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark de los agregados por transaccion: el groupby(...).agg con nunique que usaba Model_Final.ipynb
+contra agregados_por_transaccion (una sola pasada ordenada con np.add.reduceat), sobre los datos de silver repetidos N veces.
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.features_transaccion --escalas 1 10
+
+Cada copia de los datos tiene TransactionNo distintos (con un sufijo), asi la cantidad de transacciones crece con la escala.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_developers.features import COLUMNAS_NUMERICAS, agregados_por_transaccion
+from ml_developers.modelo import leer_lineas
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+COLUMNAS = ['TransactionNo', 'ProductNo', 'Price', 'Quantity']
+REPETICIONES_DEFAULT = 3
+
+
+def _medir(funcion, repeticiones: int) -> tuple:
+    """
+    Ejecuta funcion varias veces y devuelve (mediana en segundos, resultado de la ultima ejecucion).
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos)), resultado
+
+
+def agregados_groupby(lineas: pd.DataFrame) -> pd.DataFrame:
+    """
+    La version anterior del notebook: marca las canceladas, pasa Quantity a valor absoluto y agrupa con pandas.
+    """
+    lineas = lineas.assign(
+        Quantity=lineas['Quantity'].abs(),
+        Abandonado=lineas['TransactionNo'].str.startswith('C').astype(int)
+    )
+    return lineas.groupby('TransactionNo').agg(
+        total_quantity=('Quantity', 'sum'),
+        unique_products=('ProductNo', 'nunique'),
+        total_price=('Price', 'sum'),
+        average_price=('Price', 'mean'),
+        Abandonado=('Abandonado', 'max')
+    ).reset_index()
+
+
+def preparar(escala: int) -> pd.DataFrame:
+    lineas = leer_lineas(PATH_CANCELADAS, PATH_CONCRETADAS)[COLUMNAS]
+    lineas['TransactionNo'] = lineas['TransactionNo'].astype(str)
+    if escala == 1:
+        return lineas
+    copias = []
+    for i in range(escala):
+        copia = lineas.copy()
+        copia['TransactionNo'] = copia['TransactionNo'] + f'-{i}'
+        copias.append(copia)
+    return pd.concat(copias, ignore_index=True)
+
+
+def correr(escala: int, repeticiones: int) -> dict:
+    lineas = preparar(escala)
+    tiempo_groupby, esperado = _medir(lambda: agregados_groupby(lineas), repeticiones)
+    tiempo_reduceat, obtenido = _medir(lambda: agregados_por_transaccion(lineas), repeticiones)
+
+    assert (esperado['TransactionNo'].to_numpy() == obtenido['TransactionNo'].to_numpy()).all(), 'Transacciones distintas'
+    for columna in COLUMNAS_NUMERICAS + ['Abandonado']:
+        assert np.allclose(esperado[columna].to_numpy(dtype=np.float64), obtenido[columna].to_numpy(dtype=np.float64), rtol=1e-5), f'{columna} distinta'
+
+    print(f'Escala {escala}x: {len(lineas):>12,} lineas {len(obtenido):>10,} transacciones   groupby {tiempo_groupby * 1000:>9.1f} ms   '
+          f'reduceat {tiempo_reduceat * 1000:>9.1f} ms   x{tiempo_groupby / tiempo_reduceat:.1f}')
+    return {'escala': escala, 'lineas': len(lineas), 'groupby_ms': tiempo_groupby * 1000, 'reduceat_ms': tiempo_reduceat * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara los agregados por transaccion con groupby contra la pasada ordenada con reduceat')
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10], help='Cantidad de veces que se repiten los datos de silver')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_DEFAULT, help='Repeticiones por medicion (se reporta la mediana)')
+    args = parser.parse_args()
+
+    for escala in args.escalas:
+        correr(escala, args.repeticiones)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark del filtro por pais: mascara booleana (df[df['Country'] == pais]) contra el indice de paises
+(IndicePaises + cortes de filas), sobre los datos de silver repetidos N veces.
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.filtro_pais --escalas 1 10 100
+
+Para que la escala 100 entre en memoria solo se cargan algunas columnas (--columnas), el costo de los dos
+enfoques crece igual con la cantidad de columnas.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.busqueda import IndicePaises
+from dashboard.datos import _leer_dataset, cortar, ordenar_por_pais
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+COLUMNAS_DEFAULT = ['Country', 'Price', 'Quantity', 'CustomerNo']
+REPETICIONES_DEFAULT = 5
+
+
+def _medir(funcion, repeticiones: int) -> tuple:
+    """
+    Ejecuta funcion varias veces y devuelve (mediana en segundos, resultado de la ultima ejecucion).
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos)), resultado
+
+
+def preparar(escala: int, columnas: list) -> tuple:
+    """
+    Arma el dataframe de silver repetido escala veces, con el mismo layout que el cache del dashboard
+    (canceladas primero, cada bloque ordenado por pais).
+
+    Returns:
+        tuple: (dataframe, cantidad de filas canceladas)
+    """
+    bloques = []
+    for path in [PATH_CANCELADAS, PATH_CONCRETADAS]:
+        tabla = _leer_dataset(path).select(columnas)
+        bloques.append(ordenar_por_pais(pa.concat_tables([tabla] * escala)))
+    tabla = pa.concat_tables(bloques).unify_dictionaries().combine_chunks()
+    return tabla.to_pandas(split_blocks=True), bloques[0].num_rows
+
+
+def correr(escala: int, columnas: list, paises: list | None, repeticiones: int) -> list:
+    df, filas_canceladas = preparar(escala, columnas)
+    tiempo_indice, indice = _medir(lambda: IndicePaises(df['Country'], filas_canceladas), 1)
+    print(f'\nEscala {escala}x: {len(df):,} filas, indice construido en {tiempo_indice * 1000:.1f} ms')
+
+    if paises is None:
+        # El pais mas grande, uno mediano y el mas chico
+        tamanios = sorted(indice.paises, key=lambda pais: sum(fin - inicio for inicio, fin in indice.rango(pais)))
+        paises = [tamanios[-1], tamanios[len(tamanios) // 2], tamanios[0]]
+
+    resultados = []
+    for pais in paises:
+        for vista, base in [('ambas', df), ('concretadas', df.iloc[filas_canceladas:])]:
+            tiempo_mascara, esperado = _medir(lambda: base[base['Country'] == pais], repeticiones)
+            tiempo_cortes, obtenido = _medir(lambda: cortar(df, indice.rango(pais, vista)), repeticiones)
+            assert len(esperado) == len(obtenido), f'Resultados distintos para {pais} ({vista})'
+            resultados.append({
+                'escala': escala, 'pais': pais, 'vista': vista, 'filas': len(obtenido),
+                'mascara_ms': tiempo_mascara * 1000, 'indice_ms': tiempo_cortes * 1000
+            })
+            print(f'  {pais:<22} {vista:<12} {len(obtenido):>12,} filas   mascara {tiempo_mascara * 1000:>9.3f} ms   '
+                  f'indice {tiempo_cortes * 1000:>9.3f} ms   x{tiempo_mascara / max(tiempo_cortes, 1e-9):,.0f}')
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara el filtro por pais con mascara booleana contra el indice de paises')
+    parser.add_argument('--escalas', type=int, nargs='+', default=[10, 100], help='Cantidad de veces que se repiten los datos de silver')
+    parser.add_argument('--columnas', nargs='+', default=COLUMNAS_DEFAULT, help='Columnas de silver a cargar (Country siempre se incluye)')
+    parser.add_argument('--paises', nargs='+', default=None, help='Paises a filtrar. Por defecto el mas grande, uno mediano y el mas chico')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_DEFAULT, help='Repeticiones por medicion (se reporta la mediana)')
+    args = parser.parse_args()
+
+    columnas = args.columnas if 'Country' in args.columnas else ['Country'] + args.columnas
+    for escala in args.escalas:
+        correr(escala, columnas, args.paises, args.repeticiones)
+
+
+if __name__ == '__main__':
+    main()
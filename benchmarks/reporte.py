@@ -0,0 +1,161 @@
+"""
+Reportes de la suite de benchmarks (benchmarks.suite): un json por corrida con el commit, el entorno y la mediana
+de cada escenario, y la comparacion entre dos reportes (por ejemplo el de main contra el de una rama).
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.reporte benchmarks/resultados/base.json benchmarks/resultados/nuevo.json --tolerancia 0.1
+
+Compara los escenarios que estan en los dos reportes (mismo grupo, escenario y escala) y termina con codigo 1
+si alguno es mas lento que el base por mas de la tolerancia, para usarlo en CI.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+import psutil
+
+VERSION_REPORTE = 1
+DIRECTORIO_RESULTADOS = 'benchmarks/resultados'
+TOLERANCIA_DEFAULT = 0.1
+LIBRERIAS = ['numpy', 'pandas', 'pyarrow', 'sklearn', 'prefect']
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entorno() -> dict:
+    """
+    Commit (y si habia cambios sin commitear), maquina y versiones de las librerias, para saber si dos reportes son comparables.
+    """
+    versiones = {}
+    for libreria in LIBRERIAS:
+        try:
+            versiones[libreria] = __import__(libreria).__version__
+        except ImportError:
+            versiones[libreria] = None
+    estado = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'cambios_sin_commitear': bool(estado) if estado is not None else None,
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cores': os.cpu_count(),
+        'memoria_bytes': psutil.virtual_memory().total,
+        'librerias': versiones
+    }
+
+
+def clave(resultado: dict) -> tuple:
+    return resultado['grupo'], resultado['escenario'], resultado['escala']
+
+
+def guardar_reporte(resultados: list, configuracion: dict, path: str | None = None) -> str:
+    """
+    Guarda los resultados de una corrida con su entorno. Sin path se guarda en
+    benchmarks/resultados/{fecha}-{commit}.json.
+
+    Args:
+        resultados (list): Un dict por escenario y escala (ver benchmarks.suite)
+        configuracion (dict): Parametros de la corrida (escalas, repeticiones, semilla, ...)
+        path (str, optional): path del json. Defaults to None.
+
+    Returns:
+        str: path del json
+    """
+    reporte = {'version': VERSION_REPORTE, 'entorno': entorno(), 'configuracion': configuracion, 'resultados': resultados}
+    if path is None:
+        commit = (reporte['entorno']['commit'] or 'sin-git')[:10]
+        path = os.path.join(DIRECTORIO_RESULTADOS, f'{datetime.now().strftime("%Y%m%d-%H%M%S")}-{commit}.json')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as archivo:
+        json.dump(reporte, archivo, indent=4)
+    return path
+
+
+def cargar_reporte(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as archivo:
+        reporte = json.load(archivo)
+    if reporte.get('version') != VERSION_REPORTE:
+        raise ValueError(f'{path} es un reporte de la version {reporte.get("version")}, se esperaba la {VERSION_REPORTE}')
+    return reporte
+
+
+def comparar(base: dict, nuevo: dict, tolerancia: float = TOLERANCIA_DEFAULT) -> list:
+    """
+    Compara la mediana de cada escenario que esta en los dos reportes.
+
+    Returns:
+        list: Un dict por escenario con las dos medianas, la razon nuevo / base y si es una regresion
+            (mas lento que base * (1 + tolerancia)) o una mejora (mas rapido que base / (1 + tolerancia))
+    """
+    base_por_clave = {clave(resultado): resultado for resultado in base['resultados']}
+    comparacion = []
+    for resultado in nuevo['resultados']:
+        anterior = base_por_clave.get(clave(resultado))
+        if anterior is None or not anterior['mediana_s'] or not resultado['mediana_s']:
+            continue
+        razon = resultado['mediana_s'] / anterior['mediana_s']
+        comparacion.append({
+            'grupo': resultado['grupo'],
+            'escenario': resultado['escenario'],
+            'escala': resultado['escala'],
+            'base_s': anterior['mediana_s'],
+            'nuevo_s': resultado['mediana_s'],
+            'razon': razon,
+            'regresion': razon > 1 + tolerancia,
+            'mejora': razon < 1 / (1 + tolerancia)
+        })
+    return comparacion
+
+
+def imprimir_resultados(resultados: list, encabezado: bool = True):
+    if encabezado:
+        print(f'{"grupo":<16}{"escenario":<44}{"escala":>7}{"filas":>14}{"mediana ms":>13}{"filas/s":>14}{"rss pico MB":>13}')
+    for resultado in resultados:
+        filas_por_s = f'{resultado["filas_por_s"]:,.0f}' if resultado['filas_por_s'] else '-'
+        filas = f'{resultado["filas"]:,}' if resultado['filas'] is not None else '-'
+        print(
+            f'{resultado["grupo"]:<16}{resultado["escenario"]:<44}{resultado["escala"]:>6g}x{filas:>14}'
+            f'{resultado["mediana_s"] * 1000:>13,.1f}{filas_por_s:>14}{resultado["rss_pico_bytes"] / 2 ** 20:>13,.0f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara dos reportes de benchmarks.suite')
+    parser.add_argument('base', help='Reporte de referencia (json)')
+    parser.add_argument('nuevo', help='Reporte a comparar (json)')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_DEFAULT, help='Diferencia relativa que no se considera regresion')
+    args = parser.parse_args()
+
+    base, nuevo = cargar_reporte(args.base), cargar_reporte(args.nuevo)
+    for nombre, reporte in [('base', base), ('nuevo', nuevo)]:
+        entorno_reporte = reporte['entorno']
+        sucio = ' (con cambios sin commitear)' if entorno_reporte['cambios_sin_commitear'] else ''
+        print(f'{nombre:<6} {entorno_reporte["commit"]}{sucio}  {entorno_reporte["fecha"]}  {entorno_reporte["cores"]} cores  python {entorno_reporte["python"]}')
+    if base['entorno']['plataforma'] != nuevo['entorno']['plataforma'] or base['entorno']['cores'] != nuevo['entorno']['cores']:
+        print('Atencion: los reportes son de maquinas distintas, los tiempos no son comparables')
+    if base['configuracion'].get('semilla') != nuevo['configuracion'].get('semilla'):
+        print('Atencion: los reportes usan semillas distintas, los datos sinteticos no son los mismos')
+
+    comparacion = comparar(base, nuevo, args.tolerancia)
+    for fila in comparacion:
+        marca = 'REGRESION' if fila['regresion'] else 'mejora' if fila['mejora'] else ''
+        print(
+            f'  {fila["grupo"]:<16}{fila["escenario"]:<44}{fila["escala"]:>6g}x'
+            f'{fila["base_s"] * 1000:>12,.1f} ms{fila["nuevo_s"] * 1000:>12,.1f} ms   x{fila["razon"]:.2f}  {marca}'
+        )
+    regresiones = sum(fila['regresion'] for fila in comparacion)
+    print(f'{len(comparacion)} escenarios comparados, {regresiones} regresiones (tolerancia {args.tolerancia:.0%})')
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Generador de transacciones sinteticas con el formato del csv de bronze (el de kaggle), a cualquier escala, a partir
+de las distribuciones de silver: cada transaccion sintetica copia estado (cancelada o no), fecha, cliente, pais y
+cantidad de lineas de una transaccion real elegida al azar, y cada linea copia producto, precio y cantidad de una
+linea real del mismo estado. Asi se mantienen la tasa de cancelacion, el peso de cada pais, la popularidad de
+los productos, la estacionalidad y los tamaños de canasta.
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.sintetico --escala 10 --salida /tmp/bronze-10x.csv
+
+Con escala N hay N veces mas transacciones y N veces mas clientes (cada cliente real se repite en N cohortes con
+distinto CustomerNo); el catalogo de productos y los paises no cambian. Con la misma semilla, escala y silver
+el csv es identico byte a byte. Se genera por chunks de transacciones: la memoria no depende de la escala.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_engineer.silver import leer_silver
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+SEMILLA_DEFAULT = 42
+TRANSACCIONES_POR_CHUNK_DEFAULT = 50_000
+# Silver ya no tiene las lineas sin CustomerNo del csv original, se agregan unas pocas para que transform_df tenga que descartarlas
+TASA_CLIENTES_NULOS_DEFAULT = 0.0001
+PRIMER_NUMERO_TRANSACCION = 536365
+# Los CustomerNo reales tienen 5 digitos, cada cohorte suma OFFSET_COHORTE
+OFFSET_COHORTE = 100_000
+COLUMNAS_CSV = ['TransactionNo', 'Date', 'ProductNo', 'ProductName', 'Price', 'Quantity', 'CustomerNo', 'Country']
+
+
+class PerfilTransacciones:
+    """
+    Las transacciones y lineas reales de silver de las que se muestrea. Las columnas de texto se guardan como
+    codigos de categorias, asi muestrear es indexar arrays de numpy.
+    """
+    def __init__(self, canceladas: pd.DataFrame, concretadas: pd.DataFrame):
+        lineas = pd.concat([canceladas, concretadas], ignore_index=True)
+        canceladas_mascara = np.repeat([True, False], [len(canceladas), len(concretadas)])
+
+        # Una fila por transaccion real: estado, fecha, cliente, pais y cantidad de lineas
+        codigos, _ = pd.factorize(lineas['TransactionNo'])
+        primeras = np.unique(codigos, return_index=True)[1]
+        self.cancelada = canceladas_mascara[primeras]
+        self.lineas_por_transaccion = np.bincount(codigos)
+        self.cliente = lineas['CustomerNo'].to_numpy(dtype=np.int64)[primeras]
+        self.codigo_pais, self.paises = pd.factorize(lineas['Country'].astype(str).to_numpy()[primeras])
+        fechas = pd.to_datetime(lineas['Date'].to_numpy()[primeras])
+        self.codigo_fecha, dias = pd.factorize(fechas)
+        # El mismo formato que el csv de kaggle (12/9/2019, sin ceros adelante)
+        self.fechas = np.array([f'{dia.month}/{dia.day}/{dia.year}' for dia in dias], dtype=object)
+
+        # Las lineas de cada estado, de donde salen producto, precio y cantidad
+        self.lineas = {}
+        for cancelada, df in [(True, canceladas), (False, concretadas)]:
+            codigo_producto, productos = pd.factorize(df['ProductNo'].astype(str).to_numpy())
+            nombres = df['ProductName'].astype(str).to_numpy()
+            # Un nombre por producto (el de su primera linea)
+            nombre_producto = nombres[np.unique(codigo_producto, return_index=True)[1]]
+            self.lineas[cancelada] = {
+                'producto': codigo_producto,
+                'productos': np.asarray(productos, dtype=object),
+                'nombres': np.asarray(nombre_producto, dtype=object),
+                'precio': df['Price'].to_numpy(dtype=np.float64),
+                'cantidad': df['Quantity'].to_numpy(dtype=np.int64)
+            }
+
+    @classmethod
+    def desde_silver(cls, path_canceladas: str = PATH_CANCELADAS, path_concretadas: str = PATH_CONCRETADAS) -> 'PerfilTransacciones':
+        return cls(leer_silver(path_canceladas), leer_silver(path_concretadas))
+
+    @property
+    def transacciones(self) -> int:
+        return len(self.cancelada)
+
+    @property
+    def filas(self) -> int:
+        return int(self.lineas_por_transaccion.sum())
+
+    def resumen(self) -> dict:
+        """
+        Las distribuciones que tiene que mantener el generador, para compararlas con las de los datos generados.
+        """
+        por_pais = np.bincount(self.codigo_pais) / self.transacciones
+        return {
+            'transacciones': self.transacciones,
+            'lineas': self.filas,
+            'tasa_cancelacion': float(self.cancelada.mean()),
+            'lineas_por_transaccion': float(self.lineas_por_transaccion.mean()),
+            'pais_principal': str(self.paises[np.argmax(por_pais)]),
+            'peso_pais_principal': float(por_pais.max())
+        }
+
+
+class GeneradorTransacciones:
+    """
+    Genera transacciones sinteticas a partir de un PerfilTransacciones (ver el docstring del modulo). Cada chunk
+    tiene su propio generador de numeros aleatorios (semilla, indice del chunk), asi el resultado es reproducible.
+    """
+    def __init__(self, perfil: PerfilTransacciones, escala: float = 1, semilla: int = SEMILLA_DEFAULT,
+                 tasa_clientes_nulos: float = TASA_CLIENTES_NULOS_DEFAULT):
+        if escala <= 0:
+            raise ValueError('La escala tiene que ser mayor a 0')
+        self.perfil = perfil
+        self.escala = escala
+        self.semilla = semilla
+        self.tasa_clientes_nulos = tasa_clientes_nulos
+        self.cohortes = max(int(np.ceil(escala)), 1)
+        self.transacciones = int(round(perfil.transacciones * escala))
+
+    def _lineas(self, rng: np.random.Generator, cancelada: bool, cantidad: int) -> dict:
+        pool = self.perfil.lineas[cancelada]
+        elegidas = rng.integers(0, len(pool['producto']), cantidad)
+        producto = pool['producto'][elegidas]
+        return {
+            'ProductNo': pool['productos'][producto],
+            'ProductName': pool['nombres'][producto],
+            'Price': pool['precio'][elegidas],
+            'Quantity': pool['cantidad'][elegidas]
+        }
+
+    def chunk(self, indice: int, transacciones_por_chunk: int = TRANSACCIONES_POR_CHUNK_DEFAULT) -> pd.DataFrame:
+        """
+        Las lineas de las transacciones [indice * transacciones_por_chunk, (indice + 1) * transacciones_por_chunk),
+        con las columnas y los tipos del csv de bronze (CustomerNo es float por los nulos).
+        """
+        perfil = self.perfil
+        inicio = indice * transacciones_por_chunk
+        cantidad = max(min(transacciones_por_chunk, self.transacciones - inicio), 0)
+        rng = np.random.default_rng([self.semilla, indice])
+
+        modelos = rng.integers(0, perfil.transacciones, cantidad)
+        cohortes = rng.integers(0, self.cohortes, cantidad)
+        lineas = perfil.lineas_por_transaccion[modelos]
+        cancelada = perfil.cancelada[modelos]
+
+        numeros = (PRIMER_NUMERO_TRANSACCION + inicio + np.arange(cantidad)).astype(str).astype(object)
+        numeros[cancelada] = 'C' + numeros[cancelada]
+        clientes = (perfil.cliente[modelos] + cohortes * OFFSET_COHORTE).astype(np.float64)
+
+        # Las columnas de la transaccion se repiten en cada una de sus lineas
+        por_linea = np.repeat(np.arange(cantidad), lineas)
+        cancelada_linea = cancelada[por_linea]
+        columnas = {
+            'TransactionNo': numeros[por_linea],
+            'Date': perfil.fechas[perfil.codigo_fecha[modelos]][por_linea],
+            'CustomerNo': clientes[por_linea],
+            'Country': np.asarray(perfil.paises, dtype=object)[perfil.codigo_pais[modelos]][por_linea]
+        }
+        for nombre in ['ProductNo', 'ProductName', 'Price', 'Quantity']:
+            columnas[nombre] = np.empty(len(por_linea), dtype=np.float64 if nombre == 'Price' else np.int64 if nombre == 'Quantity' else object)
+        for estado in (True, False):
+            mascara = cancelada_linea == estado
+            for nombre, valores in self._lineas(rng, estado, int(mascara.sum())).items():
+                columnas[nombre][mascara] = valores
+
+        columnas['CustomerNo'][rng.random(len(por_linea)) < self.tasa_clientes_nulos] = np.nan
+        return pd.DataFrame(columnas, columns=COLUMNAS_CSV)
+
+    def chunks(self, transacciones_por_chunk: int = TRANSACCIONES_POR_CHUNK_DEFAULT):
+        for indice in range(-(-self.transacciones // transacciones_por_chunk)):
+            yield self.chunk(indice, transacciones_por_chunk)
+
+    def escribir_csv(self, path: str, transacciones_por_chunk: int = TRANSACCIONES_POR_CHUNK_DEFAULT) -> int:
+        """
+        Escribe el csv chunk por chunk. Se escribe a un archivo temporal y se renombra al terminar.
+
+        Returns:
+            int: Cantidad de lineas escritas
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        path_tmp = path + '.tmp'
+        filas = 0
+        with open(path_tmp, 'w', encoding='utf-8', newline='') as archivo:
+            for indice, chunk in enumerate(self.chunks(transacciones_por_chunk)):
+                chunk.to_csv(archivo, header=indice == 0, index=False, float_format='%.15g')
+                filas += len(chunk)
+        os.replace(path_tmp, path)
+        return filas
+
+
+def resumir_csv(path: str) -> dict:
+    """
+    Las mismas distribuciones que PerfilTransacciones.resumen, calculadas sobre un csv generado.
+    """
+    df = pd.read_csv(path, usecols=['TransactionNo', 'Country'], dtype=str)
+    transacciones = df.drop_duplicates('TransactionNo')
+    por_pais = transacciones['Country'].value_counts(normalize=True)
+    return {
+        'transacciones': len(transacciones),
+        'lineas': len(df),
+        'tasa_cancelacion': float(transacciones['TransactionNo'].str.startswith('C').mean()),
+        'lineas_por_transaccion': len(df) / len(transacciones),
+        'pais_principal': por_pais.index[0],
+        'peso_pais_principal': float(por_pais.iloc[0])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera un csv de bronze sintetico con las distribuciones de silver')
+    parser.add_argument('--escala', type=float, default=1, help='Cantidad de transacciones respecto de silver (1, 10, 100, 1000)')
+    parser.add_argument('--salida', required=True, help='path del csv a escribir')
+    parser.add_argument('--semilla', type=int, default=SEMILLA_DEFAULT, help='Semilla del generador')
+    parser.add_argument('--verificar', action='store_true', help='Comparar las distribuciones del csv generado con las de silver')
+    args = parser.parse_args()
+
+    perfil = PerfilTransacciones.desde_silver()
+    generador = GeneradorTransacciones(perfil, args.escala, args.semilla)
+    inicio = time.perf_counter()
+    filas = generador.escribir_csv(args.salida)
+    print(f'{filas:,} lineas ({generador.transacciones:,} transacciones) en {args.salida}, {time.perf_counter() - inicio:.1f} s')
+
+    if args.verificar:
+        esperado, obtenido = perfil.resumen(), resumir_csv(args.salida)
+        for clave in esperado:
+            print(f'  {clave:<24} silver {esperado[clave]!s:>16}   generado {obtenido[clave]!s:>16}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Suite de benchmarks de punta a punta sobre datos sinteticos (benchmarks.sintetico) a distintas escalas:
+
+- etl: cada tarea del ETL de data_engineer/main.py, desde el csv de bronze hasta las tablas de gold.
+- visualizaciones: las agregaciones de los graficos de la pagina Visualizaciones de app.py y la carga de DatosSilver.
+- consultas: el filtro por pais y la busqueda de transacciones de DatosSilver, y las consultas de benchmarks.consultas con MotorConsultas.
+- modelo: la lectura de las lineas, los agregados por transaccion, la matriz de features y la puntuacion.
+
+Uso (desde la raiz del repo):
+    python -m benchmarks.suite --escalas 1 10
+    python -m benchmarks.suite --escalas 1 10 100 --grupos etl modelo --repeticiones 5 --salida benchmarks/resultados/base.json
+    python -m benchmarks.reporte benchmarks/resultados/base.json benchmarks/resultados/nuevo.json
+
+Para cada escala se genera el csv sintetico (siempre el mismo con la misma semilla) y se corre el ETL en un directorio
+temporal (--directorio para usar otro: a 100x y 1000x el csv ocupa ~5 GB y ~50 GB, y las tareas que cargan el dataframe
+entero necesitan la memoria correspondiente). El modelo que se puntua no es el de ml_developers/modelos sino uno de
+referencia con hiperparametros fijos, entrenado sobre los datos sinteticos 1x, asi los reportes de distintos commits
+son comparables. El reporte (json) se guarda en benchmarks/resultados.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefect import flow
+from prefect.runtime import flow_run
+from sklearn.ensemble import RandomForestClassifier
+from benchmarks.consultas import CONSULTAS
+from benchmarks.reporte import guardar_reporte, imprimir_resultados
+from benchmarks.sintetico import GeneradorTransacciones, PerfilTransacciones, SEMILLA_DEFAULT
+from dashboard.consultas import MotorConsultas
+from dashboard.datos import DatosSilver, construir_cache_arrow
+from data_engineer import main as etl
+from data_engineer.gold import ESTADO_CANCELADO, ESTADO_CONCRETADO, TABLA_PRODUCTOS, TABLA_TRANSACCIONES, top_productos
+from data_engineer.metricas import REGISTRO, MuestreadorRSS
+from data_engineer.silver import hash_silver
+from data_engineer.streaming import transformar
+from ml_developers.features import Vocabulario, agregados_por_transaccion, construir_matriz, etiquetas
+from ml_developers.modelo import cargar_modelo, guardar_modelo, leer_lineas, puntuar_transacciones
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+GRUPOS = ['etl', 'visualizaciones', 'consultas', 'modelo']
+ESCALAS_DEFAULT = [1, 10]
+REPETICIONES_DEFAULT = 3
+PARAMETROS_MODELO_REFERENCIA = {'n_estimators': 100, 'max_depth': 20}
+PAISES = ['United Kingdom', 'France']
+TEXTO_BUSQUEDA = '540'
+
+# Las agregaciones de los graficos de la pagina Visualizaciones (app.py), sobre las tablas de gold y DatosSilver
+VISUALIZACIONES = [
+    ('canceladas_por_pais', lambda gold, productos, ambas, producto:
+        gold[gold['Estado'] == ESTADO_CANCELADO].groupby('Country')['Cantidad'].sum().sort_values(ascending=False)),
+    ('concretadas_por_pais', lambda gold, productos, ambas, producto:
+        gold[gold['Estado'] == ESTADO_CONCRETADO].groupby('Country')['Cantidad'].sum().sort_values(ascending=False)),
+    ('top_productos', lambda gold, productos, ambas, producto: top_productos(productos, None)),
+    ('top_productos_pais', lambda gold, productos, ambas, producto: top_productos(productos, 'France')),
+    ('transacciones_por_mes', lambda gold, productos, ambas, producto: gold.groupby('YearMonth')['Cantidad'].sum().sort_index()),
+    ('concretadas_vs_canceladas', lambda gold, productos, ambas, producto:
+        gold.groupby('Estado')['Cantidad'].sum().sort_values(ascending=False)),
+    ('productos_unicos', lambda gold, productos, ambas, producto: ambas['ProductName'].unique()),
+    ('histograma_precios', lambda gold, productos, ambas, producto:
+        np.histogram(ambas.loc[ambas['ProductName'] == producto, 'Price'], bins=20)[0]),
+    ('canceladas_por_mes', lambda gold, productos, ambas, producto:
+        gold[gold['Estado'] == ESTADO_CANCELADO].groupby('YearMonth')['Cantidad'].sum()),
+]
+
+
+class Medidor:
+    """
+    Corre cada escenario repeticiones veces y guarda la mediana y el minimo del tiempo de pared, el tiempo de CPU
+    promedio, la memoria residente maxima del proceso y las filas procesadas por segundo.
+    """
+    def __init__(self, escala: float, repeticiones: int):
+        self.escala = escala
+        self.repeticiones = repeticiones
+        self.resultados = []
+
+    def __call__(self, grupo: str, escenario: str, funcion, filas=None):
+        """
+        Args:
+            grupo (str): Grupo del escenario (GRUPOS)
+            escenario (str): Nombre del escenario
+            funcion: Funcion sin argumentos a medir
+            filas (int | callable, optional): Filas que procesa el escenario, o una funcion que las calcula
+                a partir del resultado. Defaults to None.
+
+        Returns:
+            El resultado de la ultima repeticion
+        """
+        tiempos = []
+        inicio_cpu = time.process_time()
+        with MuestreadorRSS() as rss:
+            for _ in range(self.repeticiones):
+                inicio = time.perf_counter()
+                resultado = funcion()
+                tiempos.append(time.perf_counter() - inicio)
+        cpu = (time.process_time() - inicio_cpu) / self.repeticiones
+
+        filas = filas(resultado) if callable(filas) else filas
+        mediana = float(np.median(tiempos))
+        self.resultados.append({
+            'grupo': grupo,
+            'escenario': escenario,
+            'escala': self.escala,
+            'filas': int(filas) if filas is not None else None,
+            'repeticiones': self.repeticiones,
+            'mediana_s': mediana,
+            'minimo_s': min(tiempos),
+            'cpu_s': cpu,
+            'rss_pico_bytes': rss.pico,
+            'filas_por_s': filas / mediana if filas and mediana > 0 else None
+        })
+        imprimir_resultados(self.resultados[-1:], encabezado=False)
+        return resultado
+
+
+def entrenar_modelo_referencia(perfil: PerfilTransacciones, directorio: str, semilla: int) -> str:
+    """
+    Entrena el modelo de referencia (RandomForest con PARAMETROS_MODELO_REFERENCIA) sobre los datos sinteticos 1x
+    y lo guarda con su vocabulario en directorio.
+    """
+    lineas = transformar(pd.concat(GeneradorTransacciones(perfil, 1, semilla).chunks(), ignore_index=True))
+    vocabulario = Vocabulario.desde_lineas(lineas)
+    transacciones, X = construir_matriz(lineas, vocabulario)
+    modelo = RandomForestClassifier(**PARAMETROS_MODELO_REFERENCIA, random_state=semilla, n_jobs=-1)
+    modelo.fit(X, etiquetas(transacciones))
+    guardar_modelo(modelo, vocabulario, directorio, {'parametros': PARAMETROS_MODELO_REFERENCIA, 'semilla': semilla})
+    return directorio
+
+
+@flow(name='benchmark-suite-etl')
+def correr_etl(path_csv: str, directorio: str, path_modelos: str, escala: float, repeticiones: int) -> list:
+    """
+    Mide las tareas del ETL (su funcion, sin el overhead de las task runs de Prefect) y deja silver y gold
+    en directorio para los otros grupos. Corre dentro de un flow porque las tareas usan get_run_logger.
+    """
+    medir = Medidor(escala, repeticiones)
+    path_canceladas = os.path.join(directorio, 'silver', 'transacciones_canceladas.parquet')
+    path_concretadas = os.path.join(directorio, 'silver', 'transacciones_concretadas.parquet')
+    path_gold = os.path.join(directorio, 'gold')
+
+    df = medir('etl', 'get_data_from_csv', lambda: etl.get_data_from_csv.fn(path_csv), filas=len)
+    transformado = medir('etl', 'transform_df', lambda: etl.transform_df.fn(df), filas=len(df))
+    del df
+    medir('etl', 'write_canceladas_y_concretadas_to_parquet',
+          lambda: etl.write_canceladas_y_concretadas_to_parquet.fn(transformado, path_canceladas, path_concretadas), filas=len(transformado))
+    filas = len(transformado)
+    del transformado
+
+    medir('etl', 'build_gold_tables', lambda: etl.build_gold_tables.fn(path_canceladas, path_concretadas, path_gold), filas=filas)
+    medir('etl', 'build_transaction_features', lambda: etl.build_transaction_features.fn(path_canceladas, path_concretadas, path_gold), filas=filas)
+    medir('etl', 'update_customer_features',
+          lambda: etl.update_customer_features.fn(path_canceladas, path_concretadas, path_gold, reconstruir=True), filas=filas)
+    medir('etl', 'score_transactions', lambda: etl.score_transactions.fn(path_canceladas, path_concretadas, path_modelos, path_gold), filas=filas)
+
+    # Las tareas instrumentadas registran sus metricas para el flow del ETL, aca no se publican
+    REGISTRO.extraer(flow_run.get_id())
+    return medir.resultados
+
+
+def correr_dashboard(medir: Medidor, directorio: str, grupos: list):
+    path_canceladas = os.path.join(directorio, 'silver', 'transacciones_canceladas.parquet')
+    path_concretadas = os.path.join(directorio, 'silver', 'transacciones_concretadas.parquet')
+    path_gold = os.path.join(directorio, 'gold')
+    directorio_cache = os.path.join(directorio, 'cache')
+    os.makedirs(directorio_cache, exist_ok=True)
+
+    datos = DatosSilver.abrir(path_canceladas, path_concretadas, directorio_cache)
+    filas = len(datos.ambas)
+
+    if 'visualizaciones' in grupos:
+        medir('visualizaciones', 'construir_cache_arrow',
+              lambda: construir_cache_arrow(path_canceladas, path_concretadas, os.path.join(directorio, 'transacciones.arrow')), filas=filas)
+        medir('visualizaciones', 'abrir_datos_silver', lambda: DatosSilver.abrir(path_canceladas, path_concretadas, directorio_cache), filas=filas)
+        gold = pd.read_parquet(os.path.join(path_gold, TABLA_TRANSACCIONES))
+        productos = pd.read_parquet(os.path.join(path_gold, TABLA_PRODUCTOS))
+        producto = datos.ambas['ProductName'].value_counts().index[0]
+        for nombre, agregacion in VISUALIZACIONES:
+            medir('visualizaciones', nombre, lambda: agregacion(gold, productos, datos.ambas, producto), filas=filas)
+
+    if 'consultas' in grupos:
+        for pais in PAISES:
+            medir('consultas', f'filtrar_pais[{pais}]', lambda: datos.filtrar_pais(pais), filas=filas)
+        medir('consultas', f'buscar_transaccion[{TEXTO_BUSQUEDA}]', lambda: datos.buscar_transaccion(TEXTO_BUSQUEDA), filas=filas)
+        motor = MotorConsultas.abrir(path_canceladas, path_concretadas, path_gold)
+        for nombre, consulta, _ in CONSULTAS:
+            medir('consultas', f'motor[{nombre}]', lambda: motor.ejecutar(consulta), filas=filas)
+
+
+def correr_modelo(medir: Medidor, directorio: str, path_modelos: str):
+    path_canceladas = os.path.join(directorio, 'silver', 'transacciones_canceladas.parquet')
+    path_concretadas = os.path.join(directorio, 'silver', 'transacciones_concretadas.parquet')
+    modelo, vocabulario = cargar_modelo(path_modelos)
+
+    lineas = medir('modelo', 'leer_lineas', lambda: leer_lineas(path_canceladas, path_concretadas), filas=len)
+    filas = len(lineas)
+    medir('modelo', 'agregados_por_transaccion', lambda: agregados_por_transaccion(lineas), filas=filas)
+    medir('modelo', 'construir_matriz', lambda: construir_matriz(lineas, vocabulario), filas=filas)
+    medir('modelo', 'puntuar_transacciones', lambda: puntuar_transacciones(modelo, vocabulario, lineas)[0], filas=filas)
+
+
+def correr_escala(perfil: PerfilTransacciones, escala: float, grupos: list, repeticiones: int, semilla: int,
+                  directorio: str, path_modelos: str) -> tuple:
+    """
+    Genera los datos sinteticos de una escala, corre los grupos pedidos y borra los datos.
+
+    Returns:
+        tuple: (resultados, dict con lo que se genero: lineas, transacciones, bytes del csv y segundos)
+    """
+    directorio = os.path.join(directorio, f'escala-{escala:g}')
+    os.makedirs(directorio, exist_ok=True)
+    try:
+        path_csv = os.path.join(directorio, 'bronze', 'transactions.csv')
+        generador = GeneradorTransacciones(perfil, escala, semilla)
+        inicio = time.perf_counter()
+        lineas = generador.escribir_csv(path_csv)
+        datos = {'escala': escala, 'lineas': lineas, 'transacciones': generador.transacciones,
+                 'bytes_csv': os.path.getsize(path_csv), 'segundos_generacion': time.perf_counter() - inicio}
+        print(f'Escala {escala:g}x: {lineas:,} lineas sinteticas ({datos["bytes_csv"] / 2 ** 20:,.0f} MB) en {datos["segundos_generacion"]:.1f} s')
+
+        # El ETL deja silver y gold para los otros grupos: si no se mide, corre una sola vez
+        resultados = correr_etl(path_csv, directorio, path_modelos, escala, repeticiones if 'etl' in grupos else 1)
+        if 'etl' not in grupos:
+            resultados = []
+
+        medir = Medidor(escala, repeticiones)
+        if 'visualizaciones' in grupos or 'consultas' in grupos:
+            correr_dashboard(medir, directorio, grupos)
+        if 'modelo' in grupos:
+            correr_modelo(medir, directorio, path_modelos)
+        return resultados + medir.resultados, datos
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suite de benchmarks del ETL, el dashboard y el modelo sobre datos sinteticos escalados')
+    parser.add_argument('--escalas', type=float, nargs='+', default=ESCALAS_DEFAULT, help='Escalas de los datos sinteticos (1, 10, 100, 1000)')
+    parser.add_argument('--grupos', nargs='+', choices=GRUPOS, default=GRUPOS, help='Grupos de escenarios a correr')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_DEFAULT, help='Repeticiones por escenario (se reporta la mediana)')
+    parser.add_argument('--semilla', type=int, default=SEMILLA_DEFAULT, help='Semilla de los datos sinteticos y del modelo de referencia')
+    parser.add_argument('--directorio', default=None, help='Directorio para los datos generados. Defaults to un directorio temporal')
+    parser.add_argument('--salida', default=None, help='path del reporte json. Defaults to benchmarks/resultados/{fecha}-{commit}.json')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} cores')
+    perfil = PerfilTransacciones.desde_silver(PATH_CANCELADAS, PATH_CONCRETADAS)
+    configuracion = {
+        'escalas': args.escalas,
+        'grupos': args.grupos,
+        'repeticiones': args.repeticiones,
+        'semilla': args.semilla,
+        'hash_silver': hash_silver(PATH_CANCELADAS, PATH_CONCRETADAS),
+        'perfil': perfil.resumen(),
+        'modelo_referencia': PARAMETROS_MODELO_REFERENCIA,
+        'datos': []
+    }
+
+    resultados = []
+    with tempfile.TemporaryDirectory(dir=args.directorio) as directorio:
+        path_modelos = entrenar_modelo_referencia(perfil, os.path.join(directorio, 'modelos'), args.semilla)
+        for escala in args.escalas:
+            resultados_escala, datos = correr_escala(perfil, escala, args.grupos, args.repeticiones, args.semilla, directorio, path_modelos)
+            resultados += resultados_escala
+            configuracion['datos'].append(datos)
+
+    path = guardar_reporte(resultados, configuracion, args.salida)
+    print()
+    imprimir_resultados(resultados)
+    print(f'Reporte guardado en {path}')
+
+
+if __name__ == '__main__':
+    main()
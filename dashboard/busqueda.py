@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+
+LARGO_NGRAMA = 3
+# Cada caracter de un n-grama ocupa 21 bits de la clave (alcanza para cualquier codepoint unicode)
+BITS_CARACTER = 21
+CANDIDATOS_A_VERIFICAR = 256
+
+
+def _claves_ngramas(caracteres: np.ndarray) -> np.ndarray:
+    """
+    Codifica n-gramas (una fila de codepoints por n-grama, 0 = sin caracter) en enteros de 64 bits.
+    El largo queda implicito: un n-grama mas corto tiene ceros al principio de la clave.
+    """
+    claves = np.zeros(len(caracteres), dtype=np.int64)
+    for columna in range(caracteres.shape[1]):
+        claves = (claves << BITS_CARACTER) | caracteres[:, columna].astype(np.int64)
+    return claves
+
+
+def _clave(texto: str) -> int:
+    return int(_claves_ngramas(np.array([[ord(c) for c in texto]], dtype=np.uint32))[0])
+
+
+class IndiceTransacciones:
+    """
+    Indice de busqueda sobre los numeros de transaccion, se construye una sola vez al cargar los datos.
+
+    - Los numeros de transaccion distintos se guardan ordenados, asi una busqueda por prefijo es un searchsorted.
+    - Para buscar por subcadena hay un indice invertido de n-gramas (de 1 a 3 caracteres) -> transacciones que lo contienen.
+      Una busqueda de hasta 3 caracteres es una sola consulta al indice; una mas larga intersecta los trigramas
+      y verifica solo los candidatos.
+    - Las filas de cada transaccion estan agrupadas (orden + offsets), asi pasar de transacciones a posiciones de filas
+      no recorre el dataframe.
+
+    Las busquedas devuelven posiciones de filas (ordenadas) del array original, para usar con iloc.
+    """
+    def __init__(self, transacciones: pd.Series | np.ndarray):
+        codigos, unicas = pd.factorize(transacciones, sort=True)
+        self.transacciones = np.asarray(unicas.to_numpy(), dtype=str)
+
+        # Filas agrupadas por transaccion: las filas de la transaccion i son orden[offsets[i]:offsets[i + 1]]
+        self.orden = np.argsort(codigos, kind='stable')[np.count_nonzero(codigos < 0):]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codigos[codigos >= 0], minlength=len(unicas)))])
+
+        self.__construir_ngramas()
+
+    def __construir_ngramas(self):
+        largo = self.transacciones.dtype.itemsize // 4
+        caracteres = self.transacciones.view(np.uint32).reshape(len(self.transacciones), largo)
+        ids = np.arange(len(self.transacciones), dtype=np.int32)
+
+        claves, transacciones = [], []
+        for n in range(1, LARGO_NGRAMA + 1):
+            for inicio in range(largo - n + 1):
+                ngramas = caracteres[:, inicio:inicio + n]
+                # Los strings mas cortos que el ancho del array estan rellenos con ceros
+                validos = ngramas[:, -1] != 0
+                claves.append(_claves_ngramas(ngramas[validos]))
+                transacciones.append(ids[validos])
+
+        claves = np.concatenate(claves)
+        transacciones = np.concatenate(transacciones)
+        # Ordenamos por (clave, transaccion) y sacamos los repetidos (un n-grama que aparece dos veces en la misma transaccion)
+        orden = np.lexsort((transacciones, claves))
+        claves, transacciones = claves[orden], transacciones[orden]
+        unicos = np.ones(len(claves), dtype=bool)
+        unicos[1:] = (claves[1:] != claves[:-1]) | (transacciones[1:] != transacciones[:-1])
+        claves, transacciones = claves[unicos], transacciones[unicos]
+
+        self.claves_ngramas, inicios = np.unique(claves, return_index=True)
+        self.offsets_ngramas = np.append(inicios, len(claves))
+        self.transacciones_ngramas = transacciones
+
+    def __transacciones_con_ngrama(self, ngrama: str) -> np.ndarray:
+        clave = _clave(ngrama)
+        i = np.searchsorted(self.claves_ngramas, clave)
+        if i == len(self.claves_ngramas) or self.claves_ngramas[i] != clave:
+            return np.empty(0, dtype=np.int32)
+        return self.transacciones_ngramas[self.offsets_ngramas[i]:self.offsets_ngramas[i + 1]]
+
+    def __posiciones(self, transacciones: np.ndarray) -> np.ndarray:
+        inicios = self.offsets[transacciones]
+        largos = self.offsets[transacciones + 1] - inicios
+        if len(transacciones) == 0 or largos.sum() == 0:
+            return np.empty(0, dtype=np.int64)
+        # Concatenamos los rangos orden[inicio:inicio + largo] de cada transaccion sin un loop de python
+        saltos = np.repeat(inicios - np.concatenate([[0], np.cumsum(largos)[:-1]]), largos)
+        return np.sort(self.orden[saltos + np.arange(largos.sum())])
+
+    def buscar_prefijo(self, texto: str) -> np.ndarray:
+        """
+        Posiciones de las filas cuyo numero de transaccion empieza con texto.
+        """
+        desde = np.searchsorted(self.transacciones, texto, side='left')
+        hasta = np.searchsorted(self.transacciones, texto + chr(0x10FFFF), side='left')
+        return np.sort(self.orden[self.offsets[desde]:self.offsets[hasta]])
+
+    def buscar(self, texto: str) -> np.ndarray:
+        """
+        Posiciones de las filas cuyo numero de transaccion contiene texto (subcadena literal, sin regex).
+
+        Args:
+            texto (str): texto a buscar
+
+        Returns:
+            np.ndarray: posiciones ordenadas de las filas que coinciden
+        """
+        if texto == '':
+            return np.sort(self.orden)
+
+        if len(texto) <= LARGO_NGRAMA:
+            return self.__posiciones(self.__transacciones_con_ngrama(texto))
+
+        # Intersectamos los trigramas del texto, empezando por el menos frecuente
+        listas = sorted((self.__transacciones_con_ngrama(texto[i:i + LARGO_NGRAMA]) for i in range(len(texto) - LARGO_NGRAMA + 1)), key=len)
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            # Con pocos candidatos es mas barato verificarlos directamente que seguir intersectando
+            if len(candidatos) <= CANDIDATOS_A_VERIFICAR:
+                break
+            candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+
+        # Los trigramas pueden estar en otro orden, verificamos la subcadena completa en los candidatos
+        candidatos = candidatos[np.char.find(self.transacciones[candidatos], texto) >= 0]
+        return self.__posiciones(candidatos)
+
+
+class IndicePaises:
+    """
+    Indice pais -> rangos de filas, sobre un layout donde las filas estan ordenadas por pais dentro de cada bloque
+    (canceladas primero, despues concretadas). Filtrar por pais es cortar esos rangos, sin recorrer el dataframe.
+
+    Para cada pais se guardan los offsets (inicio, fin) de sus filas en el bloque de canceladas y en el de concretadas.
+    """
+    def __init__(self, paises: pd.Series, filas_canceladas: int):
+        paises = paises.astype('category')
+        codigos = paises.cat.codes.to_numpy()
+        categorias = paises.cat.categories
+
+        self.rangos = {}
+        for bloque, (desde, hasta) in enumerate([(0, filas_canceladas), (filas_canceladas, len(codigos))]):
+            codigos_bloque = codigos[desde:hasta]
+            inicios = np.flatnonzero(np.diff(codigos_bloque, prepend=-2)) if len(codigos_bloque) else np.empty(0, dtype=np.int64)
+            fines = np.append(inicios[1:], len(codigos_bloque))
+            for inicio, fin in zip(inicios, fines):
+                pais = categorias[codigos_bloque[inicio]]
+                rangos = self.rangos.setdefault(pais, [(0, 0), (0, 0)])
+                if rangos[bloque][1] > rangos[bloque][0]:
+                    raise ValueError(f'Las filas de {pais} no estan contiguas, los datos no estan ordenados por pais')
+                rangos[bloque] = (desde + inicio, desde + fin)
+
+        self.paises = sorted(self.rangos)
+
+    def rango(self, pais: str, vista: str = 'ambas') -> list:
+        """
+        Rangos de posiciones (inicio, fin) de las filas del pais en la vista ('ambas', 'canceladas' o 'concretadas').
+        Un pais sin filas devuelve una lista vacia.
+        """
+        if pais not in self.rangos:
+            return []
+        canceladas, concretadas = self.rangos[pais]
+        match vista:
+            case 'canceladas':
+                rangos = [canceladas]
+            case 'concretadas':
+                rangos = [concretadas]
+            case _:
+                rangos = [canceladas, concretadas]
+        return [(inicio, fin) for inicio, fin in rangos if fin > inicio]
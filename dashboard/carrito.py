@@ -0,0 +1,148 @@
+import itertools
+import numpy as np
+import scipy.sparse as sp
+from ml_developers.features import Vocabulario
+
+
+class ItemCarrito:
+    """
+    Un item (una linea) del carrito de compras.
+    """
+    __slots__ = ('producto', 'cantidad', 'precio_unitario', 'pais', 'producto_no')
+
+    def __init__(self, producto: str, cantidad: int, precio_unitario: float, pais: str, producto_no: str | None = None):
+        self.producto = producto
+        self.cantidad = cantidad
+        self.precio_unitario = precio_unitario
+        self.pais = pais
+        self.producto_no = producto_no
+
+    def __str__(self):
+        return f"{self.producto} ({self.pais}) - {self.cantidad} unidades x £{self.precio_unitario:,.2f}/u = £{self.calcular_total():,.2f}"
+
+    def calcular_total(self) -> float:
+        return self.cantidad * self.precio_unitario
+
+    def linea(self) -> dict:
+        """
+        La linea con las columnas que usa el modelo de abandono (ver PredictorCarrito).
+        """
+        return {
+            'ProductNo': self.producto_no,
+            'ProductName': self.producto,
+            'Country': self.pais,
+            'Price': self.precio_unitario,
+            'Quantity': self.cantidad
+        }
+
+
+class Carrito:
+    """
+    Carrito de compras. Los items se guardan por clave (en orden de llegada), y el precio total y la cantidad
+    total se mantienen al agregar y eliminar items, asi no hay que recorrer el carrito para calcularlos.
+
+    Se define a nivel de modulo (no dentro de app.py) para que la clase sea la misma en todos los reruns de Streamlit.
+    """
+    __slots__ = ('__items', '__claves', '__precio_total', '__cantidad_total')
+
+    def __init__(self):
+        self.__items = {}
+        self.__claves = itertools.count()
+        self.__precio_total = 0.0
+        self.__cantidad_total = 0
+
+    def __len__(self):
+        return len(self.__items)
+
+    def vaciar_carrito(self):
+        self.__items = {}
+        self.__precio_total = 0.0
+        self.__cantidad_total = 0
+
+    def agregar_item(self, item: ItemCarrito) -> int:
+        """
+        Agrega un item y devuelve su clave, para poder eliminarlo despues.
+        """
+        if not isinstance(item, ItemCarrito):
+            raise ValueError("El item debe ser una instancia de la clase ItemCarrito")
+        clave = next(self.__claves)
+        self.__items[clave] = item
+        self.__precio_total += item.calcular_total()
+        self.__cantidad_total += item.cantidad
+        return clave
+
+    def eliminar_item(self, clave: int):
+        """
+        Elimina el item con esa clave (si ya no esta no hace nada).
+        """
+        item = self.__items.pop(clave, None)
+        if item is None:
+            return
+        if self.__items:
+            self.__precio_total -= item.calcular_total()
+            self.__cantidad_total -= item.cantidad
+        else:
+            # Sin items volvemos a 0 exacto, sin el error acumulado de las restas
+            self.__precio_total = 0.0
+            self.__cantidad_total = 0
+
+    def obtener_carrito(self) -> list:
+        return list(self.__items.values())
+
+    def obtener_items(self) -> list:
+        """
+        Los items con sus claves, como pares (clave, item).
+        """
+        return list(self.__items.items())
+
+    def calcular_total_precio(self) -> float:
+        return self.__precio_total
+
+    def calcular_cantidad_total(self) -> int:
+        return self.__cantidad_total
+
+    def lineas(self) -> list:
+        """
+        Las lineas del carrito con el formato que recibe el modelo (PredictorCarrito.predecir o el servidor de inferencia).
+        """
+        return [item.linea() for item in self.__items.values()]
+
+    def vector(self, vocabulario: Vocabulario) -> sp.csr_matrix:
+        """
+        La fila de features dispersa del carrito con las columnas del vocabulario del modelo (ver Vocabulario.vector),
+        para pasarla directo a predict_proba o exportarla.
+
+        Args:
+            vocabulario (Vocabulario): Vocabulario del modelo entrenado
+
+        Returns:
+            sp.csr_matrix: Matriz float32 de 1 x vocabulario.cantidad
+        """
+        return vocabulario.vector(self.lineas())
+
+    @classmethod
+    def aleatorio(cls, cantidad_lineas: int, productos: dict, paises: list, semilla: int | None = None) -> 'Carrito':
+        """
+        Arma un carrito con lineas al azar, para pruebas de carga con carritos grandes.
+
+        Args:
+            cantidad_lineas (int): Cantidad de lineas del carrito
+            productos (dict): ProductName -> ProductNo de donde se eligen los productos
+            paises (list): Paises de donde se elige el pais del carrito (uno solo para todas las lineas)
+            semilla (int | None, optional): Semilla del generador. Defaults to None.
+
+        Returns:
+            Carrito: Carrito con cantidad_lineas items
+        """
+        rng = np.random.default_rng(semilla)
+        nombres = list(productos)
+        elegidos = rng.integers(0, len(nombres), cantidad_lineas)
+        cantidades = rng.integers(1, 25, cantidad_lineas)
+        precios = np.round(rng.uniform(0.5, 20, cantidad_lineas), 2)
+        pais = paises[rng.integers(0, len(paises))]
+
+        carrito = cls()
+        for indice, cantidad, precio in zip(elegidos.tolist(), cantidades.tolist(), precios.tolist()):
+            nombre = nombres[indice]
+            carrito.agregar_item(ItemCarrito(nombre, cantidad, precio, pais, productos[nombre]))
+        return carrito
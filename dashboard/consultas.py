@@ -0,0 +1,385 @@
+import datetime
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from data_engineer.silver import ESQUEMA_PARTICION
+from data_engineer.gold import ESTADO_CANCELADO, ESTADO_CONCRETADO
+
+
+TABLA_TRANSACCIONES = 'transacciones'
+# Columna virtual de la tabla de transacciones: de que dataset de silver viene cada fila
+COLUMNA_ESTADO = 'Estado'
+# Columnas calculadas al escanear (no estan en los parquet)
+COLUMNAS_DERIVADAS = {
+    TABLA_TRANSACCIONES: {'Importe': ds.field('Price') * ds.field('Quantity')}
+}
+
+OPERADORES = ['=', '!=', '>', '>=', '<', '<=', 'entre', 'en', 'contiene', 'empieza con']
+# Como se escribe cada agregacion en el SQL que se muestra en el dashboard
+AGREGACIONES_SQL = {
+    'suma': 'SUM({})',
+    'promedio': 'AVG({})',
+    'minimo': 'MIN({})',
+    'maximo': 'MAX({})',
+    'cantidad': 'COUNT({})',
+    'distintos': 'COUNT(DISTINCT {})'
+}
+# Nombre en la interfaz -> funcion de agregacion de pyarrow
+AGREGACIONES = {
+    'suma': 'sum',
+    'promedio': 'mean',
+    'minimo': 'min',
+    'maximo': 'max',
+    'cantidad': 'count',
+    'distintos': 'count_distinct'
+}
+FILAS_MAXIMAS_DEFAULT = 1_000_000
+
+
+def _dataset(path: str) -> ds.Dataset:
+    particionado = os.path.isdir(path)
+    return ds.dataset(path, format='parquet', partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive') if particionado else None)
+
+
+def _es_texto(tipo: pa.DataType) -> bool:
+    return pa.types.is_string(tipo) or pa.types.is_large_string(tipo) or (pa.types.is_dictionary(tipo) and _es_texto(tipo.value_type))
+
+
+def convertir_valor(texto, tipo: pa.DataType):
+    """
+    Convierte un valor escrito en la interfaz (texto) al tipo de la columna: numeros, fechas YYYY-MM-DD o texto.
+    Los valores que ya vienen con tipo (int, float, date) se dejan como estan.
+    """
+    if not isinstance(texto, str):
+        return texto
+    texto = texto.strip()
+    try:
+        if pa.types.is_integer(tipo):
+            return int(texto)
+        if pa.types.is_floating(tipo):
+            return float(texto)
+        if pa.types.is_timestamp(tipo):
+            return datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise ValueError(f'"{texto}" no es un valor valido para una columna {tipo}') from None
+    return texto
+
+
+class Filtro:
+    """
+    Una condicion sobre una columna: columna, operador (uno de OPERADORES) y valor. Para 'entre' el valor es un par
+    (minimo, maximo) inclusive, y para 'en' una lista de valores.
+    """
+    def __init__(self, columna: str, operador: str, valor):
+        if operador not in OPERADORES:
+            raise ValueError(f'Operador desconocido {operador!r}, tiene que ser uno de {OPERADORES}')
+        if operador == 'entre' and (not isinstance(valor, (list, tuple)) or len(valor) != 2):
+            raise ValueError('El operador "entre" necesita dos valores (minimo, maximo)')
+        if operador == 'en' and (not isinstance(valor, (list, tuple)) or not valor):
+            raise ValueError('El operador "en" necesita una lista de valores')
+        self.columna = columna
+        self.operador = operador
+        self.valor = valor
+
+    def __repr__(self):
+        return f'Filtro({self.columna!r}, {self.operador!r}, {self.valor!r})'
+
+    @classmethod
+    def desde_texto(cls, columna: str, operador: str, texto: str, tipo: pa.DataType) -> 'Filtro':
+        """
+        Arma un filtro con el valor escrito en la interfaz, convertido al tipo de la columna.
+        Para 'entre' y 'en' los valores se separan con comas.
+        """
+        if operador in ('entre', 'en'):
+            return cls(columna, operador, [convertir_valor(valor, tipo) for valor in texto.split(',') if valor.strip()])
+        return cls(columna, operador, convertir_valor(texto, tipo))
+
+
+class Consulta:
+    """
+    Consulta sobre una tabla: filtros (todos con AND), columnas a devolver, agrupacion con agregaciones,
+    orden y limite. Es lo que arma el constructor de consultas del dashboard.
+
+    Args:
+        tabla (str): Nombre de la tabla (ver MotorConsultas.tablas)
+        filtros (list, optional): Lista de Filtro. Defaults to None.
+        columnas (list, optional): Columnas a devolver si no se agrupa. Defaults to None (todas).
+        agrupar (list, optional): Columnas por las que se agrupa. Defaults to None.
+        agregaciones (list, optional): Pares (columna, agregacion) con las agregaciones de AGREGACIONES;
+            la columna puede ser None para contar filas. Defaults to None.
+        ordenar (str, optional): Columna del resultado por la que se ordena. Defaults to None.
+        descendente (bool, optional): Orden descendente. Defaults to False.
+        limite (int, optional): Cantidad maxima de filas del resultado. Defaults to None.
+    """
+    def __init__(self, tabla: str, filtros: list | None = None, columnas: list | None = None, agrupar: list | None = None,
+                 agregaciones: list | None = None, ordenar: str | None = None, descendente: bool = False, limite: int | None = None):
+        for _, agregacion in agregaciones or []:
+            if agregacion not in AGREGACIONES:
+                raise ValueError(f'Agregacion desconocida {agregacion!r}, tiene que ser una de {list(AGREGACIONES)}')
+        if limite is not None and limite <= 0:
+            raise ValueError('El limite tiene que ser mayor a 0')
+        self.tabla = tabla
+        self.filtros = list(filtros or [])
+        self.columnas = list(columnas) if columnas else None
+        self.agrupar = list(agrupar or [])
+        self.agregaciones = list(agregaciones or [])
+        self.ordenar = ordenar
+        self.descendente = descendente
+        self.limite = limite
+
+    def agrupada(self) -> bool:
+        return bool(self.agrupar or self.agregaciones)
+
+    def columnas_leidas(self, disponibles: list) -> list:
+        """
+        Columnas que hay que leer del parquet: las del resultado, las de los filtros y las de la agrupacion.
+        """
+        if self.agrupada():
+            usadas = self.agrupar + [columna for columna, _ in self.agregaciones if columna is not None]
+        else:
+            usadas = self.columnas or disponibles
+        usadas = usadas + [filtro.columna for filtro in self.filtros]
+        return [columna for columna in disponibles if columna in usadas]
+
+    def a_sql(self) -> str:
+        """
+        La consulta escrita como SQL, para mostrarla en el dashboard.
+        """
+        def valor_sql(valor):
+            return str(valor) if isinstance(valor, (int, float)) else f"'{valor}'"
+
+        condiciones = []
+        for filtro in self.filtros:
+            if filtro.operador == 'entre':
+                condicion = f'{filtro.columna} BETWEEN {valor_sql(filtro.valor[0])} AND {valor_sql(filtro.valor[1])}'
+            elif filtro.operador == 'en':
+                condicion = f'{filtro.columna} IN ({", ".join(valor_sql(v) for v in filtro.valor)})'
+            elif filtro.operador == 'contiene':
+                condicion = f"{filtro.columna} ILIKE '%{filtro.valor}%'"
+            elif filtro.operador == 'empieza con':
+                condicion = f"{filtro.columna} ILIKE '{filtro.valor}%'"
+            else:
+                condicion = f'{filtro.columna} {filtro.operador} {valor_sql(filtro.valor)}'
+            condiciones.append(condicion)
+
+        if self.agrupada():
+            seleccion = self.agrupar + [
+                AGREGACIONES_SQL[agregacion].format(columna if columna is not None else '*') for columna, agregacion in self.agregaciones
+            ]
+        else:
+            seleccion = self.columnas or ['*']
+        sql = f'SELECT {", ".join(seleccion)} FROM {self.tabla}'
+        if condiciones:
+            sql += f' WHERE {" AND ".join(condiciones)}'
+        if self.agrupar:
+            sql += f' GROUP BY {", ".join(self.agrupar)}'
+        if self.ordenar:
+            sql += f' ORDER BY {self.ordenar}{" DESC" if self.descendente else ""}'
+        if self.limite:
+            sql += f' LIMIT {self.limite}'
+        return sql
+
+
+class MotorConsultas:
+    """
+    Motor de consultas embebido sobre los parquet de silver y gold (pyarrow.dataset + Acero, sin servidor).
+
+    - Los filtros se empujan al escaneo: los de Country y Date descartan particiones (Country / YearMonth) sin abrir
+      sus archivos, el resto se evalua con las estadisticas de los row groups y despues fila a fila.
+    - Solo se leen las columnas que usa la consulta.
+    - El escaneo, el filtrado y la agregacion corren en varios threads.
+
+    La tabla 'transacciones' junta los datasets de canceladas y concretadas de silver, con una columna Estado
+    (un filtro por Estado no lee el otro dataset) y la columna calculada Importe (Price * Quantity).
+    Cada parquet de gold es una tabla con el nombre del archivo.
+    """
+    def __init__(self, tablas: dict, filas_maximas: int = FILAS_MAXIMAS_DEFAULT):
+        self.__tablas = tablas
+        self.filas_maximas = filas_maximas
+
+    @classmethod
+    def abrir(cls, path_canceladas: str, path_concretadas: str, path_gold: str, filas_maximas: int = FILAS_MAXIMAS_DEFAULT) -> 'MotorConsultas':
+        """
+        Abre los datasets (solo lee los schemas, no los datos).
+        """
+        tablas = {TABLA_TRANSACCIONES: {ESTADO_CANCELADO: _dataset(path_canceladas), ESTADO_CONCRETADO: _dataset(path_concretadas)}}
+        if os.path.isdir(path_gold):
+            for archivo in sorted(os.listdir(path_gold)):
+                if archivo.endswith('.parquet'):
+                    tablas[archivo[:-len('.parquet')]] = {None: _dataset(os.path.join(path_gold, archivo))}
+        return cls(tablas, filas_maximas)
+
+    @property
+    def tablas(self) -> list:
+        return list(self.__tablas)
+
+    def esquema(self, tabla: str) -> pa.Schema:
+        """
+        Columnas de la tabla con sus tipos, incluidas las virtuales y las calculadas.
+        """
+        datasets = self.__datasets(tabla)
+        esquema = next(iter(datasets.values())).schema
+        campos = [campo for campo in esquema if not campo.name.startswith('__')]
+        if tabla == TABLA_TRANSACCIONES:
+            campos.append(pa.field(COLUMNA_ESTADO, pa.string()))
+        for nombre in COLUMNAS_DERIVADAS.get(tabla, {}):
+            campos.append(pa.field(nombre, pa.float64()))
+        return pa.schema(campos)
+
+    def __datasets(self, tabla: str) -> dict:
+        if tabla not in self.__tablas:
+            raise ValueError(f'No existe la tabla {tabla!r}, las tablas son {self.tablas}')
+        return self.__tablas[tabla]
+
+    def __expresion(self, tabla: str, columna: str) -> ds.Expression:
+        return COLUMNAS_DERIVADAS.get(tabla, {}).get(columna, ds.field(columna))
+
+    def __condicion(self, tabla: str, esquema: pa.Schema, filtro: Filtro, particionado: bool) -> ds.Expression:
+        tipo = esquema.field(filtro.columna).type
+        campo = self.__expresion(tabla, filtro.columna)
+
+        def escalar(valor):
+            valor = convertir_valor(valor, tipo)
+            if pa.types.is_timestamp(tipo):
+                if isinstance(valor, datetime.date) and not isinstance(valor, datetime.datetime):
+                    valor = datetime.datetime.combine(valor, datetime.time.min)
+                return pa.scalar(valor, type=tipo)
+            return pa.scalar(valor, type=tipo.value_type if pa.types.is_dictionary(tipo) else tipo)
+
+        if filtro.operador in ('contiene', 'empieza con'):
+            if not _es_texto(tipo):
+                raise ValueError(f'El operador "{filtro.operador}" solo se puede usar con columnas de texto ({filtro.columna} es {tipo})')
+            texto = campo.cast(pa.string()) if pa.types.is_dictionary(tipo) else campo
+            funcion = pc.match_substring if filtro.operador == 'contiene' else pc.starts_with
+            return funcion(texto, pattern=str(filtro.valor), ignore_case=True)
+        if filtro.operador == 'en':
+            return campo.isin([escalar(valor).as_py() for valor in filtro.valor])
+        if filtro.operador == 'entre':
+            minimo, maximo = escalar(filtro.valor[0]), escalar(filtro.valor[1])
+            if pa.types.is_timestamp(tipo):
+                # Con fechas el maximo incluye todo el dia
+                maximo = pa.scalar(maximo.as_py() + datetime.timedelta(days=1), type=tipo)
+                condicion = (campo >= minimo) & (campo < maximo)
+            else:
+                condicion = (campo >= minimo) & (campo <= maximo)
+        else:
+            valor = escalar(filtro.valor)
+            condicion = {
+                '=': lambda: campo == valor, '!=': lambda: campo != valor, '>': lambda: campo > valor,
+                '>=': lambda: campo >= valor, '<': lambda: campo < valor, '<=': lambda: campo <= valor
+            }[filtro.operador]()
+
+        # Las fechas tambien se filtran por la particion YearMonth, asi no se abren los archivos de otros meses
+        if particionado and filtro.columna == 'Date' and filtro.operador in ('entre', '>', '>=', '<', '<=', '='):
+            minimo = escalar(filtro.valor[0] if filtro.operador == 'entre' else filtro.valor).as_py()
+            maximo = escalar(filtro.valor[1] if filtro.operador == 'entre' else filtro.valor).as_py()
+            if filtro.operador in ('entre', '>', '>=', '='):
+                condicion = condicion & (ds.field('YearMonth') >= minimo.strftime('%Y-%m'))
+            if filtro.operador in ('entre', '<', '<=', '='):
+                condicion = condicion & (ds.field('YearMonth') <= maximo.strftime('%Y-%m'))
+        return condicion
+
+    def __filtra_estado(self, filtros: list, estado: str) -> bool:
+        """
+        False si los filtros sobre Estado descartan todo el dataset de ese estado.
+        """
+        for filtro in filtros:
+            if filtro.columna != COLUMNA_ESTADO:
+                continue
+            if filtro.operador not in ('=', '!=', 'en'):
+                raise ValueError(f'La columna {COLUMNA_ESTADO} solo se puede filtrar con =, != o en')
+            if filtro.operador == '=' and filtro.valor != estado:
+                return False
+            if filtro.operador == '!=' and filtro.valor == estado:
+                return False
+            if filtro.operador == 'en' and estado not in filtro.valor:
+                return False
+        return True
+
+    def escanear(self, consulta: Consulta, filas: int | None = None) -> pa.Table:
+        """
+        Lee las filas y columnas que necesita la consulta, con los filtros aplicados en el escaneo.
+        Con filas, el escaneo para en cuanto junta esa cantidad de filas.
+        """
+        esquema = self.esquema(consulta.tabla)
+        referenciadas = (consulta.columnas or []) + consulta.agrupar + [f.columna for f in consulta.filtros] + [
+            columna for columna, _ in consulta.agregaciones if columna is not None
+        ]
+        for columna in referenciadas:
+            if columna not in esquema.names:
+                raise ValueError(f'La tabla {consulta.tabla} no tiene la columna {columna!r}')
+
+        columnas = consulta.columnas_leidas(esquema.names)
+        filtros_escaneo = [filtro for filtro in consulta.filtros if filtro.columna != COLUMNA_ESTADO]
+
+        partes = []
+        for estado, dataset in self.__datasets(consulta.tabla).items():
+            if estado is not None and not self.__filtra_estado(consulta.filtros, estado):
+                continue
+            if filas is not None and sum(parte.num_rows for parte in partes) >= filas:
+                break
+            particionado = 'YearMonth' in dataset.schema.names
+            filtro = None
+            for condicion in (self.__condicion(consulta.tabla, esquema, f, particionado) for f in filtros_escaneo):
+                filtro = condicion if filtro is None else filtro & condicion
+            proyeccion = {columna: self.__expresion(consulta.tabla, columna) for columna in columnas if columna != COLUMNA_ESTADO}
+            if filas is not None:
+                tabla = dataset.head(filas - sum(parte.num_rows for parte in partes), columns=proyeccion, filter=filtro, use_threads=True)
+            else:
+                tabla = dataset.to_table(columns=proyeccion, filter=filtro, use_threads=True)
+            if COLUMNA_ESTADO in columnas:
+                tabla = tabla.append_column(COLUMNA_ESTADO, pa.array([estado] * tabla.num_rows, type=pa.string()))
+                tabla = tabla.select(columnas)
+            partes.append(tabla)
+
+        if not partes:
+            return esquema.empty_table().select(columnas)
+        # Cada dataset tiene sus propios diccionarios, se unifican para poder agrupar por esas columnas
+        return pa.concat_tables(partes).unify_dictionaries()
+
+    def ejecutar(self, consulta: Consulta) -> pa.Table:
+        """
+        Ejecuta la consulta.
+
+        Args:
+            consulta (Consulta): Consulta a ejecutar
+
+        Returns:
+            pa.Table: Resultado. Las columnas agregadas se llaman columna_agregacion (o cantidad_filas para contar filas).
+        """
+        # Sin agrupar ni ordenar alcanza con las primeras filas que pasan los filtros
+        limite = min(consulta.limite or self.filas_maximas, self.filas_maximas)
+        tabla = self.escanear(consulta, limite if not consulta.agrupada() and consulta.ordenar is None else None)
+
+        if consulta.agrupada():
+            agregaciones = [
+                (columna, AGREGACIONES[agregacion]) if columna is not None else ([], 'count_all')
+                for columna, agregacion in consulta.agregaciones
+            ]
+            try:
+                tabla = tabla.group_by(consulta.agrupar, use_threads=True).aggregate(agregaciones)
+            except pa.ArrowNotImplementedError as error:
+                # Por ejemplo sumar una columna de texto
+                raise ValueError(f'No se puede calcular la agregacion: {error}') from None
+            # pyarrow nombra las agregaciones columna_funcion (y count_all la de contar filas)
+            generadas = [f'{columna}_{funcion}' if columna else funcion for columna, funcion in agregaciones]
+            nombres = [
+                f'{columna}_{agregacion}' if columna is not None else 'cantidad_filas'
+                for columna, agregacion in consulta.agregaciones
+            ]
+            tabla = tabla.select(consulta.agrupar + generadas).rename_columns(consulta.agrupar + nombres)
+        elif consulta.columnas:
+            tabla = tabla.select(consulta.columnas)
+
+        if consulta.ordenar is not None:
+            if consulta.ordenar not in tabla.column_names:
+                raise ValueError(f'No se puede ordenar por {consulta.ordenar!r}, las columnas del resultado son {tabla.column_names}')
+            orden = [(consulta.ordenar, 'descending' if consulta.descendente else 'ascending')]
+            if consulta.limite is not None and consulta.limite < tabla.num_rows:
+                # Con limite alcanza con los primeros k, sin ordenar toda la tabla
+                tabla = tabla.take(pc.select_k_unstable(tabla, k=consulta.limite, sort_keys=orden)).sort_by(orden)
+            else:
+                tabla = tabla.sort_by(orden)
+
+        return tabla.slice(0, limite)
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from data_engineer.silver import COLUMNAS_SILVER, ESQUEMA_PARTICION, ESQUEMA_SILVER, version_silver
+from data_engineer.gold import ESTADO_CANCELADO, ESTADO_CONCRETADO
+from dashboard.busqueda import IndicePaises, IndiceTransacciones
+
+
+# El prefijo v2 identifica el layout del archivo (ordenado por pais), si cambia el layout cambia el nombre
+ARCHIVO_CACHE = 'transacciones-v2-{version}.arrow'
+METADATA_FILAS_CANCELADAS = b'filas_canceladas'
+
+
+def _leer_dataset(path: str) -> pa.Table:
+    particionado = os.path.isdir(path)
+    dataset = ds.dataset(path, format='parquet', partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive') if particionado else None)
+    return dataset.to_table(columns=COLUMNAS_SILVER).cast(ESQUEMA_SILVER)
+
+
+def ordenar_por_pais(tabla: pa.Table) -> pa.Table:
+    """
+    Ordena las filas por Country. El orden es estable, dentro de cada pais se mantiene el orden original.
+    """
+    return tabla.take(pc.sort_indices(tabla['Country'].cast(pa.string())))
+
+
+def construir_cache_arrow(path_canceladas: str, path_concretadas: str, path_arrow: str):
+    """
+    Escribe las transacciones canceladas y concretadas (en ese orden, y cada bloque ordenado por pais) en un unico archivo
+    Arrow IPC sin comprimir, que despues se puede mapear en memoria sin copiar nada. La cantidad de canceladas queda en la metadata del schema.
+    """
+    canceladas = ordenar_por_pais(_leer_dataset(path_canceladas))
+    concretadas = ordenar_por_pais(_leer_dataset(path_concretadas))
+    tabla = pa.concat_tables([canceladas, concretadas]).unify_dictionaries().combine_chunks()
+    tabla = tabla.replace_schema_metadata({METADATA_FILAS_CANCELADAS: str(canceladas.num_rows).encode()})
+
+    path_tmp = path_arrow + '.tmp'
+    with pa.OSFile(path_tmp, 'wb') as sink, pa.ipc.new_file(sink, tabla.schema) as writer:
+        writer.write_table(tabla)
+    os.replace(path_tmp, path_arrow)
+
+
+def _tipo_pandas(tipo: pa.DataType):
+    # Los strings quedan respaldados por los buffers de arrow (sin convertirlos a objetos de python)
+    if pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+        return pd.ArrowDtype(tipo)
+    return None
+
+
+def cortar(df: pd.DataFrame, rangos: list) -> pd.DataFrame:
+    """
+    Filas de df en los rangos de posiciones (inicio, fin). Un solo rango es un slice (vista, sin copiar);
+    con varios se copian solo las filas de los rangos.
+    """
+    if len(rangos) == 1:
+        return df.iloc[rangos[0][0]:rangos[0][1]]
+    return df.iloc[np.concatenate([np.arange(inicio, fin) for inicio, fin in rangos] or [np.empty(0, dtype=np.int64)])]
+
+
+def _huella(df: pd.DataFrame) -> tuple:
+    """
+    Identifica las columnas de un dataframe y los arrays que las respaldan. Si se agrega, reemplaza
+    o reasigna una columna la huella cambia.
+    """
+    huella = []
+    for col in df.columns:
+        array = df[col].array
+        if isinstance(array, pd.arrays.NumpyExtensionArray):
+            # Este wrapper se crea de nuevo en cada acceso, usamos la direccion de los datos
+            array = array.to_numpy().__array_interface__['data'][0]
+        else:
+            array = id(array)
+        huella.append((col, array))
+    return tuple(huella), len(df)
+
+
+class DatosSilver:
+    """
+    Capa de datos de solo lectura sobre las transacciones de silver, pensada para compartirse entre
+    todas las sesiones de streamlit (con st.cache_resource).
+
+    La tabla se mapea en memoria desde un archivo Arrow IPC, y los dataframes de canceladas y concretadas
+    son vistas (slices) del dataframe de ambas, no copias. Nada se concatena ni se duplica por sesion.
+    Dentro de cada bloque las filas estan ordenadas por pais, asi que filtrar por pais tambien es un corte (ver IndicePaises).
+
+    Las columnas derivadas (Month y Status) se calculan una sola vez al cargar, de forma vectorizada.
+    Los dataframes no se tienen que modificar: las columnas numericas mapeadas son de solo lectura,
+    y sin_modificar detecta si alguien agrego o reemplazo columnas.
+    """
+    def __init__(self, tabla: pa.Table, filas_canceladas: int, version: str):
+        self.tabla = tabla
+        self.filas_canceladas = filas_canceladas
+        self.version = version
+        ambas = tabla.to_pandas(types_mapper=_tipo_pandas, split_blocks=True)
+
+        # Las canceladas son las primeras filas de la tabla, el estado sale de la posicion sin mirar TransactionNo
+        codigos_estado = np.repeat(np.array([0, 1], dtype=np.int8), [filas_canceladas, len(ambas) - filas_canceladas])
+        # Month es el primer dia del mes (datetime64 en lugar de Period, asi se puede exportar a json / csv)
+        ambas['Month'] = ambas['Date'].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
+        ambas['Status'] = pd.Categorical.from_codes(codigos_estado, categories=[ESTADO_CANCELADO, ESTADO_CONCRETADO])
+
+        self.ambas = ambas
+        self.canceladas = ambas.iloc[:filas_canceladas]
+        self.concretadas = ambas.iloc[filas_canceladas:]
+        self.indice_transacciones = IndiceTransacciones(ambas['TransactionNo'])
+        self.indice_paises = IndicePaises(ambas['Country'], filas_canceladas)
+        self.paises = self.indice_paises.paises
+        self.__huellas = self.__calcular_huellas()
+
+    def __calcular_huellas(self) -> tuple:
+        return tuple(_huella(df) for df in (self.ambas, self.canceladas, self.concretadas))
+
+    def sin_modificar(self) -> bool:
+        """
+        Si los dataframes compartidos siguen como se cargaron (sin columnas agregadas o reemplazadas, ni filas distintas).
+        """
+        return self.__calcular_huellas() == self.__huellas
+
+    def __rangos(self, vista: str, pais: str | None) -> list:
+        # Cada vista, y cada pais dentro de una vista, es un rango de filas de ambas
+        if pais is not None:
+            return self.indice_paises.rango(pais, vista)
+        match vista:
+            case 'canceladas':
+                return [(0, self.filas_canceladas)]
+            case 'concretadas':
+                return [(self.filas_canceladas, len(self.ambas))]
+            case _:
+                return [(0, len(self.ambas))]
+
+    def filtrar_pais(self, pais: str | None, vista: str = 'ambas') -> pd.DataFrame:
+        """
+        Filas de un pais usando el indice de paises. Para canceladas o concretadas es una vista (sin copiar);
+        para ambas son dos cortes que se juntan, asi que solo se copian las filas del pais.
+
+        Args:
+            pais (str | None): Pais a filtrar. None devuelve la vista completa.
+            vista (str, optional): 'ambas', 'canceladas' o 'concretadas'. Defaults to 'ambas'.
+
+        Returns:
+            pd.DataFrame: Filas del pais en la vista
+        """
+        return cortar(self.ambas, self.__rangos(vista, pais))
+
+    def buscar_transaccion(self, texto: str, vista: str = 'ambas', pais: str | None = None) -> pd.DataFrame:
+        """
+        Busca las filas cuyo numero de transaccion contiene texto usando el indice, sin recorrer ni copiar el dataframe completo:
+        solo se copian las filas encontradas.
+
+        Args:
+            texto (str): texto a buscar en TransactionNo
+            vista (str, optional): 'ambas', 'canceladas' o 'concretadas'. Defaults to 'ambas'.
+            pais (str, optional): Pais a filtrar. Defaults to None (todos los paises).
+
+        Returns:
+            pd.DataFrame: Filas encontradas, en el mismo orden que en la vista
+        """
+        posiciones = self.indice_transacciones.buscar(texto)
+        # Las posiciones estan ordenadas, quedarse con las de un rango es cortar con searchsorted
+        posiciones = np.concatenate([
+            posiciones[np.searchsorted(posiciones, inicio):np.searchsorted(posiciones, fin)] for inicio, fin in self.__rangos(vista, pais)
+        ] or [posiciones[:0]])
+        return self.ambas.iloc[posiciones]
+
+    @classmethod
+    def abrir(cls, path_canceladas: str, path_concretadas: str, directorio_cache: str, version: str | None = None) -> 'DatosSilver':
+        """
+        Abre los datos de silver. Si no existe el archivo Arrow de la version actual de silver se construye
+        (una sola vez por version), y despues se mapea en memoria.
+
+        Args:
+            path_canceladas (str): path del dataset de transacciones canceladas
+            path_concretadas (str): path del dataset de transacciones concretadas
+            directorio_cache (str): directorio donde se guarda el archivo Arrow. Si no se puede escribir se usa el temporal del sistema.
+            version (str, optional): Version de silver si ya se calculo (version_silver). Defaults to None.
+
+        Returns:
+            DatosSilver: Datos listos para usar
+        """
+        version = version if version is not None else version_silver(path_canceladas, path_concretadas)
+        try:
+            os.makedirs(directorio_cache, exist_ok=True)
+        except OSError:
+            directorio_cache = tempfile.gettempdir()
+
+        path_arrow = os.path.join(directorio_cache, ARCHIVO_CACHE.format(version=version))
+        if not os.path.exists(path_arrow):
+            construir_cache_arrow(path_canceladas, path_concretadas, path_arrow)
+            # Borramos los archivos de versiones anteriores
+            for archivo in os.listdir(directorio_cache):
+                if archivo.startswith('transacciones-') and archivo.endswith('.arrow') and archivo != os.path.basename(path_arrow):
+                    os.remove(os.path.join(directorio_cache, archivo))
+
+        tabla = pa.ipc.open_file(pa.memory_map(path_arrow, 'r')).read_all()
+        filas_canceladas = int(tabla.schema.metadata[METADATA_FILAS_CANCELADAS])
+        return cls(tabla, filas_canceladas, version)
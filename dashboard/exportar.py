@@ -0,0 +1,73 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+FILAS_POR_CHUNK = 50_000
+
+# formato -> (nombre del archivo, mime)
+FORMATOS = {
+    'CSV': ('transacciones.csv', 'text/csv'),
+    'JSON': ('transacciones.json', 'application/json'),
+    'Parquet': ('transacciones.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def _chunks(df: pd.DataFrame, filas_por_chunk: int):
+    for inicio in range(0, len(df), filas_por_chunk):
+        yield df.iloc[inicio:inicio + filas_por_chunk]
+
+
+def exportar_csv(df: pd.DataFrame, destino, filas_por_chunk: int = FILAS_POR_CHUNK):
+    """
+    Escribe df como csv en destino (archivo binario) por chunks, sin armar el string completo en memoria.
+    """
+    destino.write(df.iloc[:0].to_csv(index=False).encode('utf-8'))
+    for chunk in _chunks(df, filas_por_chunk):
+        destino.write(chunk.to_csv(index=False, header=False).encode('utf-8'))
+
+
+def exportar_json(df: pd.DataFrame, destino, filas_por_chunk: int = FILAS_POR_CHUNK):
+    """
+    Escribe df como json en destino (archivo binario) por chunks, con el mismo formato que df.to_json(orient='records').
+    """
+    destino.write(b'[')
+    for i, chunk in enumerate(_chunks(df, filas_por_chunk)):
+        # Cada chunk es una lista de records, le sacamos los corchetes y los unimos con comas
+        if i > 0:
+            destino.write(b',')
+        destino.write(chunk.to_json(orient='records')[1:-1].encode('utf-8'))
+    destino.write(b']')
+
+
+def exportar_parquet(df: pd.DataFrame, destino, filas_por_chunk: int = FILAS_POR_CHUNK):
+    """
+    Escribe df como parquet en destino (archivo binario), un row group por chunk.
+    """
+    # El schema se infiere de todo df: con df.iloc[:0] las columnas object (los strings) quedan como null
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(destino, schema) as writer:
+        for chunk in _chunks(df, filas_por_chunk):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def exportar(df: pd.DataFrame, formato: str, filas_por_chunk: int = FILAS_POR_CHUNK) -> bytes:
+    """
+    Exporta df en el formato pedido ('CSV', 'JSON' o 'Parquet'), serializando por chunks de filas.
+
+    Args:
+        df (pd.DataFrame): Datos a exportar
+        formato (str): Una de las claves de FORMATOS
+        filas_por_chunk (int, optional): Cantidad de filas que se serializan por vez. Defaults to FILAS_POR_CHUNK.
+
+    Returns:
+        bytes: Contenido del archivo
+    """
+    exportadores = {'CSV': exportar_csv, 'JSON': exportar_json, 'Parquet': exportar_parquet}
+    if formato not in exportadores:
+        raise ValueError(f'Formato desconocido: {formato}')
+
+    buffer = io.BytesIO()
+    exportadores[formato](df, buffer, filas_por_chunk)
+    return buffer.getvalue()
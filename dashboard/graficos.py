@@ -0,0 +1,79 @@
+import io
+import threading
+from collections import OrderedDict
+from matplotlib import pyplot as plt
+from PIL import Image
+
+
+MAX_GRAFICOS_DEFAULT = 128
+# Las mismas opciones que usa st.pyplot, asi los graficos se ven igual
+OPCIONES_SAVEFIG = {'bbox_inches': 'tight', 'dpi': 200}
+# Streamlit reescala (en cada rerun) las imagenes mas anchas que esto, asi que las guardamos ya reescaladas
+ANCHO_MAXIMO_DEFAULT = 1460
+
+
+def _reescalar_png(imagen: bytes, ancho_maximo: int) -> bytes:
+    png = Image.open(io.BytesIO(imagen))
+    ancho, alto = png.size
+    if ancho <= ancho_maximo:
+        return imagen
+    buffer = io.BytesIO()
+    png.resize((ancho_maximo, int(alto * ancho_maximo / ancho)), resample=Image.BILINEAR).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class CacheGraficos:
+    """
+    Cache LRU de graficos de matplotlib ya renderizados (bytes PNG o SVG), compartido entre sesiones.
+
+    La clave es (id del grafico, parametros, version de los datos, formato): si cambian los datos cambia la version
+    y las entradas viejas dejan de usarse hasta que salen por LRU. Las figuras se cierran siempre despues de renderizarlas.
+    """
+    def __init__(self, max_graficos: int = MAX_GRAFICOS_DEFAULT, ancho_maximo: int | None = ANCHO_MAXIMO_DEFAULT):
+        self.max_graficos = max_graficos
+        self.ancho_maximo = ancho_maximo
+        self.graficos = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.__lock = threading.Lock()
+
+    def render(self, id_grafico: str, parametros: tuple, version: str, dibujar, formato: str = 'png') -> bytes:
+        """
+        Devuelve el grafico renderizado. Si no esta en la cache llama a dibujar() para crear la figura,
+        la guarda como bytes y la cierra.
+
+        Args:
+            id_grafico (str): Identificador del grafico
+            parametros (tuple): Parametros que cambian el grafico (pais, producto, etc), tienen que ser hasheables
+            version (str): Version de los datos con los que se dibuja
+            dibujar (Callable[[], Figure]): Funcion que crea y devuelve la figura
+            formato (str, optional): 'png' o 'svg'. Defaults to 'png'.
+
+        Returns:
+            bytes: Imagen del grafico
+        """
+        clave = (id_grafico, parametros, version, formato)
+        with self.__lock:
+            if clave in self.graficos:
+                self.graficos.move_to_end(clave)
+                self.aciertos += 1
+                return self.graficos[clave]
+
+        # Renderizamos fuera del lock, dos sesiones pidiendo el mismo grafico a la vez solo lo dibujan dos veces
+        fig = dibujar()
+        try:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=formato, **OPCIONES_SAVEFIG)
+        finally:
+            plt.close(fig)
+        imagen = buffer.getvalue()
+        if formato == 'png' and self.ancho_maximo is not None:
+            imagen = _reescalar_png(imagen, self.ancho_maximo)
+
+        with self.__lock:
+            self.fallos += 1
+            self.graficos[clave] = imagen
+            self.graficos.move_to_end(clave)
+            while len(self.graficos) > self.max_graficos:
+                self.graficos.popitem(last=False)
+        return imagen
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from data_engineer.incremental import calcular_hash, guardar_estado, leer_estado
+
+
+try:
+    import fcntl
+except ImportError:
+    # En Windows no hay fcntl: las descargas no se bloquean entre procesos
+    fcntl = None
+
+ARCHIVO_MANIFIESTO = '_manifiesto_bronze.json'
+ARCHIVO_BLOQUEO = '.descarga.lock'
+TAMANIO_BLOQUE = 1024 * 1024
+
+
+class FuenteDataset(ABC):
+    """
+    Origen de un dataset de bronze. Las subclases implementan:
+
+    - version(): identificador de la version remota, barato de consultar (metadata, no los datos). Si no cambio
+      desde la ultima descarga no hace falta volver a descargar.
+    - descargar(destino, desde_byte): escribe el archivo del dataset (un zip o el csv directo) en destino.
+      Si la fuente puede retomar una descarga, con desde_byte > 0 agrega a destino solo lo que falta
+      y devuelve True; si no puede, reescribe destino entero y devuelve False.
+    """
+    nombre = 'dataset'
+
+    @abstractmethod
+    def version(self) -> str:
+        """
+        Identificador de la version remota del dataset.
+        """
+
+    @abstractmethod
+    def descargar(self, destino: str, desde_byte: int = 0) -> bool:
+        """
+        Escribe el archivo del dataset en destino. Devuelve True si retomo una descarga desde desde_byte.
+        """
+
+
+class FuenteLocal(FuenteDataset):
+    """
+    Un archivo local (zip o csv) como fuente del dataset, para correr el ETL sin conexion.
+    La version es el tamaño y la fecha de modificacion del archivo.
+    """
+    def __init__(self, path: str):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'No existe el archivo {path}')
+        self.path = path
+        self.nombre = os.path.basename(path)
+
+    def version(self) -> str:
+        info = os.stat(self.path)
+        return f'{info.st_size}:{info.st_mtime_ns}'
+
+    def descargar(self, destino: str, desde_byte: int = 0) -> bool:
+        with open(self.path, 'rb') as origen, open(destino, 'ab' if desde_byte else 'wb') as archivo:
+            origen.seek(desde_byte)
+            shutil.copyfileobj(origen, archivo, TAMANIO_BLOQUE)
+        return bool(desde_byte)
+
+
+class FuenteKaggle(FuenteDataset):
+    """
+    Dataset de kaggle.com. El cliente de kaggle se importa recien al usarlo (al importarse ya se autentica
+    con KAGGLE_USERNAME / KAGGLE_KEY), asi el resto del ETL no depende de kaggle ni de las credenciales.
+
+    La version sale de la lista de archivos del dataset (nombres, tamaños y fechas), sin descargar nada.
+    La API no permite retomar descargas, cada descarga empieza de cero.
+    """
+    def __init__(self, dataset: str):
+        self.dataset = dataset
+        self.nombre = dataset
+        self.__api = None
+
+    def __conectar(self):
+        if self.__api is None:
+            from kaggle.api.kaggle_api_extended import KaggleApi
+            api = KaggleApi()
+            api.authenticate()
+            self.__api = api
+        return self.__api
+
+    def version(self) -> str:
+        archivos = self.__conectar().dataset_list_files(self.dataset).files
+        descripcion = sorted(
+            (str(archivo.name), str(getattr(archivo, 'totalBytes', getattr(archivo, 'size', ''))), str(getattr(archivo, 'creationDate', '')))
+            for archivo in archivos
+        )
+        return hashlib.sha256(json.dumps(descripcion).encode()).hexdigest()[:16]
+
+    def descargar(self, destino: str, desde_byte: int = 0) -> bool:
+        # La API descarga el zip (por bloques) en un directorio, lo movemos a destino
+        directorio = tempfile.mkdtemp(dir=os.path.dirname(destino) or '.', prefix='.kaggle-')
+        try:
+            self.__conectar().dataset_download_files(self.dataset, directorio, unzip=False, force=True, quiet=True)
+            archivos = os.listdir(directorio)
+            if len(archivos) != 1:
+                raise ValueError(f'Se esperaba un solo archivo descargado de {self.dataset}, se encontraron {archivos}')
+            os.replace(os.path.join(directorio, archivos[0]), destino)
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+        return False
+
+
+def _copiar_con_hash(origen, path_destino: str) -> tuple:
+    """
+    Copia un stream a un archivo por bloques calculando el sha256 al mismo tiempo.
+
+    Returns:
+        tuple: (sha256, bytes copiados)
+    """
+    sha = hashlib.sha256()
+    bytes_copiados = 0
+    with open(path_destino, 'wb') as destino:
+        for bloque in iter(lambda: origen.read(TAMANIO_BLOQUE), b''):
+            sha.update(bloque)
+            destino.write(bloque)
+            bytes_copiados += len(bloque)
+    return sha.hexdigest(), bytes_copiados
+
+
+def _extraer(path_descarga: str, path_destino: str, archivo_en_dataset: str | None) -> tuple:
+    """
+    Escribe en path_destino el csv del dataset: el archivo descargado si no es un zip, o el archivo del zip
+    (archivo_en_dataset, o el unico .csv que tenga).
+    """
+    if not zipfile.is_zipfile(path_descarga):
+        with open(path_descarga, 'rb') as origen:
+            return _copiar_con_hash(origen, path_destino)
+
+    with zipfile.ZipFile(path_descarga) as archivo_zip:
+        if archivo_en_dataset is not None:
+            miembro = archivo_en_dataset
+        else:
+            csvs = [nombre for nombre in archivo_zip.namelist() if nombre.lower().endswith('.csv')]
+            if len(csvs) != 1:
+                raise ValueError(f'No se puede elegir el csv del dataset, el zip tiene {csvs}: especificar archivo_en_dataset')
+            miembro = csvs[0]
+        with archivo_zip.open(miembro) as origen:
+            return _copiar_con_hash(origen, path_destino)
+
+
+@contextmanager
+def _bloqueo(directorio: str):
+    """
+    Bloqueo exclusivo del directorio de bronze, para que dos ejecuciones al mismo tiempo no escriban el mismo parcial
+    ni el manifiesto. Se libera solo si el proceso muere.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directorio, ARCHIVO_BLOQUEO), 'w') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def _parcial(directorio: str, nombre_archivo: str, version: str) -> str:
+    # El nombre del parcial incluye la version: una descarga cortada solo se retoma si el dataset no cambio
+    clave = hashlib.sha256(version.encode()).hexdigest()[:12]
+    return os.path.join(directorio, f'.{nombre_archivo}.{clave}.parcial')
+
+
+def adquirir_dataset(fuente: FuenteDataset, directorio: str, nombre_archivo: str, archivo_en_dataset: str | None = None) -> dict:
+    """
+    Deja el csv del dataset en directorio/nombre_archivo, descargandolo solo si hace falta.
+
+    - Si la version de la fuente es la del manifiesto y el archivo publicado sigue teniendo el sha256 del manifiesto,
+      no se descarga nada.
+    - Si no, se descarga a un archivo parcial (si quedo uno de una descarga cortada de la misma version y la fuente
+      lo permite, se retoma), se extrae a un archivo temporal en el mismo directorio calculando su sha256,
+      y se publica con un rename atomico: quien lea el archivo ve el anterior o el nuevo completo, nunca uno a medias.
+    - El manifiesto (fuente, version, sha256, bytes, fecha) se escribe despues de publicar, tambien con un rename.
+
+    Args:
+        fuente (FuenteDataset): De donde se obtiene el dataset
+        directorio (str): Directorio de bronze
+        nombre_archivo (str): Nombre con el que se publica el csv
+        archivo_en_dataset (str, optional): Archivo del zip a publicar. Defaults to None (el unico .csv del zip).
+
+    Returns:
+        dict: path del csv, si se descargo, y el manifiesto
+    """
+    os.makedirs(directorio, exist_ok=True)
+    with _bloqueo(directorio):
+        return _adquirir(fuente, directorio, nombre_archivo, archivo_en_dataset)
+
+
+def _adquirir(fuente: FuenteDataset, directorio: str, nombre_archivo: str, archivo_en_dataset: str | None) -> dict:
+    path = os.path.join(directorio, nombre_archivo)
+    path_manifiesto = os.path.join(directorio, ARCHIVO_MANIFIESTO)
+    manifiesto = leer_estado(path_manifiesto).get(nombre_archivo)
+
+    version = fuente.version()
+    if (manifiesto is not None and manifiesto['version'] == version and os.path.exists(path)
+            and os.path.getsize(path) == manifiesto['bytes'] and calcular_hash(path) == manifiesto['sha256']):
+        return {'path': path, 'descargado': False, 'manifiesto': manifiesto}
+
+    path_parcial = _parcial(directorio, nombre_archivo, version)
+    desde_byte = os.path.getsize(path_parcial) if os.path.exists(path_parcial) else 0
+    retomado = fuente.descargar(path_parcial, desde_byte)
+
+    descriptor, path_tmp = tempfile.mkstemp(dir=directorio, prefix=f'.{nombre_archivo}.', suffix='.tmp')
+    os.close(descriptor)
+    try:
+        sha256, bytes_csv = _extraer(path_parcial, path_tmp, archivo_en_dataset)
+        os.replace(path_tmp, path)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        # Si no se pudo extraer, lo descargado no sirve para retomar
+        if os.path.exists(path_parcial):
+            os.remove(path_parcial)
+        raise
+    os.remove(path_parcial)
+
+    manifiesto = {
+        'fuente': fuente.nombre,
+        'version': version,
+        'sha256': sha256,
+        'bytes': bytes_csv,
+        'retomado': retomado,
+        'descargado': datetime.now(timezone.utc).isoformat(timespec='seconds')
+    }
+    manifiestos = leer_estado(path_manifiesto)
+    manifiestos[nombre_archivo] = manifiesto
+    guardar_estado(path_manifiesto, manifiestos)
+    return {'path': path, 'descargado': True, 'manifiesto': manifiesto}
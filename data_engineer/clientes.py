@@ -0,0 +1,271 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_engineer.silver import leer_silver
+
+
+TABLA_CLIENTES = 'clientes.parquet'
+# La marca de agua (ultima Date / TransactionNo incorporada) se guarda en la metadata del parquet, asi los datos
+# y la marca se escriben juntos en el mismo rename atomico
+METADATA_MARCA = b'marca_clientes'
+# Los acumulados de la transaccion de la marca, que la proxima actualizacion vuelve a leer entera:
+# se descuentan antes de sumarla de nuevo, asi sus lineas no se cuentan dos veces
+METADATA_FRONTERA = b'frontera_clientes'
+COLUMNAS_LECTURA = ['TransactionNo', 'Date', 'CustomerNo', 'Price', 'Quantity']
+
+# Acumulados por cliente: se pueden sumar (o tomar el minimo / maximo) entre el store y las filas nuevas
+COLUMNAS_SUMA = ['transacciones', 'transacciones_canceladas', 'lineas', 'unidades', 'valor_monetario']
+COLUMNAS_FECHA = ['primera_compra', 'ultima_compra']
+# Derivadas de los acumulados, se recalculan en cada actualizacion
+COLUMNAS_DERIVADAS = ['recencia_dias', 'tasa_cancelacion', 'ticket_promedio', 'lineas_por_transaccion', 'unidades_por_transaccion']
+COLUMNAS_CLIENTES = ['CustomerNo'] + COLUMNAS_FECHA + COLUMNAS_SUMA + COLUMNAS_DERIVADAS
+
+
+def _numeros(transacciones: pd.Series) -> np.ndarray:
+    return pd.to_numeric(transacciones.astype(str).str.lstrip('C'), errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+
+def filtrar_posteriores(lineas: pd.DataFrame, marca: dict | None) -> pd.DataFrame:
+    """
+    Se queda con las lineas de la transaccion de la marca de agua ({'fecha': 'YYYY-MM-DD', 'transaccion': int})
+    y las posteriores, con el mismo criterio que FiltroMarcaDeAgua del ETL.
+    """
+    if marca is None or len(lineas) == 0:
+        return lineas
+    fecha_marca = pd.Timestamp(marca['fecha'])
+    fechas = lineas['Date'].dt.normalize()
+    nuevas = (fechas > fecha_marca) | ((fechas == fecha_marca) & (_numeros(lineas['TransactionNo']) >= marca['transaccion']))
+    return lineas[nuevas.to_numpy()]
+
+
+def filtrar_transaccion(lineas: pd.DataFrame, marca: dict | None) -> pd.DataFrame:
+    """
+    Se queda con las lineas de la transaccion de la marca de agua.
+    """
+    if marca is None or len(lineas) == 0:
+        return lineas.iloc[:0]
+    misma = (lineas['Date'].dt.normalize() == pd.Timestamp(marca['fecha'])) & (_numeros(lineas['TransactionNo']) == marca['transaccion'])
+    return lineas[misma.to_numpy()]
+
+
+def calcular_marca(lineas: pd.DataFrame, marca: dict | None) -> dict | None:
+    """
+    Nueva marca de agua: la ultima Date / TransactionNo entre la marca anterior y las lineas.
+    """
+    if len(lineas) == 0:
+        return marca
+    fechas = lineas['Date'].dt.normalize()
+    fecha_max = fechas.max()
+    numero_max = int(_numeros(lineas['TransactionNo'])[(fechas == fecha_max).to_numpy()].max())
+    if marca is not None and (pd.Timestamp(marca['fecha']), marca['transaccion']) >= (fecha_max, numero_max):
+        return marca
+    return {'fecha': fecha_max.strftime('%Y-%m-%d'), 'transaccion': numero_max}
+
+
+def acumular(canceladas: pd.DataFrame, concretadas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Acumulados por CustomerNo de un lote de lineas: transacciones concretadas y canceladas, lineas, unidades y
+    valor monetario (Price * Quantity) de las concretadas, y la primera / ultima compra.
+
+    Returns:
+        pd.DataFrame: Una fila por cliente, con CustomerNo y las COLUMNAS_SUMA y COLUMNAS_FECHA
+    """
+    concretadas = concretadas.dropna(subset=['CustomerNo'])
+    canceladas = canceladas.dropna(subset=['CustomerNo'])
+
+    compras = concretadas.assign(valor=concretadas['Price'].astype(np.float64) * concretadas['Quantity'].astype(np.float64))
+    por_cliente = compras.groupby('CustomerNo').agg(
+        transacciones=('TransactionNo', 'nunique'),
+        lineas=('TransactionNo', 'size'),
+        unidades=('Quantity', 'sum'),
+        valor_monetario=('valor', 'sum'),
+        primera_compra=('Date', 'min'),
+        ultima_compra=('Date', 'max')
+    )
+    cancelaciones = canceladas.groupby('CustomerNo')['TransactionNo'].nunique().rename('transacciones_canceladas')
+
+    acumulados = por_cliente.join(cancelaciones, how='outer')
+    acumulados[COLUMNAS_SUMA] = acumulados[COLUMNAS_SUMA].fillna(0)
+    return acumulados.reset_index()
+
+
+def combinar(store: pd.DataFrame | None, nuevos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Suma los acumulados nuevos a los del store (solo las columnas acumuladas, sin recorrer el historico).
+    """
+    if store is None or len(store) == 0:
+        return nuevos[['CustomerNo'] + COLUMNAS_FECHA + COLUMNAS_SUMA]
+
+    viejos = store.set_index('CustomerNo')
+    nuevos = nuevos.set_index('CustomerNo')
+    combinado = viejos[COLUMNAS_SUMA].add(nuevos[COLUMNAS_SUMA], fill_value=0)
+    fechas = pd.concat([viejos[COLUMNAS_FECHA], nuevos[COLUMNAS_FECHA]])
+    combinado['primera_compra'] = fechas.groupby(level=0)['primera_compra'].min()
+    combinado['ultima_compra'] = fechas.groupby(level=0)['ultima_compra'].max()
+    return combinado.reset_index()[['CustomerNo'] + COLUMNAS_FECHA + COLUMNAS_SUMA]
+
+
+def descontar(store: pd.DataFrame, frontera: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resta del store los acumulados de la transaccion de la marca (los que se guardaron en la ultima actualizacion).
+    Las fechas no se tocan: la transaccion se vuelve a sumar con la misma fecha. Los clientes que quedan sin
+    transacciones se quitan, si todavia tienen lineas en silver vuelven con los acumulados nuevos.
+    """
+    if len(frontera) == 0:
+        return store
+    viejos = store.set_index('CustomerNo')
+    restados = viejos[COLUMNAS_SUMA].sub(frontera.set_index('CustomerNo')[COLUMNAS_SUMA], fill_value=0).loc[viejos.index]
+    viejos = viejos.assign(**{columna: restados[columna] for columna in COLUMNAS_SUMA})
+    viejos = viejos[(viejos['transacciones'] + viejos['transacciones_canceladas']) > 0]
+    return viejos.reset_index()
+
+
+def derivar(clientes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula las features derivadas de los acumulados. La recencia se mide contra la ultima compra de todo el store.
+    """
+    clientes = clientes.sort_values('CustomerNo', ignore_index=True)
+    clientes['CustomerNo'] = clientes['CustomerNo'].astype(np.int32)
+    for columna in ['transacciones', 'transacciones_canceladas', 'lineas', 'unidades']:
+        clientes[columna] = clientes[columna].astype(np.int64)
+
+    transacciones = clientes['transacciones'].to_numpy(dtype=np.float64)
+    total = transacciones + clientes['transacciones_canceladas'].to_numpy(dtype=np.float64)
+    con_compras = np.maximum(transacciones, 1)
+    clientes['recencia_dias'] = (clientes['ultima_compra'].max() - clientes['ultima_compra']).dt.days
+    clientes['tasa_cancelacion'] = clientes['transacciones_canceladas'] / np.maximum(total, 1)
+    clientes['ticket_promedio'] = clientes['valor_monetario'] / con_compras
+    clientes['lineas_por_transaccion'] = clientes['lineas'] / con_compras
+    clientes['unidades_por_transaccion'] = clientes['unidades'] / con_compras
+    return clientes[COLUMNAS_CLIENTES]
+
+
+def leer_store(path: str) -> tuple:
+    """
+    Lee el store de clientes.
+
+    Returns:
+        tuple: (pd.DataFrame ordenado por CustomerNo o None si no existe, marca de agua o None)
+    """
+    if not os.path.exists(path):
+        return None, None
+    tabla = pq.read_table(path)
+    metadata = tabla.schema.metadata or {}
+    marca = json.loads(metadata[METADATA_MARCA]) if METADATA_MARCA in metadata else None
+    return tabla.to_pandas(), marca
+
+
+def leer_frontera(path: str) -> pd.DataFrame | None:
+    """
+    Lee de la metadata del store los acumulados de la transaccion de su marca de agua (solo el schema, no los datos).
+
+    Returns:
+        pd.DataFrame | None: CustomerNo y COLUMNAS_SUMA, o None si el store no existe o no los guardo
+    """
+    if not os.path.exists(path):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    if METADATA_FRONTERA not in metadata:
+        return None
+    return pd.DataFrame(json.loads(metadata[METADATA_FRONTERA]), columns=['CustomerNo'] + COLUMNAS_SUMA)
+
+
+def guardar_store(clientes: pd.DataFrame, marca: dict | None, path: str, frontera: pd.DataFrame | None = None):
+    """
+    Guarda el store con su marca de agua y los acumulados de la transaccion de la marca. Se escribe a un archivo
+    temporal y se renombra.
+    """
+    frontera = frontera if frontera is not None else pd.DataFrame(columns=['CustomerNo'] + COLUMNAS_SUMA)
+    tabla = pa.Table.from_pandas(clientes, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({
+        **(tabla.schema.metadata or {}),
+        METADATA_MARCA: json.dumps(marca).encode(),
+        METADATA_FRONTERA: frontera[['CustomerNo'] + COLUMNAS_SUMA].to_json(orient='records').encode()
+    })
+    path_tmp = path + '.tmp'
+    pq.write_table(tabla, path_tmp)
+    os.replace(path_tmp, path)
+
+
+def actualizar_clientes(path_canceladas: str, path_concretadas: str, path: str, reconstruir: bool = False) -> dict:
+    """
+    Actualiza el store de features por cliente con las filas de silver posteriores a su marca de agua:
+    calcula los acumulados solo de las filas nuevas y los suma a los que ya tenia. La transaccion de la marca
+    se vuelve a leer entera (pueden haberle llegado lineas) y se descuenta lo que ya se habia sumado de ella.
+    Con reconstruir (o si todavia no existe, o es de antes de guardar la transaccion de la marca) se calcula
+    desde cero con todo silver.
+
+    Args:
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        path (str): path del parquet del store
+        reconstruir (bool, optional): Ignora el store actual y lo recalcula. Defaults to False.
+
+    Returns:
+        dict: clientes, clientes_actualizados, lineas_nuevas y la marca de agua nueva
+    """
+    store, marca = (None, None) if reconstruir else leer_store(path)
+    frontera = None if store is None else leer_frontera(path)
+    if frontera is None:
+        store, marca = None, None
+    desde = pd.Timestamp(marca['fecha']).date() if marca is not None else None
+
+    # Las fechas se filtran en el escaneo (particiones YearMonth), la marca exacta despues
+    canceladas = filtrar_posteriores(leer_silver(path_canceladas, columnas=COLUMNAS_LECTURA, desde=desde), marca)
+    concretadas = filtrar_posteriores(leer_silver(path_concretadas, columnas=COLUMNAS_LECTURA, desde=desde), marca)
+
+    nuevos = acumular(canceladas, concretadas)
+    if store is not None:
+        store = descontar(store, frontera)
+    clientes = derivar(combinar(store, nuevos))
+    marca_nueva = calcular_marca(canceladas, calcular_marca(concretadas, marca))
+    frontera_nueva = acumular(filtrar_transaccion(canceladas, marca_nueva), filtrar_transaccion(concretadas, marca_nueva))
+    guardar_store(clientes, marca_nueva, path, frontera_nueva)
+    return {
+        'clientes': len(clientes),
+        'clientes_actualizados': len(nuevos),
+        'lineas_nuevas': len(canceladas) + len(concretadas),
+        'marca': marca_nueva
+    }
+
+
+class StoreClientes:
+    """
+    Lectura del store de clientes: busquedas puntuales por CustomerNo (busqueda binaria sobre la columna ordenada,
+    sin pandas) para el predictor del carrito, y la tabla completa para entrenar.
+    """
+    def __init__(self, clientes: pd.DataFrame):
+        self.tabla = clientes
+        self.__clientes = clientes['CustomerNo'].to_numpy()
+        self.__columnas = {columna: clientes[columna].to_numpy() for columna in clientes.columns if columna != 'CustomerNo'}
+
+    @classmethod
+    def abrir(cls, path: str) -> 'StoreClientes':
+        clientes, _ = leer_store(path)
+        if clientes is None:
+            raise FileNotFoundError(f'No existe el store de clientes {path}')
+        return cls(clientes)
+
+    def __len__(self):
+        return len(self.__clientes)
+
+    def buscar(self, customer_no: int) -> dict | None:
+        """
+        Features de un cliente, o None si no esta en el store.
+        """
+        posicion = np.searchsorted(self.__clientes, customer_no)
+        if posicion == len(self.__clientes) or self.__clientes[posicion] != customer_no:
+            return None
+        return {'CustomerNo': int(customer_no), **{columna: valores[posicion] for columna, valores in self.__columnas.items()}}
+
+    def buscar_varios(self, customer_nos) -> pd.DataFrame:
+        """
+        Features de varios clientes a la vez (los que no estan en el store se omiten).
+        """
+        customer_nos = np.asarray(customer_nos)
+        posiciones = np.clip(np.searchsorted(self.__clientes, customer_nos), 0, max(len(self.__clientes) - 1, 0))
+        encontrados = posiciones[self.__clientes[posiciones] == customer_nos] if len(self.__clientes) else posiciones[:0]
+        return self.tabla.iloc[encontrados].reset_index(drop=True)
@@ -0,0 +1,109 @@
+import os
+import pandas as pd
+import pyarrow.dataset as ds
+from data_engineer.silver import ESQUEMA_PARTICION
+
+
+TABLA_TRANSACCIONES = 'transacciones_por_pais_y_mes.parquet'
+TABLA_PRODUCTOS = 'productos_por_pais.parquet'
+
+ESTADO_CANCELADO = 'Cancelado'
+ESTADO_CONCRETADO = 'Concretado'
+
+
+def _agregar_por_batches(path: str, columnas: list, claves: list, agregaciones: dict) -> pd.DataFrame:
+    """
+    Agrega un dataset de silver batch por batch, asi nunca se tiene el dataset entero en memoria.
+    Las agregaciones tienen que ser sumas (o conteos) para poder combinar los parciales de cada batch.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No existe el dataset {path}')
+
+    particionado = os.path.isdir(path)
+    dataset = ds.dataset(path, format='parquet', partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive') if particionado else None)
+
+    parciales = []
+    for batch in dataset.to_batches(columns=columnas):
+        if batch.num_rows == 0:
+            continue
+        df = batch.to_pandas()
+        # Sumamos en 64 bits aunque silver guarde int32 (y float32 los datasets escritos antes de Price float64)
+        df = df.astype({col: 'float64' if df[col].dtype == 'float32' else 'int64' for col in df.columns if df[col].dtype in ('float32', 'int32')})
+        parciales.append(df.groupby(claves, observed=True).agg(**agregaciones))
+
+    if not parciales:
+        return pd.DataFrame(columns=claves + list(agregaciones.keys()))
+
+    total = pd.concat(parciales).groupby(level=claves, observed=True).sum()
+    return total.reset_index()
+
+
+def calcular_transacciones_por_pais_y_mes(path_canceladas: str, path_concretadas: str) -> pd.DataFrame:
+    """
+    Cantidad de registros de transacciones por estado (Cancelado / Concretado), mes y pais.
+
+    Returns:
+        pd.DataFrame: Columnas Estado, YearMonth, Country, Cantidad
+    """
+    tablas = []
+    for estado, path in [(ESTADO_CANCELADO, path_canceladas), (ESTADO_CONCRETADO, path_concretadas)]:
+        tabla = _agregar_por_batches(
+            path,
+            columnas=['YearMonth', 'Country', 'TransactionNo'],
+            claves=['YearMonth', 'Country'],
+            agregaciones={'Cantidad': ('TransactionNo', 'size')}
+        )
+        tabla.insert(0, 'Estado', estado)
+        tablas.append(tabla)
+
+    tabla = pd.concat(tablas, ignore_index=True)
+    return tabla.astype({'Cantidad': 'int64'}).sort_values(['Estado', 'YearMonth', 'Country'], ignore_index=True)
+
+
+def calcular_productos_por_pais(path_canceladas: str, path_concretadas: str) -> pd.DataFrame:
+    """
+    Suma de Quantity y de Price por pais y producto, sobre todas las transacciones.
+
+    Returns:
+        pd.DataFrame: Columnas Country, ProductName, Quantity, Price
+    """
+    tablas = [
+        _agregar_por_batches(
+            path,
+            columnas=['Country', 'ProductName', 'Quantity', 'Price'],
+            claves=['Country', 'ProductName'],
+            agregaciones={'Quantity': ('Quantity', 'sum'), 'Price': ('Price', 'sum')}
+        )
+        for path in [path_canceladas, path_concretadas]
+    ]
+    tabla = pd.concat(tablas, ignore_index=True).groupby(['Country', 'ProductName'], observed=True).sum().reset_index()
+    return tabla.sort_values(['Country', 'ProductName'], ignore_index=True)
+
+
+def guardar_tabla(df: pd.DataFrame, path: str):
+    """
+    Guarda una tabla de gold. Se escribe a un archivo temporal y se renombra,
+    asi el dashboard nunca lee una tabla a medio escribir.
+    """
+    path_tmp = path + '.tmp'
+    df.to_parquet(path_tmp, index=False)
+    os.replace(path_tmp, path)
+
+
+def top_productos(productos: pd.DataFrame, pais: str | None = None, cantidad: int = 10) -> pd.DataFrame:
+    """
+    Los productos con mas £ totales recaudadas (suma de Quantity x suma de Price) en un pais, o en todos.
+
+    Args:
+        productos (pd.DataFrame): Tabla de gold de productos por pais
+        pais (str, optional): Pais a filtrar. Defaults to None (todos los paises).
+        cantidad (int, optional): Cantidad de productos a devolver. Defaults to 10.
+
+    Returns:
+        pd.DataFrame: Columnas ProductName, Quantity, Price, TotalRecaudado ordenado de mayor a menor
+    """
+    if pais is not None:
+        productos = productos[productos['Country'] == pais]
+    df_productos = productos.groupby('ProductName', observed=True)[['Quantity', 'Price']].sum().reset_index()
+    df_productos['TotalRecaudado'] = df_productos['Quantity'] * df_productos['Price']
+    return df_productos.sort_values(by='TotalRecaudado', ascending=False).head(cantidad)
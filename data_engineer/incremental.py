@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from data_engineer.silver import FORMATO_FECHA, ROW_GROUP_SIZE_DEFAULT
+
+
+def calcular_hash(path: str, tamanio_bloque: int = 1024 * 1024) -> str:
+    """
+    Calcula el sha256 del contenido de un archivo, leyendolo por bloques
+
+    Args:
+        path (str): path del archivo
+        tamanio_bloque (int, optional): Cantidad de bytes leidos por vez. Defaults to 1MB.
+
+    Returns:
+        str: hash en hexadecimal
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamanio_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def leer_estado(path: str) -> dict:
+    """
+    Lee el estado de la ultima ejecucion del ETL (hash del bronze y marca de agua).
+    Si todavia no hay estado guardado devuelve un dict vacio.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def guardar_estado(path: str, estado: dict):
+    """
+    Guarda el estado del ETL. Se escribe a un archivo temporal y se renombra,
+    asi una ejecucion cortada a la mitad no deja un estado corrupto.
+    """
+    path_tmp = path + '.tmp'
+    with open(path_tmp, 'w', encoding='utf-8') as archivo:
+        json.dump(estado, archivo, indent=4)
+    os.replace(path_tmp, path)
+
+
+def _fechas_y_numeros(chunk: pd.DataFrame) -> tuple:
+    fechas = pd.to_datetime(chunk['Date'], format=FORMATO_FECHA)
+    numeros = pd.to_numeric(chunk['TransactionNo'].str.lstrip('C'), errors='coerce').fillna(-1)
+    return fechas, numeros
+
+
+class FiltroMarcaDeAgua:
+    """
+    Funcion para aplicar a cada chunk: se queda solo con las filas de la transaccion de la marca de agua
+    (ultima Date / TransactionNo procesada) y las posteriores, y va registrando la nueva marca de agua.
+
+    La transaccion de la marca se vuelve a procesar entera porque pueden haber llegado lineas suyas despues
+    de la ultima ejecucion; sus lineas anteriores se quitan de silver con quitar_transaccion.
+
+    La marca es un dict {'fecha': 'YYYY-MM-DD', 'transaccion': int}. Si es None no se filtra nada,
+    solo se calcula la marca.
+    """
+    def __init__(self, marca: dict | None = None):
+        self.marca = marca
+        self.marca_nueva = marca
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        if len(chunk) == 0:
+            return chunk
+
+        fechas, numeros = _fechas_y_numeros(chunk)
+
+        if self.marca is not None:
+            fecha_marca = pd.Timestamp(self.marca['fecha'])
+            nuevas = ((fechas > fecha_marca) | ((fechas == fecha_marca) & (numeros >= self.marca['transaccion']))).to_numpy()
+            chunk, fechas, numeros = chunk[nuevas], fechas[nuevas], numeros[nuevas]
+            if len(chunk) == 0:
+                return chunk
+
+        fecha_max = fechas.max()
+        numero_max = int(numeros[fechas == fecha_max].max())
+        if self.marca_nueva is None or (fecha_max, numero_max) > (pd.Timestamp(self.marca_nueva['fecha']), self.marca_nueva['transaccion']):
+            self.marca_nueva = {'fecha': fecha_max.strftime('%Y-%m-%d'), 'transaccion': numero_max}
+
+        return chunk
+
+
+def combinar_marcas(*marcas: dict | None) -> dict | None:
+    """
+    La mayor de varias marcas de agua (por ejemplo las de chunks procesados en paralelo). Las None se ignoran.
+    """
+    marcas = [marca for marca in marcas if marca is not None]
+    if not marcas:
+        return None
+    return max(marcas, key=lambda marca: (pd.Timestamp(marca['fecha']), marca['transaccion']))
+
+
+def quitar_transaccion(path: str, marca: dict) -> int:
+    """
+    Quita de un dataset de silver las lineas de la transaccion de la marca de agua (con o sin 'C' adelante),
+    que se vuelve a escribir entera en la ejecucion incremental. Solo se abren los fragmentos de la particion
+    YearMonth de la marca, y se reescriben (con un rename) solo los que tienen lineas de esa transaccion.
+
+    Args:
+        path (str): path del dataset (directorio particionado)
+        marca (dict): Marca de agua ({'fecha': 'YYYY-MM-DD', 'transaccion': int})
+
+    Returns:
+        int: Cantidad de lineas quitadas
+    """
+    directorio = os.path.join(path, f'YearMonth={marca["fecha"][:7]}')
+    numeros = [str(marca['transaccion']), f'C{marca["transaccion"]}']
+    quitadas = 0
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in archivos:
+            if not archivo.endswith('.parquet'):
+                continue
+            path_archivo = os.path.join(raiz, archivo)
+            tabla = pq.read_table(path_archivo, partitioning=None)
+            mascara = pc.is_in(tabla['TransactionNo'], value_set=pa.array(numeros))
+            cantidad = pc.sum(mascara).as_py() or 0
+            if cantidad == 0:
+                continue
+            restantes = tabla.filter(pc.invert(mascara))
+            if restantes.num_rows == 0:
+                os.remove(path_archivo)
+            else:
+                path_tmp = path_archivo + '.tmp'
+                pq.write_table(restantes, path_tmp, row_group_size=ROW_GROUP_SIZE_DEFAULT)
+                os.replace(path_tmp, path_archivo)
+            quitadas += cantidad
+    return quitadas
+
+
+def es_formato_anterior(*paths: str) -> bool:
+    """
+    Si alguno de los datasets de silver es todavia un archivo parquet monolitico (formato anterior a las particiones).
+    Sus filas no se pueden conservar al pasar al directorio particionado, asi que hay que reprocesar todo el bronze.
+    """
+    return any(os.path.isfile(path) for path in paths)
+
+
+def preparar_directorio(path: str, vaciar: bool, marca: dict | None = None) -> str:
+    """
+    Prepara el directorio de un dataset de silver y devuelve el nombre del proximo fragmento a escribir
+    en sus particiones. Si el path es un archivo parquet monolitico (formato anterior) se reemplaza por el directorio,
+    en una ejecucion incremental es un ValueError, se perderian las filas anteriores a la marca (ver es_formato_anterior).
+    Con marca de agua se quitan las lineas de su transaccion, que se vuelve a escribir (ver FiltroMarcaDeAgua).
+
+    Args:
+        path (str): path del dataset (directorio particionado con fragmentos part-XXXXX-N.parquet)
+        vaciar (bool): Si es True se borran los fragmentos existentes (reprocesamiento completo)
+        marca (dict, optional): Marca de agua de la ultima ejecucion. Defaults to None.
+
+    Returns:
+        str: nombre del nuevo fragmento, por ejemplo 'part-00003'
+    """
+    if os.path.isfile(path):
+        if marca is not None and not vaciar:
+            raise ValueError(f'{path} tiene el formato anterior (un solo archivo), hay que reprocesar todo el bronze sin marca de agua')
+        os.remove(path)
+    elif vaciar and os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path, exist_ok=True)
+    if marca is not None and not vaciar:
+        quitar_transaccion(path, marca)
+
+    ultimo = -1
+    for _, _, archivos in os.walk(path):
+        for archivo in archivos:
+            coincidencia = re.match(r'part-(\d+)', archivo)
+            if coincidencia:
+                ultimo = max(ultimo, int(coincidencia.group(1)))
+    return f'part-{ultimo + 1:05d}'
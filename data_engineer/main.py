@@ -1,75 +1,149 @@
 from prefect import task, flow, get_run_logger
+from prefect.artifacts import create_table_artifact
+from prefect.cache_policies import NONE
 from prefect.runtime import flow_run
+from prefect.task_runners import ThreadPoolTaskRunner
+from collections import deque
 import pandas as pd
 import os
+import sys
 import configparser
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-config = configparser.ConfigParser()
-config.read('pipeline.conf')
+from data_engineer.streaming import (
+    DTYPES_CSV,
+    ChunksCSV,
+    ChunksTransformados,
+    transformar
+)
+from data_engineer.silver import (
+    ROW_GROUP_SIZE_DEFAULT,
+    compactar_fragmentos,
+    escribir_canceladas_y_concretadas
+)
+from data_engineer.incremental import (
+    FiltroMarcaDeAgua,
+    combinar_marcas,
+    es_formato_anterior,
+    guardar_estado,
+    leer_estado,
+    preparar_directorio
+)
+from data_engineer.gold import (
+    TABLA_PRODUCTOS,
+    TABLA_TRANSACCIONES,
+    calcular_productos_por_pais,
+    calcular_transacciones_por_pais_y_mes,
+    guardar_tabla
+)
+from data_engineer.bronze import FuenteKaggle, FuenteLocal, adquirir_dataset
+from data_engineer.metricas import (
+    REGISTRO,
+    configurar_perfilado,
+    guardar_metricas,
+    instrumentar,
+    registrar_salida,
+    resumir
+)
+from data_engineer.clientes import TABLA_CLIENTES, actualizar_clientes
+from ml_developers.features import TABLA_FEATURES, agregados_por_transaccion
+from ml_developers.modelo import (
+    TABLA_PROBABILIDADES,
+    TRANSACCIONES_POR_CHUNK_DEFAULT,
+    cargar_modelo,
+    leer_lineas,
+    puntuar_transacciones
+)
+
+PATH_CANCELADAS = '../data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = '../data/silver/transacciones_concretadas.parquet'
+PATH_GOLD = '../data/gold'
+PATH_ESTADO = '../data/silver/_estado_etl.json'
+PATH_MODELOS = '../ml_developers/modelos'
+PATH_METRICAS = '../data/_metricas'
+# Cantidad de tareas que corren al mismo tiempo en el task runner del flow (chunks de silver y tablas de gold).
+# Por defecto en serie: con el csv de kaggle los chunks en paralelo todavia no fueron mas rapidos que una sola pasada
+WORKERS_DEFAULT = 1
 
-try:
+def cargar_credenciales_kaggle(path: str = 'pipeline.conf'):
+    """
+    Cargamos las credenciales de kaggle de pipeline.conf en las variables de entorno que usa el cliente de kaggle.
+    Solo hace falta para descargar de kaggle.com, no para importar este modulo.
+    """
+    config = configparser.ConfigParser()
+    config.read(path)
     os.environ['KAGGLE_USERNAME'] = config['kaggle-credentials']['username']
     os.environ['KAGGLE_KEY'] = config['kaggle-credentials']['key']
-except KeyError as e:
-    logger = get_run_logger()
-    logger.error(f'Error al leer las credenciales de kaggle: {e}')
-    raise e
-
-from  kaggle.api.kaggle_api_extended import KaggleApi
-from kaggle.rest import ApiException
 
 
 @task(
     retries=3,
     retry_delay_seconds=60,
     name='get_dataset_from_kaggle',
-    description='Obtenemos los datos desde kaggle.com'
+    description='Obtenemos los datos desde kaggle.com, solo si cambiaron desde la ultima descarga'
 )
-def get_dataset_from_kaggle(path:str, dataset:str, new_name: str='data.csv'):
+@instrumentar
+def get_dataset_from_kaggle(path:str, dataset:str, new_name: str='data.csv', origen_local: str | None = None):
     """
-    Obtenemos los datos desde kaggle.com
+    Obtenemos los datos desde kaggle.com. Antes de descargar se compara la version del dataset en kaggle y el sha256
+    del archivo de bronze con el manifiesto de la ultima descarga: si nada cambio no se descarga. Si no, el zip
+    se descarga a un archivo temporal y el csv se publica en bronze con un rename atomico.
 
     Args:
         path (_type_): path donde queremos guardar los datos
         dataset (_type_): dataset que queremos descargar de kaggle
         new_name (str, optional): Nombre del archivo que queremos guardar. Defaults to 'data.csv'.
+        origen_local (str, optional): Un zip o csv local para usar en lugar de kaggle (sin conexion). Defaults to None.
 
     Returns:
-        path+'/'+new_name: Retorno el path completo del archivo descargado para tenerlo disponible en la siguiente task
+        tuple: (path+'/'+new_name, sha256 del csv): el path completo del archivo descargado para tenerlo disponible
+            en la siguiente task, y su hash del manifiesto (para saber si cambio sin volver a leer el archivo)
     """
     logger = get_run_logger()
-    api = KaggleApi()
-    api.authenticate()
-    try:
-        api.dataset_download_files(dataset, path, unzip=True)
-    except ApiException as e:
-        logger.error(f'Error al descargar el dataset: {e}')
-        raise e
+    if origen_local is not None:
+        fuente = FuenteLocal(origen_local)
+    else:
+        try:
+            cargar_credenciales_kaggle()
+        except KeyError as e:
+            logger.error(f'Error al leer las credenciales de kaggle: {e}')
+            raise e
+        fuente = FuenteKaggle(dataset)
     
-    file_path = os.path.join(path, new_name)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    resultado = adquirir_dataset(fuente, path, new_name)
+    manifiesto = resultado['manifiesto']
+    if resultado['descargado']:
+        registrar_salida(paths=(resultado['path'],))
+        logger.info(f'Descargado {fuente.nombre} (version {manifiesto["version"]}): {manifiesto["bytes"]:,} bytes, sha256 {manifiesto["sha256"]}')
+    else:
+        logger.info(f'{fuente.nombre} no cambio desde la descarga del {manifiesto["descargado"]} (version {manifiesto["version"]}), no se descarga')
     
-    os.rename(os.path.join(path, os.listdir(path)[0]), os.path.join(path, new_name))
-    
-    return path+'/'+new_name
+    return path+'/'+new_name, manifiesto['sha256']
 
 @task(
     name='get_data_from_csv',
     description='Cargamos los datos desde un archivo csv'
 )
-def get_data_from_csv(path:str)->pd.DataFrame:
+@instrumentar
+def get_data_from_csv(path:str, chunksize: int | None = None)->pd.DataFrame | ChunksCSV:
     """
     Cargamos los datos desde un archivo csv
 
     Args:
         path (str): path donde se encuentra el archivo csv
+        chunksize (int, optional): Si se especifica, no se carga el archivo entero sino que se devuelve
+            un iterable que lo va leyendo en chunks de esa cantidad de filas. Defaults to None.
     Returns:
-        pd.DataFrame: Retornamos un dataframe con los datos cargados
+        pd.DataFrame | ChunksCSV: Retornamos un dataframe con los datos cargados, o los chunks a leer
     """
     logger = get_run_logger()
-    df = pd.read_csv(path)
+    
+    if chunksize is not None:
+        logger.info(f'Leyendo {path} en chunks de {chunksize} registros')
+        return ChunksCSV(path, chunksize)
+    
+    df = pd.read_csv(path, dtype=DTYPES_CSV)
     
     if df is None:
         raise ValueError('No data found')
@@ -82,89 +156,488 @@ def get_data_from_csv(path:str)->pd.DataFrame:
     name='transform_df',
     description='Transformamos el dataframe para que sea más fácil de trabajar'
 )
-def transform_df(df: pd.DataFrame)->pd.DataFrame:
+@instrumentar
+def transform_df(df: pd.DataFrame | ChunksCSV)->pd.DataFrame | ChunksTransformados:
     """
     Transformamos el dataframe para que sea más fácil de trabajar
     Args:
-        df (pd.DataFrame): Dataframe que queremos transformar
+        df (pd.DataFrame | ChunksCSV): Dataframe, o chunks del csv, que queremos transformar
 
     Returns:
-        pd.DataFrame: Retornamos el dataframe transformado
+        pd.DataFrame | ChunksTransformados: Retornamos el dataframe transformado, o los chunks que se transforman a medida que se leen
     """
     logger = get_run_logger()
-    if not isinstance(df, pd.DataFrame):
-        raise ValueError('El input no es un dataframe')
-        
-    columnas_necesarias = ['TransactionNo', 'CustomerNo']
-    for col in columnas_necesarias:
-        if col not in df.columns:
-            raise ValueError(f'La columna {col} no está en el dataframe')
-        
-    df = df.dropna(subset=['TransactionNo']) # Dropeamos los registros que no tienen TransactionNo
-    df = df.dropna(subset=['CustomerNo']) # Dropeamos los registros que no tienen CustomerNo
-    df = df.astype({'CustomerNo': 'int'}) # Convertimos CustomerNo a int
+    if isinstance(df, (ChunksCSV, ChunksTransformados)):
+        logger.info(f'Transformando el dataframe por chunks')
+        return ChunksTransformados(df, transformar)
+    
+    df = transformar(df) # Dropeamos los registros sin TransactionNo o CustomerNo y convertimos CustomerNo a int
     
     logger.info(f'Dataframe transformado')
     
     return df
 
 @task(
-    name='divide_df_in_canceladas_y_concretadas',
-    description='Dividimos el dataframe en dos, uno con las transacciones canceladas, y otro con las transacciones concretadas'
+    name='write_canceladas_y_concretadas_to_parquet',
+    description='Dividimos las transacciones en canceladas y concretadas y las escribimos en parquet en una sola pasada'
 )
-def divide_df_in_canceladas_y_concretadas(df: pd.DataFrame)->tuple:
+@instrumentar
+def write_canceladas_y_concretadas_to_parquet(df: pd.DataFrame | ChunksTransformados, path_canceladas: str, path_concretadas: str, row_group_size: int = ROW_GROUP_SIZE_DEFAULT, marca: dict | None = None)->dict:
     """
-    Dividimos el dataframe en dos, uno con las transacciones canceladas, y otro con las transacciones concretadas
+    Recorremos el dataframe, o los chunks, una sola vez, y cada chunk se envia directo a los dos datasets parquet.
+    Asi no tenemos que tener en memoria las dos mitades al mismo tiempo.
+    
+    Cada dataset es un directorio particionado por YearMonth y Country (YearMonth=2019-12/Country=United Kingdom/part-XXXXX-N.parquet).
+    Sin marca de agua se reprocesa todo y se reemplazan los fragmentos, con marca de agua solo se agregan
+    fragmentos nuevos con las filas posteriores a la marca y las de su transaccion, que se reemplazan.
+
     Args:
-        df (pd.DataFrame): Dataframe que queremos dividir por canceladas y concretadas
+        df (pd.DataFrame | ChunksTransformados): Dataframe, o chunks, a dividir y guardar
+        path_canceladas (str): path donde queremos guardar el dataset de las transacciones canceladas
+        path_concretadas (str): path donde queremos guardar el dataset de las transacciones concretadas
+        row_group_size (int, optional): Cantidad de filas por row group. Defaults to ROW_GROUP_SIZE_DEFAULT.
+        marca (dict, optional): Marca de agua de la ultima ejecucion ({'fecha', 'transaccion'}). Defaults to None.
+    
     Returns:
-        tuple (pd.DataFrame): Devuelve una tupla de dos dataframes
+        dict: Nueva marca de agua, la ultima Date / TransactionNo procesada
     """
     logger = get_run_logger()
-    if not isinstance(df, pd.DataFrame):
+    if not isinstance(df, (pd.DataFrame, ChunksTransformados)):
         raise ValueError('El input no es un dataframe')
     
-    df_canceladas = df[df['TransactionNo'].str.contains('C')] # Filtramos las transacciones canceladas
-    df_concretadas = df.drop(df_canceladas.index) # Eliminamos las transacciones canceladas del df original
+    incremental = marca is not None
+    nombre_fragmento = max(
+        preparar_directorio(path_canceladas, vaciar=not incremental, marca=marca),
+        preparar_directorio(path_concretadas, vaciar=not incremental, marca=marca)
+    )
+    
+    filtro = FiltroMarcaDeAgua(marca)
+    chunks = [filtro(df)] if isinstance(df, pd.DataFrame) else ChunksTransformados(df, filtro)
+    
+    filas_canceladas, filas_concretadas = escribir_canceladas_y_concretadas(chunks, path_canceladas, path_concretadas, nombre_fragmento, row_group_size)
+    
+    if not incremental and filas_canceladas + filas_concretadas == 0:
+        raise ValueError('No data found')
+    
+    registrar_salida(filas_canceladas + filas_concretadas, paths=(path_canceladas, path_concretadas), prefijo=nombre_fragmento)
+    logger.info(f'Guardadas {filas_canceladas} transacciones canceladas en {path_canceladas}')
+    logger.info(f'Guardadas {filas_concretadas} transacciones concretadas en {path_concretadas}')
     
-    logger.info(f'Dividiendo el dataframe')
-    return df_canceladas, df_concretadas
+    return filtro.marca_nueva
 
 @task(
-    name=f'transform_df_to_parquet',
-    description='Transformamos un dataframe en un archivo parquet'
+    name='write_chunk_to_silver',
+    description='Transformamos un chunk del csv y lo escribimos en sus particiones de canceladas y concretadas',
+    # Los chunks son dataframes grandes, no tiene sentido hashearlos para la cache de Prefect
+    cache_policy=NONE
 )
-def transform_df_to_parquet(df: pd.DataFrame, path: str):
+@instrumentar
+def write_chunk_to_silver(chunk: pd.DataFrame, indice: int, path_canceladas: str, path_concretadas: str, nombre_fragmento: str,
+                          row_group_size: int = ROW_GROUP_SIZE_DEFAULT, marca: dict | None = None)->dict:
     """
-    Transformamos un dataframe en un archivo parquet, en la ruta especificada
+    Transformamos un chunk y lo escribimos en los dos datasets de silver. Cada chunk escribe sus propios fragmentos
+    ({nombre_fragmento}-{indice}) en las particiones, asi varios chunks se pueden escribir al mismo tiempo sin pisarse.
 
     Args:
-        df (pd.DataFrame): Dataframe a guardar
-        path (str): path donde quermos guardar el archivo .parquet
+        chunk (pd.DataFrame): Chunk del csv, sin transformar
+        indice (int): Numero del chunk
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        nombre_fragmento (str): Nombre base de los fragmentos de esta ejecucion (ver preparar_directorio)
+        row_group_size (int, optional): Cantidad de filas por row group. Defaults to ROW_GROUP_SIZE_DEFAULT.
+        marca (dict, optional): Marca de agua de la ultima ejecucion, solo se escriben las filas posteriores. Defaults to None.
+
+    Returns:
+        dict: Filas escritas en canceladas y en concretadas, y la marca de agua del chunk
+    """
+    filtro = FiltroMarcaDeAgua(marca)
+    chunk = filtro(transformar(chunk))
+    filas_canceladas, filas_concretadas = escribir_canceladas_y_concretadas(
+        [chunk], path_canceladas, path_concretadas, f'{nombre_fragmento}-{indice:05d}', row_group_size
+    )
+    registrar_salida(filas_canceladas + filas_concretadas, paths=(path_canceladas, path_concretadas), prefijo=f'{nombre_fragmento}-{indice:05d}')
+    return {'canceladas': filas_canceladas, 'concretadas': filas_concretadas, 'marca': filtro.marca_nueva}
+
+@task(
+    name='compact_silver_fragments',
+    description='Juntamos los fragmentos que escribieron los chunks en paralelo en un archivo por particion'
+)
+@instrumentar
+def compact_silver_fragments(path: str, nombre_fragmento: str, row_group_size: int = ROW_GROUP_SIZE_DEFAULT)->int:
+    """
+    Despues de escribir los chunks en paralelo cada particion tiene un archivo por chunk. Los juntamos en uno solo
+    por particion, asi el dataset queda con la misma cantidad de archivos que si se hubiera escrito en serie
+    (y los lectores no tienen que abrir miles de archivos chicos).
+
+    Args:
+        path (str): path del dataset de silver
+        nombre_fragmento (str): Nombre base de los fragmentos de esta ejecucion (ver preparar_directorio)
+        row_group_size (int, optional): Cantidad de filas por row group. Defaults to ROW_GROUP_SIZE_DEFAULT.
+
+    Returns:
+        int: Cantidad de archivos que quedaron
+    """
+    archivos = compactar_fragmentos(path, nombre_fragmento, row_group_size)
+    registrar_salida(paths=(path,), prefijo=nombre_fragmento)
+    get_run_logger().info(f'Compactados los fragmentos de {path} en {archivos} archivos')
+    return archivos
+
+def correr_en_paralelo(llamadas, workers: int)->list:
+    """
+    Enviamos las tareas al task runner del flow, con a lo sumo workers tareas corriendo al mismo tiempo.
+    Las llamadas se consumen recien cuando se libera un lugar, asi si vienen de un csv leido por chunks
+    nunca hay mas de workers chunks en memoria.
+
+    Args:
+        llamadas: Iterable de (tarea, args, kwargs)
+        workers (int): Cantidad maxima de tareas corriendo al mismo tiempo (con 1 corren una despues de la otra)
+    Returns:
+        list: Resultados de las tareas, en el orden de las llamadas
+    """
+    if workers <= 0:
+        raise ValueError('La cantidad de workers tiene que ser mayor a 0')
+    pendientes = deque()
+    resultados = []
+    for tarea, args, kwargs in llamadas:
+        if len(pendientes) >= workers:
+            resultados.append(pendientes.popleft().result())
+        pendientes.append(tarea.submit(*args, **kwargs))
+    while pendientes:
+        resultados.append(pendientes.popleft().result())
+    return resultados
+
+def partir_en_chunks(df: pd.DataFrame | ChunksCSV, cantidad: int):
+    """
+    Chunks independientes para procesar en paralelo: los del csv leido por chunks, o cantidad pedazos
+    (rangos de filas) del dataframe entero.
+    """
+    if isinstance(df, ChunksCSV):
+        yield from df
+        return
+    filas = -(-len(df) // cantidad)
+    for inicio in range(0, len(df), max(filas, 1)):
+        yield df.iloc[inicio:inicio + filas]
+
+@task(
+    name='get_etl_state',
+    description='Leemos el estado (hash del bronze y marca de agua) de la ultima ejecucion del ETL'
+)
+def get_etl_state(path: str)->dict:
+    """
+    Leemos el estado de la ultima ejecucion del ETL
+
+    Args:
+        path (str): path del archivo de estado
+    Returns:
+        dict: Estado de la ultima ejecucion, vacio si nunca se ejecuto
     """
     logger = get_run_logger()
-    if not isinstance(df, pd.DataFrame):
-        raise ValueError('El input no es un dataframe')
+    estado = leer_estado(path)
+    logger.info(f'Estado de la ultima ejecucion: {estado}')
+    return estado
+
+@task(
+    name='save_etl_state',
+    description='Guardamos el estado (hash del bronze y marca de agua) de esta ejecucion del ETL'
+)
+def save_etl_state(path: str, estado: dict):
+    """
+    Guardamos el estado de la ejecucion del ETL, para que la proxima ejecucion incremental lo use
+
+    Args:
+        path (str): path del archivo de estado
+        estado (dict): Estado a guardar
+    """
+    logger = get_run_logger()
+    guardar_estado(path, estado)
+    logger.info(f'Guardado estado en {path}')
     
-    df.to_parquet(path)
+
+@task(
+    name='build_gold_tables',
+    description='Calculamos las tablas agregadas de gold que usa el dashboard'
+)
+@instrumentar
+def build_gold_tables(path_canceladas: str, path_concretadas: str, path_gold: str):
+    """
+    Calculamos las tablas agregadas que consume el dashboard a partir de los datasets de silver,
+    y las guardamos en gold. Son tablas chicas, por pais y mes, que no crecen con la cantidad de transacciones.
+
+    Args:
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        path_gold (str): directorio donde guardamos las tablas de gold
+    """
+    logger = get_run_logger()
+    os.makedirs(path_gold, exist_ok=True)
+    
+    transacciones = calcular_transacciones_por_pais_y_mes(path_canceladas, path_concretadas)
+    guardar_tabla(transacciones, os.path.join(path_gold, TABLA_TRANSACCIONES))
+    registrar_salida(len(transacciones), paths=(os.path.join(path_gold, TABLA_TRANSACCIONES),))
+    logger.info(f'Guardada tabla {TABLA_TRANSACCIONES} con {len(transacciones)} registros')
+    
+    productos = calcular_productos_por_pais(path_canceladas, path_concretadas)
+    guardar_tabla(productos, os.path.join(path_gold, TABLA_PRODUCTOS))
+    registrar_salida(len(productos), paths=(os.path.join(path_gold, TABLA_PRODUCTOS),))
+    logger.info(f'Guardada tabla {TABLA_PRODUCTOS} con {len(productos)} registros')
+    
+
+@task(
+    name='build_transaction_features',
+    description='Calculamos los agregados por transaccion que usa el modelo de abandono'
+)
+@instrumentar
+def build_transaction_features(path_canceladas: str, path_concretadas: str, path_gold: str)->int:
+    """
+    Calculamos los agregados de cada transaccion (cantidad total, productos distintos, precio total y promedio, y si
+    fue abandonada) en una sola pasada sobre las lineas de silver, y los guardamos en gold.
+
+    Args:
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        path_gold (str): directorio donde guardamos la tabla de features
+    Returns:
+        int: Cantidad de transacciones
+    """
+    logger = get_run_logger()
+    features = agregados_por_transaccion(leer_lineas(path_canceladas, path_concretadas))
+    
+    os.makedirs(path_gold, exist_ok=True)
+    guardar_tabla(features, os.path.join(path_gold, TABLA_FEATURES))
+    registrar_salida(len(features), paths=(os.path.join(path_gold, TABLA_FEATURES),))
+    logger.info(f'Guardada tabla {TABLA_FEATURES} con {len(features)} transacciones')
+    return len(features)
+    
+
+@task(
+    name='update_customer_features',
+    description='Actualizamos el store de features por cliente (RFM, tasa de cancelacion, canasta) con las filas nuevas de silver'
+)
+@instrumentar
+def update_customer_features(path_canceladas: str, path_concretadas: str, path_gold: str, reconstruir: bool = False)->dict:
+    """
+    Actualizamos el store de features por CustomerNo de gold. Solo se leen las filas de silver posteriores a la
+    marca de agua del store, y sus acumulados se suman a los que ya estaban, sin recalcular todo el historico.
+
+    Args:
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        path_gold (str): directorio donde guardamos el store de clientes
+        reconstruir (bool, optional): Si es True se recalcula el store desde cero (cuando silver se reprocesa entero). Defaults to False.
+    Returns:
+        dict: Cantidad de clientes, clientes actualizados, lineas nuevas y la marca de agua del store
+    """
+    logger = get_run_logger()
+    os.makedirs(path_gold, exist_ok=True)
+    resultado = actualizar_clientes(path_canceladas, path_concretadas, os.path.join(path_gold, TABLA_CLIENTES), reconstruir)
+    registrar_salida(resultado['clientes'], paths=(os.path.join(path_gold, TABLA_CLIENTES),))
+    logger.info(
+        f'Guardada tabla {TABLA_CLIENTES} con {resultado["clientes"]} clientes '
+        f'({resultado["clientes_actualizados"]} actualizados con {resultado["lineas_nuevas"]} lineas nuevas)'
+    )
+    return resultado
+    
+
+@task(
+    name='score_transactions',
+    description='Calculamos la probabilidad de abandono de cada transaccion con el modelo entrenado'
+)
+@instrumentar
+def score_transactions(path_canceladas: str, path_concretadas: str, path_modelos: str, path_gold: str,
+                       transacciones_por_chunk: int = TRANSACCIONES_POR_CHUNK_DEFAULT, n_jobs: int = -1)->dict | None:
+    """
+    Cargamos el modelo (y su vocabulario de features) una sola vez, calculamos la matriz dispersa de features
+    de todas las transacciones de silver por chunks y las puntuamos en paralelo. Las probabilidades de abandono por TransactionNo se guardan en gold.
+    Si todavia no hay un modelo entrenado no se hace nada.
+
+    Args:
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        path_modelos (str): directorio del modelo serializado y su vocabulario
+        path_gold (str): directorio donde guardamos la tabla de probabilidades
+        transacciones_por_chunk (int, optional): Transacciones por chunk. Defaults to TRANSACCIONES_POR_CHUNK_DEFAULT.
+        n_jobs (int, optional): Cantidad de threads para puntuar, -1 usa todos los cores. Defaults to -1.
+    Returns:
+        dict | None: Metricas de rendimiento (transacciones, lineas, segundos, filas por segundo), o None si no hay modelo
+    """
+    logger = get_run_logger()
+    try:
+        modelo, vocabulario = cargar_modelo(path_modelos)
+    except FileNotFoundError:
+        logger.warning(f'No se encontro el modelo en {path_modelos}, no se puntuan las transacciones')
+        return None
+    
+    lineas = leer_lineas(path_canceladas, path_concretadas)
+    probabilidades, metricas = puntuar_transacciones(modelo, vocabulario, lineas, transacciones_por_chunk, n_jobs)
+    
+    os.makedirs(path_gold, exist_ok=True)
+    guardar_tabla(probabilidades, os.path.join(path_gold, TABLA_PROBABILIDADES))
+    registrar_salida(len(probabilidades), paths=(os.path.join(path_gold, TABLA_PROBABILIDADES),))
+    logger.info(f'Guardada tabla {TABLA_PROBABILIDADES} con {metricas["transacciones"]} transacciones')
+    logger.info(
+        f'Puntuadas {metricas["lineas"]} lineas en {metricas["segundos"]:.2f}s: '
+        f'{metricas["lineas_por_segundo"]:,.0f} filas/s, {metricas["transacciones_por_segundo"]:,.0f} transacciones/s'
+    )
+    return metricas
+    
+
+@task(
+    name='publish_stage_metrics',
+    description='Publicamos las metricas de cada etapa de esta ejecucion como artifact de Prefect, en json y para Prometheus'
+)
+def publish_stage_metrics(path_metricas: str, parametros: dict | None = None)->list:
+    """
+    Juntamos las metricas (tiempo de pared y de CPU, memoria maxima del proceso, concurrencia, filas y bytes escritos) que registraron las tareas
+    de esta ejecucion del flow, las guardamos en path_metricas (etl_metricas.json con cada ejecucion de cada etapa y
+    etl_metricas.prom para el textfile collector de node_exporter), y las publicamos como una tabla en los artifacts del flow.
+
+    La division en canceladas y concretadas y la escritura de silver son una sola etapa: write_canceladas_y_concretadas_to_parquet
+    en serie, o write_chunk_to_silver (una ejecucion por chunk) y compact_silver_fragments con workers > 1.
+
+    Args:
+        path_metricas (str): directorio donde guardamos las metricas
+        parametros (dict, optional): Parametros de la ejecucion, se guardan en el json para comparar ejecuciones. Defaults to None.
+    Returns:
+        list: Resumen de las metricas, una fila por etapa
+    """
+    logger = get_run_logger()
+    id_ejecucion = flow_run.get_id()
+    etapas = [etapa.a_dict() for etapa in REGISTRO.extraer(id_ejecucion)]
+    resumen = resumir(etapas)
+    
+    path_json, path_prometheus = guardar_metricas(etapas, path_metricas, {'id': id_ejecucion, 'parametros': parametros or {}})
+    logger.info(f'Guardadas las metricas de {len(etapas)} ejecuciones de {len(resumen)} etapas en {path_json} y {path_prometheus}')
     
-    logger.info(f'Guardado archivo en {path}')
+    if resumen:
+        mas_lenta = max(resumen, key=lambda fila: fila['segundos'])
+        create_table_artifact(
+            key='etl-metricas-etapas',
+            table=[{campo: round(valor, 3) if isinstance(valor, float) else valor for campo, valor in fila.items()} for fila in resumen],
+            description=(
+                f'Metricas por etapa del ETL. La etapa mas lenta fue {mas_lenta["etapa"]} ({mas_lenta["segundos"]:.2f}s de pared, '
+                f'sin sumar las ejecuciones que corrieron al mismo tiempo). La memoria es la de todo el proceso: con concurrencia '
+                f'mayor a 1 incluye la de las etapas que corrian a la vez'
+            )
+        )
+    for etapa in etapas:
+        if etapa['perfil'] is not None:
+            logger.info(f'Perfil de {etapa["etapa"]} en {etapa["perfil"]} (python -m pstats {etapa["perfil"]})')
+    return resumen
     
 
+def procesar_bronze(path: str, chunksize: int | None = None, row_group_size: int = ROW_GROUP_SIZE_DEFAULT, marca: dict | None = None,
+                    workers: int = WORKERS_DEFAULT, path_canceladas: str = PATH_CANCELADAS, path_concretadas: str = PATH_CONCRETADAS,
+                    path_gold: str = PATH_GOLD, path_modelos: str = PATH_MODELOS)->dict:
+    """
+    Escribimos silver a partir del csv de bronze y recalculamos las tablas de gold. Se llama desde un flow
+    (las tareas se envian a su task runner).
+
+    Con workers > 1 el csv se parte en chunks independientes (los de chunksize, o workers pedazos del dataframe)
+    que se transforman y escriben en silver al mismo tiempo, cada uno en sus propios fragmentos, y al final se
+    compactan en un archivo por particion. Con workers = 1 (el default) se recorre todo una sola vez y se escribe
+    un fragmento por particion.
+    Despues las tablas de gold, que solo dependen de silver, se calculan al mismo tiempo entre ellas.
+    Son threads: la lectura del csv, los parquet y las agregaciones de pandas / pyarrow sueltan el GIL.
+
+    Args:
+        path (str): path del csv de bronze
+        chunksize (int, optional): Si se especifica, el csv se procesa en chunks de esa cantidad de filas. Defaults to None.
+        row_group_size (int, optional): Cantidad de filas por row group de los parquet de silver. Defaults to ROW_GROUP_SIZE_DEFAULT.
+        marca (dict, optional): Marca de agua de la ultima ejecucion, para procesar solo las filas nuevas. Se ignora
+            si silver todavia tiene el formato anterior (un solo archivo): se reprocesa todo. Defaults to None.
+        workers (int, optional): Cantidad de tareas que corren al mismo tiempo. Defaults to WORKERS_DEFAULT.
+        path_canceladas (str, optional): path del dataset de transacciones canceladas. Defaults to PATH_CANCELADAS.
+        path_concretadas (str, optional): path del dataset de transacciones concretadas. Defaults to PATH_CONCRETADAS.
+        path_gold (str, optional): directorio de las tablas de gold. Defaults to PATH_GOLD.
+        path_modelos (str, optional): directorio del modelo entrenado. Defaults to PATH_MODELOS.
+    Returns:
+        dict: Nueva marca de agua, la ultima Date / TransactionNo procesada
+    """
+    logger = get_run_logger()
+    if marca is not None and es_formato_anterior(path_canceladas, path_concretadas):
+        logger.warning('Silver tiene el formato anterior (un solo archivo por dataset), se reprocesa todo el bronze')
+        marca = None
+    incremental = marca is not None
+    df = get_data_from_csv(path, chunksize)
+    
+    if workers == 1:
+        df = transform_df(df)
+        marca = write_canceladas_y_concretadas_to_parquet(df, path_canceladas, path_concretadas, row_group_size, marca)
+    else:
+        nombre_fragmento = max(
+            preparar_directorio(path_canceladas, vaciar=not incremental, marca=marca),
+            preparar_directorio(path_concretadas, vaciar=not incremental, marca=marca)
+        )
+        resultados = correr_en_paralelo((
+            (write_chunk_to_silver, (chunk, indice, path_canceladas, path_concretadas, nombre_fragmento, row_group_size, marca), {})
+            for indice, chunk in enumerate(partir_en_chunks(df, workers))
+        ), workers)
+        filas_canceladas = sum(resultado['canceladas'] for resultado in resultados)
+        filas_concretadas = sum(resultado['concretadas'] for resultado in resultados)
+        if not incremental and filas_canceladas + filas_concretadas == 0:
+            raise ValueError('No data found')
+        logger.info(f'Guardadas {filas_canceladas} transacciones canceladas en {path_canceladas} ({len(resultados)} chunks, {workers} workers)')
+        logger.info(f'Guardadas {filas_concretadas} transacciones concretadas en {path_concretadas}')
+        marca = combinar_marcas(marca, *[resultado['marca'] for resultado in resultados])
+        correr_en_paralelo([
+            (compact_silver_fragments, (path_silver, nombre_fragmento, row_group_size), {})
+            for path_silver in (path_canceladas, path_concretadas)
+        ], workers)
+    
+    # Las tablas de gold solo leen silver, no dependen entre ellas
+    correr_en_paralelo([
+        (build_gold_tables, (path_canceladas, path_concretadas, path_gold), {}),
+        (build_transaction_features, (path_canceladas, path_concretadas, path_gold), {}),
+        (update_customer_features, (path_canceladas, path_concretadas, path_gold), {'reconstruir': not incremental}),
+        (score_transactions, (path_canceladas, path_concretadas, path_modelos, path_gold), {})
+    ], workers)
+    return marca
+    
 @flow(
     name='etl-flow',
-    description='Pipeline para extraer, transformar y cargar datos de un dataset de kaggle'
+    description='Pipeline para extraer, transformar y cargar datos de un dataset de kaggle',
+    # Sin limite propio: la cantidad de tareas al mismo tiempo la controla el parametro workers
+    task_runner=ThreadPoolTaskRunner()
 )
-def etl():
+def etl(chunksize: int | None = None, row_group_size: int = ROW_GROUP_SIZE_DEFAULT, incremental: bool = False,
+        workers: int = WORKERS_DEFAULT, origen_local: str | None = None, path_metricas: str = PATH_METRICAS,
+        perfilar: list[str] | None = None):
+    """
+    Args:
+        chunksize (int, optional): Si se especifica, el csv se procesa en chunks de esa cantidad de filas,
+            sin cargarlo entero en memoria. Defaults to None.
+        row_group_size (int, optional): Cantidad de filas por row group de los parquet de silver. Defaults to ROW_GROUP_SIZE_DEFAULT.
+        incremental (bool, optional): Si es True solo se procesan las filas posteriores a la marca de agua de la ultima
+            ejecucion, y si el archivo de bronze no cambio no se procesa nada. Defaults to False.
+        workers (int, optional): Cantidad de chunks / tablas de gold que se procesan al mismo tiempo. Defaults to WORKERS_DEFAULT.
+        origen_local (str, optional): Un zip o csv local para usar como fuente en lugar de kaggle. Defaults to None.
+        path_metricas (str, optional): directorio de las metricas por etapa de la ejecucion. Defaults to PATH_METRICAS.
+        perfilar (list[str], optional): Nombres de las tareas a perfilar con cProfile, los perfiles quedan en
+            path_metricas/perfiles. Defaults to None (las de la variable de entorno ETL_PERFILAR).
+    """
     logger = get_run_logger()
-    path = get_dataset_from_kaggle('../data/bronze','gabrielramos87/an-online-shop-business','transactions.csv')
-    df = get_data_from_csv(path)
-    df = transform_df(df)
-    df_canceladas, df_concretadas = divide_df_in_canceladas_y_concretadas(df)
-    
-    transform_df_to_parquet(df_canceladas, '../data/silver/transacciones_canceladas.parquet')
-    transform_df_to_parquet(df_concretadas, '../data/silver/transacciones_concretadas.parquet')
-    logger.info('Pipeline finalizado y completado')
+    configurar_perfilado(perfilar, os.path.join(path_metricas, 'perfiles'))
+    try:
+        path, hash_bronze = get_dataset_from_kaggle('../data/bronze','gabrielramos87/an-online-shop-business','transactions.csv', origen_local)
+        
+        estado = get_etl_state(PATH_ESTADO)
+        if incremental and estado.get('hash_bronze') == hash_bronze:
+            logger.info('El archivo de bronze no cambio desde la ultima ejecucion, no hay nada nuevo para procesar')
+            return
+        
+        marca = procesar_bronze(
+            path,
+            chunksize,
+            row_group_size,
+            estado.get('marca') if incremental else None,
+            workers
+        )
+        
+        save_etl_state(PATH_ESTADO, {'hash_bronze': hash_bronze, 'marca': marca})
+        logger.info('Pipeline finalizado y completado')
+    finally:
+        # Tambien si fallo una tarea: las metricas de las etapas que llegaron a correr sirven para ver donde
+        publish_stage_metrics(path_metricas, {'chunksize': chunksize, 'row_group_size': row_group_size, 'incremental': incremental, 'workers': workers})
     
 if __name__ == '__main__':
     etl.serve(name="etl-flow")
\ No newline at end of file
@@ -0,0 +1,359 @@
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import pandas as pd
+import psutil
+
+
+ARCHIVO_JSON = 'etl_metricas.json'
+ARCHIVO_PROMETHEUS = 'etl_metricas.prom'
+INTERVALO_RSS_DEFAULT = 0.01
+# Etapas a perfilar con cProfile, separadas por comas (tambien se puede configurar con configurar_perfilado)
+VARIABLE_PERFILAR = 'ETL_PERFILAR'
+VARIABLE_DIRECTORIO_PERFILES = 'ETL_PERFILES'
+
+
+def _suma(ejecuciones: list, campo: str):
+    return sum(ejecucion[campo] for ejecucion in ejecuciones)
+
+
+def _maximo(ejecuciones: list, campo: str):
+    return max(ejecucion[campo] for ejecucion in ejecuciones)
+
+
+def segundos_de_pared(ejecuciones: list, campo: str = 'segundos') -> float:
+    """
+    Tiempo de pared en que corrio al menos una ejecucion de la etapa: la union de los intervalos
+    [inicio, inicio + segundos] de las ejecuciones. Las que corren al mismo tiempo (chunks en paralelo) no se suman.
+    """
+    inicios = [datetime.fromisoformat(ejecucion['inicio']).timestamp() for ejecucion in ejecuciones]
+    intervalos = sorted((inicio, inicio + ejecucion[campo]) for inicio, ejecucion in zip(inicios, ejecuciones))
+    total, desde, hasta = 0.0, *intervalos[0]
+    for inicio, fin in intervalos[1:]:
+        if inicio > hasta:
+            total += hasta - desde
+            desde = inicio
+        hasta = max(hasta, fin)
+    return total + hasta - desde
+
+
+# Metricas que se exportan a Prometheus: (campo de la etapa, nombre, descripcion, como se combinan varias ejecuciones
+# de la etapa: una funcion de las ejecuciones que tienen el campo y el campo)
+METRICAS_PROMETHEUS = [
+    ('segundos', 'etl_etapa_segundos', 'Tiempo de pared de la etapa (las ejecuciones que corren al mismo tiempo no se suman)', segundos_de_pared),
+    ('cpu_segundos', 'etl_etapa_cpu_segundos', 'Tiempo de CPU del thread de la etapa (sin los threads internos de pyarrow)', _suma),
+    ('rss_proceso_pico_bytes', 'etl_etapa_rss_proceso_pico_bytes',
+     'Memoria residente maxima de todo el proceso mientras corria la etapa (incluye las etapas que corrian al mismo tiempo)', _maximo),
+    ('concurrencia', 'etl_etapa_concurrencia', 'Cantidad maxima de etapas que corrieron al mismo tiempo que la etapa, contandola', _maximo),
+    ('filas_entrada', 'etl_etapa_filas_entrada', 'Filas que recibio la etapa', _suma),
+    ('filas_salida', 'etl_etapa_filas_salida', 'Filas que devolvio o escribio la etapa', _suma),
+    ('bytes_escritos', 'etl_etapa_bytes_escritos', 'Bytes escritos a disco por la etapa', _suma),
+]
+
+
+def _filas(valor) -> int | None:
+    """
+    Filas de un dataframe, o la suma de las de una tupla / lista de dataframes. None si no hay dataframes
+    (por ejemplo los chunks de un csv leido por partes, que todavia no se leyeron).
+    """
+    if isinstance(valor, pd.DataFrame):
+        return len(valor)
+    if isinstance(valor, (tuple, list)):
+        filas = [len(elemento) for elemento in valor if isinstance(elemento, pd.DataFrame)]
+        return sum(filas) if filas else None
+    return None
+
+
+def bytes_en_disco(path: str, prefijo: str = '') -> int:
+    """
+    Tamaño de un archivo, o la suma de los archivos de un directorio (y sus particiones) cuyo nombre empieza
+    con prefijo, por ejemplo los fragmentos que escribio una ejecucion. 0 si no existe.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(raiz, archivo))
+        for raiz, _, archivos in os.walk(path) for archivo in archivos if archivo.startswith(prefijo)
+    )
+
+
+class MuestreadorRSS:
+    """
+    Mide la memoria residente maxima del proceso mientras esta activo, muestreandola desde un thread cada intervalo segundos.
+    Es la memoria de todo el proceso: si corren varias etapas al mismo tiempo, el pico de cada una incluye la de las otras.
+    """
+    def __init__(self, intervalo: float = INTERVALO_RSS_DEFAULT):
+        self.intervalo = intervalo
+        self.pico = 0
+        self.__proceso = psutil.Process()
+        self.__fin = threading.Event()
+        self.__thread = threading.Thread(target=self.__muestrear, daemon=True)
+
+    def __muestrear(self):
+        while True:
+            self.pico = max(self.pico, self.__proceso.memory_info().rss)
+            if self.__fin.wait(self.intervalo):
+                break
+
+    def __enter__(self):
+        self.pico = self.__proceso.memory_info().rss
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.__fin.set()
+        self.__thread.join()
+        self.pico = max(self.pico, self.__proceso.memory_info().rss)
+
+
+class Etapa:
+    """
+    Metricas de una ejecucion de una etapa (una task) del ETL. filas_salida y bytes_escritos los puede completar
+    la propia etapa (con etapa_actual()) cuando no se deducen de lo que devuelve.
+
+    cpu_segundos es el tiempo de CPU del thread de la etapa, no se mezcla con el de las etapas que corren al mismo
+    tiempo; rss_proceso_pico_bytes si es de todo el proceso, concurrencia dice cuantas etapas corrian a la vez.
+    """
+    def __init__(self, nombre: str, ejecucion: str | None = None):
+        self.nombre = nombre
+        self.ejecucion = ejecucion
+        self.inicio = None
+        self.segundos = None
+        self.cpu_segundos = None
+        self.rss_proceso_pico_bytes = None
+        self.concurrencia = 1
+        self.filas_entrada = None
+        self.filas_salida = None
+        self.bytes_escritos = 0
+        self.perfil = None
+
+    def a_dict(self) -> dict:
+        return {
+            'etapa': self.nombre,
+            'inicio': self.inicio,
+            'segundos': self.segundos,
+            'cpu_segundos': self.cpu_segundos,
+            'rss_proceso_pico_bytes': self.rss_proceso_pico_bytes,
+            'concurrencia': self.concurrencia,
+            'filas_entrada': self.filas_entrada,
+            'filas_salida': self.filas_salida,
+            'bytes_escritos': self.bytes_escritos,
+            'perfil': self.perfil
+        }
+
+
+class RegistroMetricas:
+    """
+    Guarda las etapas medidas de cada ejecucion del flow (por id de ejecucion). Las tasks corren en threads
+    del mismo proceso, asi que se comparte un solo registro protegido con un lock.
+    """
+    def __init__(self):
+        self.__etapas = {}
+        self.__lock = threading.Lock()
+
+    def agregar(self, etapa: Etapa):
+        with self.__lock:
+            self.__etapas.setdefault(etapa.ejecucion, []).append(etapa)
+
+    def extraer(self, ejecucion: str | None) -> list:
+        """
+        Devuelve las etapas de una ejecucion (en orden de finalizacion) y las saca del registro.
+        """
+        with self.__lock:
+            return self.__etapas.pop(ejecucion, [])
+
+
+REGISTRO = RegistroMetricas()
+_local = threading.local()
+_perfilado = {'etapas': None, 'directorio': None}
+# cProfile solo puede perfilar una etapa a la vez
+_lock_perfil = threading.Lock()
+# Etapas que estan corriendo ahora (en cualquier thread), para saber cuantas se superponen
+_activas = set()
+_lock_activas = threading.Lock()
+
+
+def configurar_perfilado(etapas: list | None, directorio: str | None = None):
+    """
+    Perfila con cProfile las etapas indicadas (None para usar la variable de entorno ETL_PERFILAR). Cada ejecucion
+    de una etapa perfilada se guarda en directorio/{etapa}-{timestamp}.prof (formato pstats: python -m pstats, snakeviz).
+    """
+    _perfilado['etapas'] = set(etapas) if etapas is not None else None
+    _perfilado['directorio'] = directorio
+
+
+def _etapas_perfiladas() -> set:
+    if _perfilado['etapas'] is not None:
+        return _perfilado['etapas']
+    return {etapa.strip() for etapa in os.environ.get(VARIABLE_PERFILAR, '').split(',') if etapa.strip()}
+
+
+def etapa_actual() -> Etapa | None:
+    """
+    La etapa que se esta midiendo en este thread, para que la task complete filas_salida o bytes_escritos.
+    """
+    return getattr(_local, 'etapa', None)
+
+
+def registrar_salida(filas: int | None = None, paths: tuple = (), prefijo: str = ''):
+    """
+    Completa la etapa que se esta midiendo con las filas que escribio y los bytes de los archivos que escribio
+    (los de paths, o dentro de paths los que empiezan con prefijo). Fuera de una etapa medida no hace nada.
+    """
+    etapa = etapa_actual()
+    if etapa is None:
+        return
+    if filas is not None:
+        etapa.filas_salida = (etapa.filas_salida or 0) + filas
+    etapa.bytes_escritos += sum(bytes_en_disco(path, prefijo) for path in paths)
+
+
+def _ejecucion_actual() -> str | None:
+    try:
+        from prefect.runtime import flow_run
+        return flow_run.get_id()
+    except Exception:
+        return None
+
+
+def instrumentar(funcion):
+    """
+    Decorador para las tasks del ETL: mide el tiempo de pared y de CPU (del thread), la memoria residente maxima del proceso,
+    cuantas etapas corren al mismo tiempo, y las filas que recibe (dataframes en los argumentos) y devuelve (dataframes en
+    el resultado), y guarda la etapa en REGISTRO.
+
+    Mientras corre, el thread se llama 'etapa:{nombre}' (lo muestran py-spy dump / py-spy top), y si la etapa esta
+    en ETL_PERFILAR se perfila con cProfile.
+    """
+    @functools.wraps(funcion)
+    def medir(*args, **kwargs):
+        etapa = Etapa(funcion.__name__, _ejecucion_actual())
+        etapa.filas_entrada = _filas([valor for valor in list(args) + list(kwargs.values()) if isinstance(valor, pd.DataFrame)])
+        etapa.inicio = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+        thread = threading.current_thread()
+        nombre_thread = thread.name
+        thread.name = f'etapa:{etapa.nombre}'
+        _local.etapa = etapa
+
+        perfil = None
+        if etapa.nombre in _etapas_perfiladas() and _lock_perfil.acquire(blocking=False):
+            perfil = cProfile.Profile()
+
+        with _lock_activas:
+            _activas.add(etapa)
+            for activa in _activas:
+                activa.concurrencia = max(activa.concurrencia, len(_activas))
+
+        inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+        try:
+            with MuestreadorRSS() as rss:
+                if perfil is not None:
+                    perfil.enable()
+                try:
+                    resultado = funcion(*args, **kwargs)
+                finally:
+                    if perfil is not None:
+                        perfil.disable()
+        finally:
+            etapa.segundos = time.perf_counter() - inicio
+            etapa.cpu_segundos = time.thread_time() - inicio_cpu
+            etapa.rss_proceso_pico_bytes = rss.pico
+            with _lock_activas:
+                _activas.discard(etapa)
+            thread.name = nombre_thread
+            _local.etapa = None
+            if perfil is not None:
+                directorio = _perfilado['directorio'] or os.environ.get(VARIABLE_DIRECTORIO_PERFILES, '.')
+                os.makedirs(directorio, exist_ok=True)
+                etapa.perfil = os.path.join(directorio, f'{etapa.nombre}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof')
+                perfil.dump_stats(etapa.perfil)
+                _lock_perfil.release()
+            REGISTRO.agregar(etapa)
+
+        if etapa.filas_salida is None:
+            etapa.filas_salida = _filas(resultado)
+        return resultado
+    return medir
+
+
+def resumir(etapas: list) -> list:
+    """
+    Una fila por etapa combinando sus ejecuciones (por ejemplo una por chunk): el tiempo de CPU, las filas y los bytes
+    se suman; el tiempo de pared es la union de los intervalos de las ejecuciones (las que se superponen no se suman);
+    de la memoria y la concurrencia se toma el maximo. Las etapas quedan en el orden en que terminaron por primera vez.
+
+    Args:
+        etapas (list): Etapas como dicts (Etapa.a_dict)
+
+    Returns:
+        list: dicts con la etapa, la cantidad de ejecuciones y cada metrica de METRICAS_PROMETHEUS (None si ninguna ejecucion la tiene)
+    """
+    por_etapa = {}
+    for etapa in etapas:
+        por_etapa.setdefault(etapa['etapa'], []).append(etapa)
+
+    resumen = []
+    for nombre, ejecuciones in por_etapa.items():
+        fila = {'etapa': nombre, 'ejecuciones': len(ejecuciones)}
+        for campo, _, _, combinar in METRICAS_PROMETHEUS:
+            con_valor = [ejecucion for ejecucion in ejecuciones if ejecucion.get(campo) is not None]
+            fila[campo] = combinar(con_valor, campo) if con_valor else None
+        resumen.append(fila)
+    return resumen
+
+
+def a_prometheus(etapas: list, etiquetas: dict | None = None) -> str:
+    """
+    Metricas de las etapas en el formato de texto de Prometheus (para el textfile collector de node_exporter),
+    una serie por etapa (ver resumir).
+    """
+    etiquetas = etiquetas or {}
+    resumen = resumir(etapas)
+
+    def serie(nombre: str, etapa: str | None, valor) -> str:
+        todas = {**etiquetas, **({'etapa': etapa} if etapa is not None else {})}
+        texto = ','.join(f'{clave}="{valor_etiqueta}"' for clave, valor_etiqueta in todas.items())
+        return f'{nombre}{{{texto}}} {valor}' if texto else f'{nombre} {valor}'
+
+    lineas = []
+    for campo, nombre, descripcion, _ in METRICAS_PROMETHEUS:
+        lineas += [f'# HELP {nombre} {descripcion}', f'# TYPE {nombre} gauge']
+        lineas += [serie(nombre, fila['etapa'], fila[campo]) for fila in resumen if fila[campo] is not None]
+    lineas += ['# HELP etl_etapa_ejecuciones Cantidad de veces que corrio la etapa', '# TYPE etl_etapa_ejecuciones gauge']
+    lineas += [serie('etl_etapa_ejecuciones', fila['etapa'], fila['ejecuciones']) for fila in resumen]
+    lineas += ['# HELP etl_ultima_ejecucion_timestamp_segundos Fin de la ultima ejecucion del ETL', '# TYPE etl_ultima_ejecucion_timestamp_segundos gauge']
+    lineas.append(serie('etl_ultima_ejecucion_timestamp_segundos', None, time.time()))
+    return '\n'.join(lineas) + '\n'
+
+
+def _escribir_atomico(path: str, texto: str):
+    path_tmp = path + '.tmp'
+    with open(path_tmp, 'w', encoding='utf-8') as archivo:
+        archivo.write(texto)
+    os.replace(path_tmp, path)
+
+
+def guardar_metricas(etapas: list, directorio: str, ejecucion: dict | None = None) -> tuple:
+    """
+    Guarda las metricas de una ejecucion en directorio: etl_metricas.json (todas las ejecuciones de cada etapa)
+    y etl_metricas.prom (formato de Prometheus). Se escriben con un rename, un scrape nunca ve un archivo a medias.
+
+    Args:
+        etapas (list): Etapas como dicts (Etapa.a_dict)
+        directorio (str): Directorio de salida
+        ejecucion (dict, optional): Datos de la ejecucion (id, parametros, estado) que se agregan al json. Defaults to None.
+
+    Returns:
+        tuple: paths del json y del archivo de Prometheus
+    """
+    os.makedirs(directorio, exist_ok=True)
+    path_json = os.path.join(directorio, ARCHIVO_JSON)
+    path_prometheus = os.path.join(directorio, ARCHIVO_PROMETHEUS)
+    _escribir_atomico(path_json, json.dumps({'ejecucion': ejecucion or {}, 'etapas': etapas}, indent=4))
+    _escribir_atomico(path_prometheus, a_prometheus(etapas))
+    return path_json, path_prometheus
@@ -0,0 +1,383 @@
+import os
+import re
+import datetime
+import hashlib
+from collections import OrderedDict
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+ROW_GROUP_SIZE_DEFAULT = 100_000
+MAX_ARCHIVOS_ABIERTOS = 256
+
+FORMATO_FECHA = '%m/%d/%Y'
+COLUMNAS_SILVER = ['TransactionNo', 'Date', 'ProductNo', 'ProductName', 'Price', 'Quantity', 'CustomerNo', 'Country']
+
+# Schema declarado de silver. Las columnas con pocos valores distintos se guardan como diccionario
+# (categorical en pandas), Date como timestamp, y los enteros con el menor ancho que entra con margen:
+# Quantity llega a +-80995, que no entra en int16, asi que es int32. CustomerNo hoy llega a 18287 y entraria
+# en int16, pero es un id que crece con cada cliente nuevo y el tope de int16 (32767) haria fallar el casteo
+# seguro despues de unas 14 mil altas, por eso tambien int32. Price es un importe, queda en float64
+# para no redondear los precios. El schema queda guardado en la metadata de los parquet, asi al leerlos
+# se obtienen directamente los tipos compactos.
+ESQUEMA_SILVER = pa.schema([
+    ('TransactionNo', pa.string()),
+    ('Date', pa.timestamp('ns')),
+    ('ProductNo', pa.dictionary(pa.int32(), pa.string())),
+    ('ProductName', pa.dictionary(pa.int32(), pa.string())),
+    ('Price', pa.float64()),
+    ('Quantity', pa.int32()),
+    ('CustomerNo', pa.int32()),
+    ('Country', pa.dictionary(pa.int32(), pa.string()))
+])
+COLUMNAS_CATEGORICAS = [campo.name for campo in ESQUEMA_SILVER if pa.types.is_dictionary(campo.type)]
+
+# Los datasets de silver estan particionados estilo hive: YearMonth=2019-12/Country=United Kingdom/part-XXXXX-N.parquet
+COLUMNAS_PARTICION = ['YearMonth', 'Country']
+ESQUEMA_PARTICION = pa.schema([('YearMonth', pa.string()), ('Country', pa.string())])
+PARTICION_NULA = '__HIVE_DEFAULT_PARTITION__'
+
+
+def _archivos_dataset(path: str) -> list:
+    """
+    Archivos parquet de un dataset (el archivo mismo si no es un directorio particionado), ordenados.
+    """
+    archivos = [path] if os.path.isfile(path) else [
+        os.path.join(raiz, archivo) for raiz, _, nombres in os.walk(path) for archivo in nombres if archivo.endswith('.parquet')
+    ]
+    if not archivos:
+        raise FileNotFoundError(f'No existe el dataset {path}')
+    return sorted(archivos)
+
+
+def version_silver(*paths: str) -> str:
+    """
+    Version de los datasets de silver: un hash de los nombres, tamaños y fechas de modificacion
+    de sus archivos. Cambia cada vez que el ETL escribe algo nuevo, y se calcula sin leer los datos.
+    """
+    sha = hashlib.sha1()
+    for path in paths:
+        for archivo in _archivos_dataset(path):
+            info = os.stat(archivo)
+            sha.update(f'{os.path.relpath(archivo, path)}:{info.st_size}:{info.st_mtime_ns};'.encode())
+    return sha.hexdigest()[:16]
+
+
+def hash_silver(*paths: str, tamanio_bloque: int = 1024 * 1024) -> str:
+    """
+    Hash (sha256) del contenido de los datasets de silver: los nombres de sus archivos y sus bytes. A diferencia de
+    version_silver no cambia si el ETL vuelve a escribir los mismos datos, ni al copiar los datos a otra maquina.
+    """
+    sha = hashlib.sha256()
+    for path in paths:
+        for archivo in _archivos_dataset(path):
+            sha.update(f'{os.path.relpath(archivo, path)};'.encode())
+            with open(archivo, 'rb') as contenido:
+                for bloque in iter(lambda: contenido.read(tamanio_bloque), b''):
+                    sha.update(bloque)
+    return sha.hexdigest()[:16]
+
+
+def mascara_canceladas(tabla: pa.Table) -> pa.ChunkedArray:
+    """
+    Devuelve una mascara booleana con las transacciones canceladas (TransactionNo empieza con 'C').
+    Es un chequeo vectorizado del prefijo, no una busqueda de 'C' en todo el string.
+
+    Args:
+        tabla (pa.Table): Tabla de transacciones
+
+    Returns:
+        pa.ChunkedArray: Mascara con True en las filas canceladas
+    """
+    return pc.fill_null(pc.starts_with(tabla['TransactionNo'], pattern='C'), False)
+
+
+class EscritorParquet:
+    """
+    Escribe un archivo parquet de forma incremental. Las tablas que recibe se acumulan
+    hasta completar un row group de row_group_size filas, y recien ahi se escriben,
+    asi nunca hay en memoria mas de un row group por archivo.
+    """
+    def __init__(self, path: str, schema: pa.Schema, row_group_size: int = ROW_GROUP_SIZE_DEFAULT):
+        if row_group_size <= 0:
+            raise ValueError('El row_group_size tiene que ser mayor a 0')
+        self.path = path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.filas = 0
+        self.__writer = pq.ParquetWriter(path, schema)
+        self.__buffer = []
+        self.__filas_buffer = 0
+
+    def escribir(self, tabla: pa.Table):
+        if tabla.num_rows == 0:
+            return
+        self.__buffer.append(tabla.cast(self.schema))
+        self.__filas_buffer += tabla.num_rows
+        self.filas += tabla.num_rows
+        if self.__filas_buffer >= self.row_group_size:
+            self.__vaciar_buffer(completo=False)
+
+    def __vaciar_buffer(self, completo: bool):
+        tabla = pa.concat_tables(self.__buffer)
+        # Escribimos solo row groups completos, el resto queda esperando al proximo chunk
+        filas_a_escribir = tabla.num_rows if completo else tabla.num_rows - tabla.num_rows % self.row_group_size
+        if filas_a_escribir > 0:
+            self.__writer.write_table(tabla.slice(0, filas_a_escribir), row_group_size=self.row_group_size)
+        resto = tabla.slice(filas_a_escribir)
+        self.__buffer = [resto] if resto.num_rows > 0 else []
+        self.__filas_buffer = resto.num_rows
+
+    def cerrar(self):
+        if self.__buffer:
+            self.__vaciar_buffer(completo=True)
+        self.__writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+def aplicar_esquema(tabla: pa.Table) -> pa.Table:
+    """
+    Castea una tabla de transacciones al schema de silver. Date se parsea desde el formato del csv (m/d/Y).
+    Los casteos de enteros son seguros: si un valor no entra en el tipo declarado se lanza un error.
+    """
+    if pa.types.is_string(tabla.schema.field('Date').type):
+        fechas = pc.strptime(tabla['Date'], format=FORMATO_FECHA, unit='ns', error_is_null=True)
+        tabla = tabla.set_column(tabla.schema.get_field_index('Date'), 'Date', fechas)
+
+    columnas = [pc.cast(tabla[campo.name], campo.type) for campo in ESQUEMA_SILVER]
+    return pa.Table.from_arrays(columnas, schema=ESQUEMA_SILVER)
+
+
+def agregar_year_month(tabla: pa.Table) -> pa.Table:
+    """
+    Agrega la columna YearMonth ('YYYY-MM') a partir de Date, para usarla como particion
+    """
+    return tabla.append_column('YearMonth', pc.strftime(tabla['Date'], format='%Y-%m'))
+
+
+def _compactar_diccionarios(tabla: pa.Table) -> pa.Table:
+    """
+    Despues de un take, las columnas diccionario siguen apuntando al diccionario completo del chunk.
+    Las volvemos a codificar para que cada archivo guarde solo los valores que usa.
+    """
+    for i, campo in enumerate(tabla.schema):
+        if pa.types.is_dictionary(campo.type):
+            valores = tabla.column(i).cast(campo.type.value_type)
+            tabla = tabla.set_column(i, campo, valores.cast(campo.type))
+    return tabla
+
+
+class EscritorParticionado:
+    """
+    Escribe un dataset parquet particionado por YearMonth y Country. Cada particion tiene su propio
+    EscritorParquet, que se abre la primera vez que llegan filas de esa particion.
+
+    Para acotar la memoria y los archivos abiertos, si hay mas de max_archivos_abiertos particiones abiertas
+    se cierra la que hace mas tiempo no recibe filas. Si despues le llegan filas de nuevo se abre otro archivo
+    en la misma particion.
+    """
+    def __init__(self, path: str, nombre_fragmento: str, row_group_size: int = ROW_GROUP_SIZE_DEFAULT,
+                 max_archivos_abiertos: int = MAX_ARCHIVOS_ABIERTOS):
+        self.path = path
+        self.nombre_fragmento = nombre_fragmento
+        self.row_group_size = row_group_size
+        self.max_archivos_abiertos = max_archivos_abiertos
+        self.filas = 0
+        self.__escritores = OrderedDict()
+        self.__archivos_por_particion = {}
+
+    def __escritor(self, particion: tuple, schema: pa.Schema) -> EscritorParquet:
+        if particion in self.__escritores:
+            self.__escritores.move_to_end(particion)
+            return self.__escritores[particion]
+
+        if len(self.__escritores) >= self.max_archivos_abiertos:
+            _, escritor = self.__escritores.popitem(last=False)
+            escritor.cerrar()
+
+        directorio = os.path.join(self.path, *[f'{col}={quote(valor, safe=" ")}' for col, valor in zip(COLUMNAS_PARTICION, particion)])
+        os.makedirs(directorio, exist_ok=True)
+        numero = self.__archivos_por_particion.get(particion, 0)
+        self.__archivos_por_particion[particion] = numero + 1
+
+        escritor = EscritorParquet(os.path.join(directorio, f'{self.nombre_fragmento}-{numero}.parquet'), schema, self.row_group_size)
+        self.__escritores[particion] = escritor
+        return escritor
+
+    def escribir(self, tabla: pa.Table):
+        """
+        Escribe una tabla que tiene las columnas de particion (YearMonth y Country)
+        """
+        if tabla.num_rows == 0:
+            return
+
+        # Codificamos cada columna de particion como enteros y ordenamos, asi cada particion queda contigua
+        codigos = np.zeros(tabla.num_rows, dtype=np.int64)
+        diccionarios = []
+        for col in COLUMNAS_PARTICION:
+            codificada = pc.dictionary_encode(pc.fill_null(tabla[col], PARTICION_NULA)).combine_chunks()
+            codigos = codigos * len(codificada.dictionary) + codificada.indices.to_numpy()
+            diccionarios.append(codificada)
+
+        orden = np.argsort(codigos, kind='stable')
+        cortes = np.flatnonzero(np.diff(codigos[orden])) + 1
+        datos = tabla.drop_columns(COLUMNAS_PARTICION)
+
+        for posiciones in np.split(orden, cortes):
+            fila = posiciones[0]
+            particion = tuple(d.dictionary[d.indices[fila].as_py()].as_py() for d in diccionarios)
+            parte = _compactar_diccionarios(datos.take(posiciones))
+            self.__escritor(particion, datos.schema).escribir(parte)
+            self.filas += parte.num_rows
+
+    def cerrar(self):
+        for escritor in self.__escritores.values():
+            escritor.cerrar()
+        self.__escritores.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+def escribir_canceladas_y_concretadas(chunks, path_canceladas: str, path_concretadas: str, nombre_fragmento: str = 'part-00000',
+                                      row_group_size: int = ROW_GROUP_SIZE_DEFAULT) -> tuple:
+    """
+    Recorre los chunks una sola vez, y envia cada fila directamente al dataset de canceladas
+    o al de concretadas, en la particion YearMonth / Country que le corresponde.
+    Ninguna de las dos mitades se tiene entera en memoria.
+
+    Args:
+        chunks: Iterable de dataframes ya transformados (o una lista con un solo dataframe)
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        nombre_fragmento (str, optional): Nombre base de los archivos que se escriben en cada particion. Defaults to 'part-00000'.
+        row_group_size (int, optional): Cantidad de filas por row group. Defaults to ROW_GROUP_SIZE_DEFAULT.
+
+    Returns:
+        tuple (int): Cantidad de filas escritas en canceladas y en concretadas. Si no llego ningun chunk
+            devuelve (0, 0) y no se crea ningun archivo
+    """
+    with EscritorParticionado(path_canceladas, nombre_fragmento, row_group_size) as escritor_canceladas, \
+         EscritorParticionado(path_concretadas, nombre_fragmento, row_group_size) as escritor_concretadas:
+        for chunk in chunks:
+            tabla = agregar_year_month(aplicar_esquema(pa.Table.from_pandas(chunk, preserve_index=False)))
+            mascara = mascara_canceladas(tabla)
+            escritor_canceladas.escribir(tabla.filter(mascara))
+            escritor_concretadas.escribir(tabla.filter(pc.invert(mascara)))
+
+    return escritor_canceladas.filas, escritor_concretadas.filas
+
+
+def compactar_fragmentos(path: str, nombre_fragmento: str, row_group_size: int = ROW_GROUP_SIZE_DEFAULT) -> int:
+    """
+    Junta en un solo archivo por particion los fragmentos que escribieron los chunks procesados en paralelo
+    ({nombre_fragmento}-{indice}-N.parquet), en el orden de los chunks. Queda un {nombre_fragmento}-0.parquet por
+    particion, como cuando se escribe en serie, en lugar de un archivo por chunk y particion. Los row groups se
+    copian de a uno, sin cargar la particion entera en memoria.
+
+    Args:
+        path (str): path del dataset (directorio particionado)
+        nombre_fragmento (str): Nombre base de los fragmentos de la ejecucion (ver preparar_directorio)
+        row_group_size (int, optional): Cantidad de filas por row group. Defaults to ROW_GROUP_SIZE_DEFAULT.
+
+    Returns:
+        int: Cantidad de archivos que quedaron despues de compactar
+    """
+    patron = re.compile(re.escape(nombre_fragmento) + r'-(\d{5})-(\d+)\.parquet$')
+    compactados = 0
+    for raiz, _, archivos in os.walk(path):
+        fragmentos = sorted(
+            (tuple(int(numero) for numero in coincidencia.groups()), os.path.join(raiz, archivo))
+            for archivo in archivos if (coincidencia := patron.match(archivo))
+        )
+        if not fragmentos:
+            continue
+        destino = os.path.join(raiz, f'{nombre_fragmento}-0.parquet')
+        if len(fragmentos) == 1:
+            os.replace(fragmentos[0][1], destino)
+        else:
+            path_tmp = destino + '.tmp'
+            with EscritorParquet(path_tmp, pq.read_schema(fragmentos[0][1]), row_group_size) as escritor:
+                for _, fragmento in fragmentos:
+                    archivo = pq.ParquetFile(fragmento)
+                    for i in range(archivo.num_row_groups):
+                        escritor.escribir(archivo.read_row_group(i))
+            os.replace(path_tmp, destino)
+            for _, fragmento in fragmentos:
+                os.remove(fragmento)
+        compactados += 1
+    return compactados
+
+
+def leer_silver(path: str, columnas: list | None = None, paises: list | None = None,
+                desde: datetime.date | None = None, hasta: datetime.date | None = None) -> pd.DataFrame:
+    """
+    Lee un dataset de silver empujando los filtros al escaneo: los filtros de pais y de fecha descartan
+    particiones enteras (YearMonth / Country) sin abrir sus archivos, y solo se leen las columnas pedidas.
+    Los tipos salen del schema guardado en los parquet, no hace falta convertir nada despues de leer.
+
+    Args:
+        path (str): path del dataset (directorio particionado, o un archivo parquet)
+        columnas (list, optional): Columnas a leer. Defaults to None (todas las de silver).
+        paises (list, optional): Paises a leer. Defaults to None (todos).
+        desde (datetime.date, optional): Fecha minima (inclusive). Defaults to None.
+        hasta (datetime.date, optional): Fecha maxima (inclusive). Defaults to None.
+
+    Returns:
+        pd.DataFrame: Dataframe con las filas y columnas pedidas
+    """
+    particionado = os.path.isdir(path)
+    dataset = ds.dataset(path, format='parquet', partitioning=ds.partitioning(ESQUEMA_PARTICION, flavor='hive') if particionado else None)
+
+    filtro = None
+    def agregar(condicion):
+        nonlocal filtro
+        filtro = condicion if filtro is None else filtro & condicion
+
+    if paises is not None:
+        agregar(ds.field('Country').isin(list(paises)))
+
+    if desde is not None or hasta is not None:
+        fechas = ds.field('Date')
+        if pa.types.is_string(dataset.schema.field('Date').type):
+            # Datasets escritos antes del schema declarado, con Date como string
+            fechas = pc.strptime(fechas, format=FORMATO_FECHA, unit='ns', error_is_null=True)
+        if desde is not None:
+            if particionado:
+                agregar(ds.field('YearMonth') >= desde.strftime('%Y-%m'))
+            agregar(fechas >= pa.scalar(datetime.datetime.combine(desde, datetime.time.min), type=pa.timestamp('ns')))
+        if hasta is not None:
+            if particionado:
+                agregar(ds.field('YearMonth') <= hasta.strftime('%Y-%m'))
+            agregar(fechas <= pa.scalar(datetime.datetime.combine(hasta, datetime.time.min), type=pa.timestamp('ns')))
+
+    columnas = columnas if columnas is not None else COLUMNAS_SILVER
+    # Country viene del path de la particion como string, lo pasamos a categorical como el resto
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas(categories=[c for c in columnas if c in COLUMNAS_CATEGORICAS])
+
+
+def concatenar_silver(dfs: list) -> pd.DataFrame:
+    """
+    Concatena dataframes de silver manteniendo las columnas categoricas (pd.concat las convierte
+    a object si las categorias no son las mismas en todos los dataframes)
+    """
+    dfs = list(dfs)
+    for col in COLUMNAS_CATEGORICAS:
+        if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in dfs):
+            categorias = union_categoricals([df[col] for df in dfs]).categories
+            dfs = [df.assign(**{col: df[col].cat.set_categories(categorias)}) for df in dfs]
+    return pd.concat(dfs)
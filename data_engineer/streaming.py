@@ -0,0 +1,78 @@
+import pandas as pd
+
+
+# Tipos declarados para el csv de kaggle. Leyendo en chunks, pandas infiere los tipos
+# de cada chunk por separado, por lo que sin declararlos un chunk sin transacciones
+# canceladas tendria TransactionNo como int y otro como str.
+DTYPES_CSV = {
+    'TransactionNo': str,
+    'Date': str,
+    'ProductNo': str,
+    'ProductName': str,
+    'Price': 'float64',
+    'Quantity': 'int64',
+    'CustomerNo': 'float64',
+    'Country': str
+}
+
+CHUNKSIZE_DEFAULT = 100_000
+
+
+def transformar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Limpia un dataframe (o un chunk) de transacciones: elimina los registros sin TransactionNo
+    o sin CustomerNo y castea CustomerNo a int
+
+    Args:
+        df (pd.DataFrame): Dataframe o chunk a transformar
+
+    Returns:
+        pd.DataFrame: Dataframe transformado
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise ValueError('El input no es un dataframe')
+
+    columnas_necesarias = ['TransactionNo', 'CustomerNo']
+    for col in columnas_necesarias:
+        if col not in df.columns:
+            raise ValueError(f'La columna {col} no está en el dataframe')
+
+    # Un solo filtro por ambas columnas, asi hacemos una sola copia en lugar de dos
+    df = df.dropna(subset=columnas_necesarias)
+    df = df.astype({'CustomerNo': 'int'}, copy=False)
+
+    return df
+
+
+class ChunksCSV:
+    """
+    Iterable sobre un archivo csv leido en chunks de tamaño acotado.
+    Se puede recorrer mas de una vez, cada recorrido vuelve a leer el archivo desde el principio,
+    por lo que nunca hay mas de un chunk en memoria.
+    """
+    def __init__(self, path: str, chunksize: int = CHUNKSIZE_DEFAULT):
+        if chunksize <= 0:
+            raise ValueError('El chunksize tiene que ser mayor a 0')
+        self.path = path
+        self.chunksize = chunksize
+
+    def __iter__(self):
+        with pd.read_csv(self.path, dtype=DTYPES_CSV, chunksize=self.chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+class ChunksTransformados:
+    """
+    Iterable que aplica una funcion a cada chunk de otro iterable a medida que se recorre.
+    Los chunks que quedan vacios despues de la funcion se descartan.
+    """
+    def __init__(self, chunks, funcion=transformar):
+        self.chunks = chunks
+        self.funcion = funcion
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            chunk = self.funcion(chunk)
+            if len(chunk) > 0:
+                yield chunk
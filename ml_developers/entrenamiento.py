@@ -0,0 +1,225 @@
+"""
+Entrenamiento del modelo de abandono por script: arma (o lee de la cache) la matriz de features de silver,
+busca los hiperparametros del RandomForest en paralelo y guarda el mejor modelo, su vocabulario y sus metricas.
+
+Uso (desde la raiz del repo):
+    python -m ml_developers.entrenamiento
+    python -m ml_developers.entrenamiento --busqueda grid --cv 2
+
+La matriz de features se guarda en data/silver/_cache con el hash del contenido de silver en el nombre: mientras
+silver no cambie, los siguientes entrenamientos no vuelven a calcularla.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import scipy.sparse as sp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (habilita HalvingGridSearchCV)
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support, roc_auc_score
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, ParameterGrid, train_test_split
+from data_engineer.silver import hash_silver
+from ml_developers.features import COLUMNAS_LINEAS, Vocabulario, construir_matriz, etiquetas
+from ml_developers.modelo import guardar_modelo, leer_lineas
+
+
+PATH_CANCELADAS = 'data/silver/transacciones_canceladas.parquet'
+PATH_CONCRETADAS = 'data/silver/transacciones_concretadas.parquet'
+PATH_CACHE = 'data/silver/_cache'
+PATH_MODELOS = 'ml_developers/modelos'
+ARCHIVO_FEATURES = 'features-abandono-{version}'
+
+# La misma grilla que Model_Final.ipynb
+PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 10, 20],
+    'min_samples_split': [2, 5, 10]
+}
+BUSQUEDAS = ['halving', 'grid']
+CV_DEFAULT = 3
+# Con halving cada ronda se queda con 1/FACTOR de los candidatos y les da FACTOR veces mas transacciones
+FACTOR_HALVING = 3
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+
+def guardar_features(transacciones: np.ndarray, X: sp.csr_matrix, vocabulario: Vocabulario, path: str):
+    """
+    Guarda la matriz de features (npz, sin comprimir) y su vocabulario (json) con el mismo nombre base.
+    Se escriben a archivos temporales y se renombran.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    vocabulario.guardar(path + '.json')
+    # np.savez agrega la extension .npz si no la tiene, por eso el temporal termina en .npz
+    path_tmp = path + '.tmp.npz'
+    np.savez(path_tmp, data=X.data, indices=X.indices, indptr=X.indptr, shape=np.array(X.shape), transacciones=transacciones.astype(str))
+    os.replace(path_tmp, path + '.npz')
+
+
+def leer_features(path: str) -> tuple:
+    """
+    Lee una matriz de features guardada con guardar_features.
+
+    Returns:
+        tuple: (np.ndarray con los TransactionNo de cada fila, sp.csr_matrix, Vocabulario)
+    """
+    with np.load(path + '.npz') as archivo:
+        X = sp.csr_matrix((archivo['data'], archivo['indices'], archivo['indptr']), shape=tuple(archivo['shape']))
+        transacciones = archivo['transacciones'].astype(object)
+    return transacciones, X, Vocabulario.cargar(path + '.json')
+
+
+def cargar_features(path_canceladas: str, path_concretadas: str, directorio_cache: str | None = PATH_CACHE) -> tuple:
+    """
+    Devuelve la matriz de features de todas las transacciones de silver. Si ya esta en la cache para el contenido
+    actual de silver (hash_silver) se lee de disco, si no se calcula (vocabulario nuevo con los valores de silver)
+    y se guarda, borrando las de versiones anteriores.
+
+    Args:
+        path_canceladas (str): path del dataset de transacciones canceladas
+        path_concretadas (str): path del dataset de transacciones concretadas
+        directorio_cache (str | None, optional): directorio de la cache, None para no usarla. Defaults to PATH_CACHE.
+
+    Returns:
+        tuple: (TransactionNo de cada fila, sp.csr_matrix, Vocabulario, hash de silver, bool: si se leyo de la cache)
+    """
+    version = hash_silver(path_canceladas, path_concretadas)
+    if directorio_cache is not None:
+        try:
+            os.makedirs(directorio_cache, exist_ok=True)
+        except OSError:
+            directorio_cache = tempfile.gettempdir()
+        path = os.path.join(directorio_cache, ARCHIVO_FEATURES.format(version=version))
+        if os.path.exists(path + '.npz') and os.path.exists(path + '.json'):
+            return *leer_features(path), version, True
+
+    lineas = leer_lineas(path_canceladas, path_concretadas)
+    vocabulario = Vocabulario.desde_lineas(lineas)
+    transacciones, X = construir_matriz(lineas[COLUMNAS_LINEAS], vocabulario)
+
+    if directorio_cache is not None:
+        guardar_features(transacciones, X, vocabulario, path)
+        # Borramos las matrices de versiones anteriores
+        for archivo in os.listdir(directorio_cache):
+            if archivo.startswith('features-abandono-') and not archivo.startswith(os.path.basename(path)):
+                os.remove(os.path.join(directorio_cache, archivo))
+    return transacciones, X, vocabulario, version, False
+
+
+def buscar_hiperparametros(X, y, param_grid: dict = PARAM_GRID, busqueda: str = 'halving', cv: int = CV_DEFAULT,
+                           n_jobs: int = -1, random_state: int = RANDOM_STATE, verbose: int = 0):
+    """
+    Busca los hiperparametros del RandomForest con validacion cruzada, repartiendo los fits entre todos los cores.
+
+    Con 'halving' (successive halving) todos los candidatos empiezan con pocas transacciones y en cada ronda solo
+    sigue el mejor tercio, con el triple de transacciones: los candidatos malos se descartan temprano. Con 'grid'
+    se evalua la grilla completa con todas las transacciones, como en el notebook.
+
+    Args:
+        X: Matriz de features de entrenamiento
+        y: Variable objetivo
+        param_grid (dict, optional): Grilla de hiperparametros. Defaults to PARAM_GRID.
+        busqueda (str, optional): 'halving' o 'grid'. Defaults to 'halving'.
+        cv (int, optional): Cantidad de folds. Defaults to CV_DEFAULT.
+        n_jobs (int, optional): Fits en paralelo, -1 usa todos los cores. Defaults to -1.
+        random_state (int, optional): Semilla. Defaults to RANDOM_STATE.
+        verbose (int, optional): Verbosidad de sklearn. Defaults to 0.
+
+    Returns:
+        HalvingGridSearchCV | GridSearchCV: La busqueda ya ajustada, best_estimator_ esta reentrenado con todo X
+    """
+    if busqueda not in BUSQUEDAS:
+        raise ValueError(f'Busqueda desconocida: {busqueda}')
+
+    # Cada arbol en un solo thread: el paralelismo esta en los fits de la busqueda
+    modelo = RandomForestClassifier(random_state=random_state, n_jobs=1)
+    if busqueda == 'halving':
+        search = HalvingGridSearchCV(modelo, param_grid, cv=cv, factor=FACTOR_HALVING, n_jobs=n_jobs,
+                                     random_state=random_state, verbose=verbose)
+    else:
+        search = GridSearchCV(modelo, param_grid, cv=cv, n_jobs=n_jobs, verbose=verbose)
+    search.fit(X, y)
+    return search
+
+
+def evaluar(modelo, X, y) -> dict:
+    """
+    Metricas del modelo sobre el conjunto de test (la clase positiva es 1, Abandonado).
+    """
+    y_pred = modelo.predict(X)
+    probabilidades = modelo.predict_proba(X)[:, list(modelo.classes_).index(1)]
+    precision, recall, f1, _ = precision_recall_fscore_support(y, y_pred, average='binary', zero_division=0)
+    return {
+        'accuracy': float(accuracy_score(y, y_pred)),
+        'precision': float(precision),
+        'recall': float(recall),
+        'f1': float(f1),
+        'roc_auc': float(roc_auc_score(y, probabilidades)) if len(np.unique(y)) > 1 else None,
+        'matriz_confusion': confusion_matrix(y, y_pred, labels=[0, 1]).tolist()
+    }
+
+
+def entrenar(path_canceladas: str = PATH_CANCELADAS, path_concretadas: str = PATH_CONCRETADAS, path_modelos: str = PATH_MODELOS,
+             directorio_cache: str | None = PATH_CACHE, busqueda: str = 'halving', cv: int = CV_DEFAULT, n_jobs: int = -1,
+             verbose: int = 0) -> dict:
+    """
+    Entrena el modelo de abandono de punta a punta y lo guarda en path_modelos (modelo, vocabulario y metricas).
+
+    Returns:
+        dict: Metricas del entrenamiento (las mismas que se guardan en el json)
+    """
+    inicio = time.perf_counter()
+    transacciones, X, vocabulario, version, desde_cache = cargar_features(path_canceladas, path_concretadas, directorio_cache)
+    segundos_features = time.perf_counter() - inicio
+    y = etiquetas(transacciones)
+
+    # El mismo split que el notebook
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+
+    inicio = time.perf_counter()
+    search = buscar_hiperparametros(X_train, y_train, busqueda=busqueda, cv=cv, n_jobs=n_jobs, verbose=verbose)
+    segundos_busqueda = time.perf_counter() - inicio
+
+    metricas = {
+        'hash_silver': version,
+        'transacciones': int(X.shape[0]),
+        'features': int(X.shape[1]),
+        'busqueda': busqueda,
+        'cv': cv,
+        'candidatos': len(ParameterGrid(PARAM_GRID)),
+        # Con halving cv_results_ tiene una fila por candidato y ronda
+        'fits': len(search.cv_results_['params']) * cv,
+        'mejores_parametros': search.best_params_,
+        'score_cv': float(search.best_score_),
+        'test': evaluar(search.best_estimator_, X_test, y_test),
+        'features_desde_cache': desde_cache,
+        'segundos_features': segundos_features,
+        'segundos_busqueda': segundos_busqueda
+    }
+    guardar_modelo(search.best_estimator_, vocabulario, path_modelos, metricas)
+    return metricas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Entrena el modelo de abandono con busqueda de hiperparametros en paralelo')
+    parser.add_argument('--busqueda', choices=BUSQUEDAS, default='halving', help='Successive halving o grilla completa')
+    parser.add_argument('--cv', type=int, default=CV_DEFAULT, help='Cantidad de folds de la validacion cruzada')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Fits en paralelo, -1 usa todos los cores')
+    parser.add_argument('--modelos', default=PATH_MODELOS, help='Directorio donde se guarda el modelo')
+    parser.add_argument('--sin-cache', action='store_true', help='Recalcula la matriz de features sin usar ni guardar la cache')
+    parser.add_argument('--verbose', type=int, default=0, help='Verbosidad de la busqueda de sklearn')
+    args = parser.parse_args()
+
+    metricas = entrenar(path_modelos=args.modelos, directorio_cache=None if args.sin_cache else PATH_CACHE,
+                        busqueda=args.busqueda, cv=args.cv, n_jobs=args.n_jobs, verbose=args.verbose)
+    print(json.dumps(metricas, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+ARCHIVO_VOCABULARIO = 'vocabulario_abandono.json'
+
+# Features del modelo de abandono: agregados numericos por TransactionNo, mas la cantidad de lineas
+# de cada ProductNo, ProductName y Country (los dummies de Model_Final.ipynb sumados por transaccion)
+COLUMNAS_NUMERICAS = ['total_quantity', 'unique_products', 'total_price', 'average_price']
+COLUMNAS_DUMMIES = ['ProductNo', 'ProductName', 'Country']
+COLUMNAS_LINEAS = ['TransactionNo'] + COLUMNAS_DUMMIES + ['Price', 'Quantity']
+TABLA_FEATURES = 'features_por_transaccion.parquet'
+
+
+def agregar(codigos: np.ndarray, codigos_producto: np.ndarray, price: np.ndarray, quantity: np.ndarray, cantidad: int) -> dict:
+    """
+    Calcula los agregados numericos por transaccion en una sola pasada ordenada: las lineas se ordenan por
+    (transaccion, producto) y cada agregado es un np.add.reduceat sobre los inicios de cada transaccion.
+    unique_products cuenta los cambios de producto dentro de cada transaccion, sin el groupby + nunique de pandas.
+
+    Args:
+        codigos (np.ndarray): Codigo de transaccion de cada linea, de 0 a cantidad - 1 (como los de pd.factorize)
+        codigos_producto (np.ndarray): Codigo del ProductNo de cada linea (-1 si es nulo, no cuenta como producto)
+        price (np.ndarray): Price de cada linea
+        quantity (np.ndarray): Quantity de cada linea (las canceladas son negativas, se suma el valor absoluto)
+        cantidad (int): Cantidad de transacciones
+
+    Returns:
+        dict: Columna de COLUMNAS_NUMERICAS -> np.ndarray con un valor por transaccion (en el orden de los codigos)
+    """
+    if len(codigos) == 0:
+        return {columna: np.zeros(cantidad) for columna in COLUMNAS_NUMERICAS}
+
+    # Una sola clave int64 (transaccion, producto): ordenarla es mucho mas rapido que np.lexsort con dos claves
+    productos_distintos = int(codigos_producto.max()) + 2
+    orden = np.argsort(codigos.astype(np.int64) * productos_distintos + (codigos_producto + 1))
+    transacciones = codigos[orden]
+    productos = codigos_producto[orden]
+    cambia_transaccion = np.empty(len(orden), dtype=bool)
+    cambia_transaccion[0] = True
+    np.not_equal(transacciones[1:], transacciones[:-1], out=cambia_transaccion[1:])
+    inicios = np.flatnonzero(cambia_transaccion)
+
+    producto_nuevo = cambia_transaccion.copy()
+    producto_nuevo[1:] |= productos[1:] != productos[:-1]
+    producto_nuevo &= productos >= 0
+
+    lineas = np.diff(np.append(inicios, len(orden)))
+    total_price = np.add.reduceat(price[orden].astype(np.float64), inicios)
+    agregados = {
+        'total_quantity': np.add.reduceat(np.abs(quantity[orden].astype(np.float64)), inicios),
+        'unique_products': np.add.reduceat(producto_nuevo.astype(np.int64), inicios),
+        'total_price': total_price,
+        'average_price': total_price / lineas
+    }
+    if len(inicios) == cantidad:
+        return agregados
+
+    # Hay codigos sin lineas: quedan en 0
+    presentes = transacciones[inicios]
+    completos = {}
+    for columna, valores in agregados.items():
+        completos[columna] = np.zeros(cantidad, dtype=valores.dtype)
+        completos[columna][presentes] = valores
+    return completos
+
+
+def agregados_por_transaccion(lineas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Agregados numericos de cada transaccion (total_quantity, unique_products, total_price, average_price) y la
+    variable objetivo Abandonado, ordenados por TransactionNo. Reemplaza al groupby(...).agg del notebook.
+
+    Args:
+        lineas (pd.DataFrame): Lineas de transacciones canceladas y concretadas (al menos TransactionNo, ProductNo, Price y Quantity)
+
+    Returns:
+        pd.DataFrame: Una fila por TransactionNo
+    """
+    codigos, transacciones = pd.factorize(lineas['TransactionNo'], sort=True)
+    codigos_producto, _ = pd.factorize(lineas['ProductNo'])
+    agregados = agregar(codigos, codigos_producto, lineas['Price'].to_numpy(dtype=np.float64),
+                        lineas['Quantity'].to_numpy(dtype=np.float64), len(transacciones))
+    df = pd.DataFrame({'TransactionNo': np.asarray(transacciones, dtype=object), **agregados})
+    df['Abandonado'] = etiquetas(df['TransactionNo'].to_numpy())
+    return df
+
+
+class Vocabulario:
+    """
+    Columnas de la matriz de features: primero las numericas y despues un bloque por cada columna de dummies,
+    con sus valores en un orden fijo. Se guarda como json junto al modelo, asi el entrenamiento, el ETL y el dashboard
+    arman exactamente las mismas columnas. Los valores que no estan en el vocabulario se ignoran.
+
+    Los nombres de las columnas son los mismos que los de pd.get_dummies en el notebook ('ProductNo_85123A', 'Country_France', ...).
+    """
+    def __init__(self, dummies: dict, numericas: list = COLUMNAS_NUMERICAS):
+        self.numericas = list(numericas)
+        self.dummies = {columna: list(valores) for columna, valores in dummies.items()}
+
+        # Offset de la primera columna de cada bloque de dummies
+        self.offsets = {}
+        offset = len(self.numericas)
+        for columna, valores in self.dummies.items():
+            self.offsets[columna] = offset
+            offset += len(valores)
+        self.cantidad = offset
+        self.__indices = {columna: pd.Index(valores) for columna, valores in self.dummies.items()}
+        # Para armar de a una fila (vector) sin pandas: diccionarios valor -> columna
+        self.__columnas = {
+            columna: {valor: self.offsets[columna] + i for i, valor in enumerate(valores)}
+            for columna, valores in self.dummies.items()
+        }
+        self.__posiciones_numericas = {nombre: i for i, nombre in enumerate(self.numericas)}
+
+    @classmethod
+    def desde_lineas(cls, lineas: pd.DataFrame, drop_first: bool = True) -> 'Vocabulario':
+        """
+        Arma el vocabulario con los valores (ordenados) de las lineas de entrenamiento.
+        Con drop_first se descarta el primer valor de cada columna, como pd.get_dummies(..., drop_first=True).
+        """
+        dummies = {}
+        for columna in COLUMNAS_DUMMIES:
+            valores = sorted(pd.unique(lineas[columna].dropna().astype(str)))
+            dummies[columna] = valores[1:] if drop_first else valores
+        return cls(dummies)
+
+    @classmethod
+    def cargar(cls, path: str) -> 'Vocabulario':
+        with open(path, 'r', encoding='utf-8') as archivo:
+            datos = json.load(archivo)
+        return cls(datos['dummies'], datos['numericas'])
+
+    def guardar(self, path: str):
+        """
+        Guarda el vocabulario como json. Se escribe a un archivo temporal y se renombra.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        path_tmp = path + '.tmp'
+        with open(path_tmp, 'w', encoding='utf-8') as archivo:
+            json.dump({'numericas': self.numericas, 'dummies': self.dummies}, archivo, ensure_ascii=False)
+        os.replace(path_tmp, path)
+
+    @property
+    def nombres(self) -> list:
+        return self.numericas + [f'{columna}_{valor}' for columna, valores in self.dummies.items() for valor in valores]
+
+    def columnas(self, columna: str, valores) -> np.ndarray:
+        """
+        Indice de columna en la matriz de cada valor de una columna de dummies (-1 si no esta en el vocabulario).
+        """
+        indices = self.__indices[columna].get_indexer(pd.Index(valores).astype(str))
+        return np.where(indices >= 0, indices + self.offsets[columna], -1)
+
+    def vector(self, lineas: list) -> sp.csr_matrix:
+        """
+        Fila de features de una sola transaccion (un carrito), con las mismas columnas que construir_matriz.
+        Se arma directo como una fila dispersa con los diccionarios valor -> columna, sin pandas ni la fila densa.
+
+        Args:
+            lineas (list): Lineas de la transaccion, dicts con ProductNo, ProductName, Country, Price y Quantity
+
+        Returns:
+            sp.csr_matrix: Matriz float32 de 1 x cantidad
+        """
+        # Los mismos agregados que construir_matriz, con todas las lineas en la transaccion 0
+        productos = {}
+        codigos_producto = np.array([
+            productos.setdefault(linea['ProductNo'], len(productos)) if linea.get('ProductNo') is not None else -1 for linea in lineas
+        ], dtype=np.int64)
+        numericas = agregar(
+            np.zeros(len(lineas), dtype=np.int64), codigos_producto,
+            np.array([linea['Price'] for linea in lineas], dtype=np.float64),
+            np.array([linea['Quantity'] for linea in lineas], dtype=np.float64), 1
+        )
+        valores = {self.__posiciones_numericas[nombre]: valor[0] for nombre, valor in numericas.items() if valor[0] != 0}
+
+        # Cada linea suma 1 en la columna de su producto y su pais, los valores fuera del vocabulario se ignoran
+        for linea in lineas:
+            for columna in COLUMNAS_DUMMIES:
+                indice = self.__columnas[columna].get(str(linea.get(columna)))
+                if indice is not None:
+                    valores[indice] = valores.get(indice, 0) + 1
+
+        indices = sorted(valores)
+        return sp.csr_matrix(
+            (np.array([valores[i] for i in indices], dtype=np.float32), np.array(indices, dtype=np.int32), np.array([0, len(indices)], dtype=np.int32)),
+            shape=(1, self.cantidad)
+        )
+
+
+def construir_matriz(lineas: pd.DataFrame, vocabulario: Vocabulario) -> tuple:
+    """
+    Construye la matriz de features por TransactionNo como una matriz dispersa CSR: cada transaccion es una fila,
+    con las features numericas y la cantidad de lineas de cada producto / pais. Nunca se arma la matriz densa.
+
+    Args:
+        lineas (pd.DataFrame): Lineas de transacciones (columnas COLUMNAS_LINEAS), con transacciones completas
+        vocabulario (Vocabulario): Columnas de la matriz
+
+    Returns:
+        tuple: (np.ndarray con los TransactionNo de cada fila, sp.csr_matrix float32 de transacciones x vocabulario.cantidad)
+    """
+    # Las filas quedan ordenadas por TransactionNo, como con un groupby
+    codigos, transacciones = pd.factorize(lineas['TransactionNo'], sort=True)
+    cantidad = len(transacciones)
+
+    codigos_producto, _ = pd.factorize(lineas['ProductNo'])
+    numericas = agregar(codigos, codigos_producto, lineas['Price'].to_numpy(dtype=np.float64),
+                        lineas['Quantity'].to_numpy(dtype=np.float64), cantidad)
+
+    filas = [np.repeat(np.arange(cantidad), len(vocabulario.numericas))]
+    columnas = [np.tile(np.arange(len(vocabulario.numericas)), cantidad)]
+    valores = [np.column_stack([numericas[nombre] for nombre in vocabulario.numericas]).ravel() if cantidad else np.empty(0)]
+
+    # Cada linea suma 1 en la columna de su valor, los duplicados se suman al convertir a CSR
+    for columna in COLUMNAS_DUMMIES:
+        codigos_valor, valores_columna = pd.factorize(lineas[columna])
+        # Los nulos (codigo -1) tampoco suman
+        indices = np.append(vocabulario.columnas(columna, valores_columna), -1)[codigos_valor]
+        validas = indices >= 0
+        filas.append(codigos[validas])
+        columnas.append(indices[validas])
+        valores.append(np.ones(np.count_nonzero(validas)))
+
+    matriz = sp.coo_matrix(
+        (np.concatenate(valores).astype(np.float32), (np.concatenate(filas), np.concatenate(columnas))),
+        shape=(cantidad, vocabulario.cantidad)
+    ).tocsr()
+    matriz.eliminate_zeros()
+    return np.asarray(transacciones), matriz
+
+
+def etiquetas(transacciones: np.ndarray) -> np.ndarray:
+    """
+    Variable objetivo del modelo: 1 si la transaccion fue cancelada (abandonada), 0 si se concreto.
+    """
+    return pd.Series(transacciones).str.startswith('C').to_numpy(dtype=np.int8)
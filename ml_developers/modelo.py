@@ -0,0 +1,127 @@
+import json
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from data_engineer.silver import concatenar_silver, leer_silver
+from ml_developers.features import ARCHIVO_VOCABULARIO, COLUMNAS_LINEAS, Vocabulario, construir_matriz
+
+
+ARCHIVO_MODELO = 'modelo_abandono.joblib'
+ARCHIVO_METRICAS = 'metricas_abandono.json'
+TABLA_PROBABILIDADES = 'probabilidad_abandono.parquet'
+
+TRANSACCIONES_POR_CHUNK_DEFAULT = 2_000
+
+
+def guardar_modelo(modelo, vocabulario: Vocabulario, directorio: str, metricas: dict | None = None):
+    """
+    Serializa el modelo con joblib, y su vocabulario de features (y sus metricas, si se pasan) como json, en el mismo directorio.
+    Se escriben a archivos temporales y se renombran, asi el dashboard o el ETL nunca cargan un modelo a medio escribir.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    vocabulario.guardar(os.path.join(directorio, ARCHIVO_VOCABULARIO))
+    if metricas is not None:
+        path_metricas = os.path.join(directorio, ARCHIVO_METRICAS)
+        with open(path_metricas + '.tmp', 'w', encoding='utf-8') as archivo:
+            json.dump(metricas, archivo, indent=2, ensure_ascii=False)
+        os.replace(path_metricas + '.tmp', path_metricas)
+    path = os.path.join(directorio, ARCHIVO_MODELO)
+    joblib.dump(modelo, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def cargar_modelo(directorio: str) -> tuple:
+    """
+    Carga un modelo guardado con guardar_modelo.
+
+    Returns:
+        tuple: (modelo, Vocabulario con las columnas con las que se entreno)
+    """
+    path = os.path.join(directorio, ARCHIVO_MODELO)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No existe el modelo {path}')
+    vocabulario = Vocabulario.cargar(os.path.join(directorio, ARCHIVO_VOCABULARIO))
+    modelo = joblib.load(path)
+    if modelo.n_features_in_ != vocabulario.cantidad:
+        raise ValueError(f'El modelo espera {modelo.n_features_in_} features y el vocabulario tiene {vocabulario.cantidad}')
+    return modelo, vocabulario
+
+
+def leer_lineas(path_canceladas: str, path_concretadas: str) -> pd.DataFrame:
+    """
+    Lee de silver solo las columnas que usan las features del modelo, de las transacciones canceladas y concretadas.
+    """
+    return concatenar_silver([
+        leer_silver(path_canceladas, columnas=COLUMNAS_LINEAS),
+        leer_silver(path_concretadas, columnas=COLUMNAS_LINEAS)
+    ])
+
+
+class ChunksTransacciones:
+    """
+    Divide las lineas en chunks de transacciones completas (todas las lineas de una transaccion quedan en el mismo chunk).
+    Es re-iterable.
+    """
+    def __init__(self, lineas: pd.DataFrame, transacciones_por_chunk: int = TRANSACCIONES_POR_CHUNK_DEFAULT):
+        if transacciones_por_chunk <= 0:
+            raise ValueError('transacciones_por_chunk tiene que ser mayor a 0')
+        codigos, _ = pd.factorize(lineas['TransactionNo'])
+        self.lineas = lineas
+        self.orden = np.argsort(codigos, kind='stable')
+        # Los limites de los chunks en las lineas ordenadas por transaccion
+        inicios = np.concatenate([[0], np.cumsum(np.bincount(codigos))])
+        self.limites = inicios[::transacciones_por_chunk].tolist()
+        if self.limites[-1] != inicios[-1]:
+            self.limites.append(int(inicios[-1]))
+
+    def __len__(self):
+        return len(self.limites) - 1
+
+    def __iter__(self):
+        for inicio, fin in zip(self.limites[:-1], self.limites[1:]):
+            yield self.lineas.iloc[self.orden[inicio:fin]]
+
+
+def _puntuar_chunk(modelo, vocabulario: Vocabulario, lineas: pd.DataFrame) -> pd.DataFrame:
+    transacciones, X = construir_matriz(lineas, vocabulario)
+    probabilidades = modelo.predict_proba(X)
+    # La clase 1 es Abandonado
+    columna = list(modelo.classes_).index(1)
+    return pd.DataFrame({'TransactionNo': transacciones, 'ProbabilidadAbandono': probabilidades[:, columna].astype(np.float32)})
+
+
+def puntuar_transacciones(modelo, vocabulario: Vocabulario, lineas: pd.DataFrame, transacciones_por_chunk: int = TRANSACCIONES_POR_CHUNK_DEFAULT,
+                          n_jobs: int = -1) -> tuple:
+    """
+    Calcula la probabilidad de abandono de cada transaccion. Las lineas se procesan en chunks de transacciones
+    completas (cada chunk es una matriz dispersa de features), y los chunks se reparten entre todos los cores (con threads: la prediccion de los arboles no usa el GIL,
+    y el modelo se comparte sin copiarlo).
+
+    Args:
+        modelo: Modelo cargado con cargar_modelo
+        vocabulario (Vocabulario): Vocabulario de features del modelo
+        lineas (pd.DataFrame): Lineas de transacciones (columnas COLUMNAS_LINEAS)
+        transacciones_por_chunk (int, optional): Transacciones por chunk. Defaults to TRANSACCIONES_POR_CHUNK_DEFAULT.
+        n_jobs (int, optional): Cantidad de threads, -1 usa todos los cores. Defaults to -1.
+
+    Returns:
+        tuple: (pd.DataFrame con TransactionNo y ProbabilidadAbandono, dict con metricas de rendimiento)
+    """
+    inicio = time.perf_counter()
+    chunks = ChunksTransacciones(lineas, transacciones_por_chunk)
+    resultados = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(_puntuar_chunk)(modelo, vocabulario, chunk) for chunk in chunks)
+    probabilidades = pd.concat(resultados, ignore_index=True) if resultados else pd.DataFrame(columns=['TransactionNo', 'ProbabilidadAbandono'])
+    segundos = time.perf_counter() - inicio
+
+    metricas = {
+        'transacciones': len(probabilidades),
+        'lineas': len(lineas),
+        'chunks': len(chunks),
+        'segundos': segundos,
+        'transacciones_por_segundo': len(probabilidades) / segundos if segundos > 0 else float('inf'),
+        'lineas_por_segundo': len(lineas) / segundos if segundos > 0 else float('inf')
+    }
+    return probabilidades, metricas
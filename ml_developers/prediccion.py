@@ -0,0 +1,72 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier
+from ml_developers.features import Vocabulario
+
+
+# Con la probabilidad de abandono por encima de esto el carrito se predice como abandonado (lo mismo que modelo.predict)
+UMBRAL_ABANDONO = 0.5
+
+
+class PredictorCarrito:
+    """
+    Predice la probabilidad de abandono de un carrito (una transaccion) con el modelo entrenado.
+
+    Esta pensado para predecir de a un carrito con poca latencia: el vector de features se arma directo como una fila
+    dispersa con Vocabulario.vector (sin pandas ni la fila densa de miles de dummies), y los arboles del
+    RandomForest se recorren en el mismo thread, sin la validacion ni el Parallel de predict_proba en cada llamada.
+    """
+    def __init__(self, modelo, vocabulario: Vocabulario):
+        if modelo.n_features_in_ != vocabulario.cantidad:
+            raise ValueError(f'El modelo espera {modelo.n_features_in_} features y el vocabulario tiene {vocabulario.cantidad}')
+        self.modelo = modelo
+        self.vocabulario = vocabulario
+        self.__clase = list(modelo.classes_).index(1)
+        self.__arboles = modelo.estimators_ if isinstance(modelo, RandomForestClassifier) else None
+
+    def vector(self, lineas: list) -> sp.csr_matrix:
+        """
+        Fila de features del carrito, con las mismas columnas que construir_matriz (ver Vocabulario.vector).
+
+        Args:
+            lineas (list): Lineas del carrito, dicts con ProductNo, ProductName, Country, Price y Quantity
+
+        Returns:
+            sp.csr_matrix: Matriz float32 de 1 x vocabulario.cantidad
+        """
+        return self.vocabulario.vector(lineas)
+
+    def predecir(self, lineas: list) -> float:
+        """
+        Probabilidad de que el carrito sea abandonado.
+
+        Args:
+            lineas (list): Lineas del carrito, dicts con ProductNo, ProductName, Country, Price y Quantity
+
+        Returns:
+            float: Probabilidad de abandono, entre 0 y 1
+        """
+        X = self.vector(lineas)
+        if self.__arboles is None:
+            return float(self.modelo.predict_proba(X)[0, self.__clase])
+
+        # Lo mismo que RandomForestClassifier.predict_proba: el promedio de las probabilidades de cada arbol
+        total = 0.0
+        for arbol in self.__arboles:
+            total += arbol.predict_proba(X, check_input=False)[0, self.__clase]
+        return float(total / len(self.__arboles))
+
+    def predecir_lote(self, carritos: list) -> np.ndarray:
+        """
+        Probabilidad de abandono de varios carritos con una sola llamada a predict_proba.
+
+        Args:
+            carritos (list): Lista de carritos, cada uno una lista de lineas como en predecir
+
+        Returns:
+            np.ndarray: Probabilidad de abandono de cada carrito
+        """
+        if len(carritos) == 1:
+            return np.array([self.predecir(carritos[0])])
+        X = sp.vstack([self.vector(lineas) for lineas in carritos], format='csr')
+        return self.modelo.predict_proba(X)[:, self.__clase]
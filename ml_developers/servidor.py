@@ -0,0 +1,297 @@
+"""
+Servidor de inferencia del modelo de abandono: un servidor HTTP chico sobre asyncio que junta los pedidos
+concurrentes en micro-lotes (hasta --max-lote carritos o --max-espera-ms) y los puntua con una sola llamada a predict_proba.
+
+Uso (desde la raiz del repo):
+    python -m ml_developers.servidor --puerto 8502
+
+Endpoints:
+    POST /predecir   {"lineas": [{"ProductNo": ..., "ProductName": ..., "Country": ..., "Price": ..., "Quantity": ...}]}
+                     -> {"probabilidad": 0.42}
+    GET  /metricas   -> pedidos, lotes, profundidad de la cola e histogramas de tamaños de lote y de la cola
+
+El dashboard lo usa como backend si se define la variable de entorno PREDICTOR_URL (por ejemplo http://127.0.0.1:8502).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from ml_developers.modelo import cargar_modelo
+from ml_developers.prediccion import PredictorCarrito
+
+
+PATH_MODELOS = 'ml_developers/modelos'
+HOST_DEFAULT = '127.0.0.1'
+PUERTO_DEFAULT = 8502
+MAX_LOTE_DEFAULT = 64
+MAX_ESPERA_MS_DEFAULT = 2
+# Cantidad de latencias recientes con las que se calculan los percentiles de /metricas
+LATENCIAS_GUARDADAS = 10_000
+MAX_BYTES_PEDIDO = 1024 * 1024
+
+
+def _buckets(maximo: int) -> list:
+    """
+    Limites de los histogramas: potencias de 2 hasta cubrir maximo.
+    """
+    buckets = [1]
+    while buckets[-1] < maximo:
+        buckets.append(buckets[-1] * 2)
+    return buckets
+
+
+class Histograma:
+    """
+    Histograma acumulado con buckets fijos: cuenta las observaciones <= cada limite (como los de Prometheus).
+    """
+    def __init__(self, buckets: list):
+        self.buckets = list(buckets)
+        self.cuentas = [0] * len(self.buckets)
+        self.total = 0
+        self.suma = 0
+
+    def observar(self, valor: int):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.cuentas[i] += 1
+        self.total += 1
+        self.suma += valor
+
+    def a_dict(self) -> dict:
+        return {
+            'buckets': {str(limite): cuenta for limite, cuenta in zip(self.buckets, self.cuentas)},
+            'total': self.total,
+            'promedio': self.suma / self.total if self.total else 0
+        }
+
+
+class MicroLotes:
+    """
+    Junta los pedidos de prediccion en micro-lotes. Un solo consumidor toma el primer pedido de la cola y espera
+    hasta max_espera segundos (o hasta juntar max_lote) por mas pedidos; el lote se puntua en un thread, y mientras
+    tanto la cola se sigue llenando con el siguiente lote.
+    """
+    def __init__(self, predictor: PredictorCarrito, max_lote: int = MAX_LOTE_DEFAULT, max_espera: float = MAX_ESPERA_MS_DEFAULT / 1000):
+        if max_lote <= 0:
+            raise ValueError('max_lote tiene que ser mayor a 0')
+        self.predictor = predictor
+        self.max_lote = max_lote
+        self.max_espera = max_espera
+        self.cola = asyncio.Queue()
+        self.pedidos = 0
+        self.lotes = 0
+        self.cola_maxima = 0
+        self.tamanios_lote = Histograma(_buckets(max_lote))
+        self.profundidad_cola = Histograma(_buckets(max_lote * 16))
+        self.latencias = deque(maxlen=LATENCIAS_GUARDADAS)
+
+    async def predecir(self, lineas: list) -> float:
+        """
+        Encola un carrito y espera su probabilidad de abandono.
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        inicio = time.perf_counter()
+        await self.cola.put((lineas, futuro))
+        self.cola_maxima = max(self.cola_maxima, self.cola.qsize())
+        probabilidad = await futuro
+        self.latencias.append(time.perf_counter() - inicio)
+        return probabilidad
+
+    async def __juntar_lote(self) -> list:
+        lote = [await self.cola.get()]
+        # La profundidad de la cola cuando arranca cada lote (incluye el primer pedido)
+        self.profundidad_cola.observar(self.cola.qsize() + 1)
+        limite = time.perf_counter() + self.max_espera
+        while len(lote) < self.max_lote:
+            if not self.cola.empty():
+                lote.append(self.cola.get_nowait())
+                continue
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self.cola.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def correr(self):
+        """
+        Loop del consumidor, corre hasta que se cancela.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = await self.__juntar_lote()
+            self.lotes += 1
+            self.pedidos += len(lote)
+            self.tamanios_lote.observar(len(lote))
+            try:
+                # predict_proba corre en un thread para no bloquear el loop mientras llegan mas pedidos
+                probabilidades = await loop.run_in_executor(None, self.predictor.predecir_lote, [lineas for lineas, _ in lote])
+            except Exception as error:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(error)
+                continue
+            for (_, futuro), probabilidad in zip(lote, probabilidades):
+                if not futuro.done():
+                    futuro.set_result(float(probabilidad))
+
+    def metricas(self) -> dict:
+        latencias = np.array(self.latencias) * 1000
+        return {
+            'pedidos': self.pedidos,
+            'lotes': self.lotes,
+            'cola_actual': self.cola.qsize(),
+            'cola_maxima': self.cola_maxima,
+            'max_lote': self.max_lote,
+            'max_espera_ms': self.max_espera * 1000,
+            'tamanio_lote': self.tamanios_lote.a_dict(),
+            'profundidad_cola': self.profundidad_cola.a_dict(),
+            'latencia_ms': {
+                'p50': float(np.percentile(latencias, 50)) if len(latencias) else None,
+                'p99': float(np.percentile(latencias, 99)) if len(latencias) else None
+            }
+        }
+
+
+def _validar_lineas(datos) -> list:
+    if not isinstance(datos, dict) or not isinstance(datos.get('lineas'), list) or not datos['lineas']:
+        raise ValueError('El pedido tiene que ser un objeto con una lista "lineas" no vacia')
+    for linea in datos['lineas']:
+        if not isinstance(linea, dict):
+            raise ValueError('Cada linea tiene que ser un objeto')
+        for columna in ['Price', 'Quantity']:
+            if not isinstance(linea.get(columna), (int, float)):
+                raise ValueError(f'Cada linea tiene que tener {columna} numerico')
+    return datos['lineas']
+
+
+async def _responder(writer: asyncio.StreamWriter, estado: int, cuerpo: dict, mantener: bool):
+    datos = json.dumps(cuerpo).encode('utf-8')
+    motivo = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[estado]
+    writer.write(
+        f'HTTP/1.1 {estado} {motivo}\r\nContent-Type: application/json\r\nContent-Length: {len(datos)}\r\n'
+        f'Connection: {"keep-alive" if mantener else "close"}\r\n\r\n'.encode('ascii') + datos
+    )
+    await writer.drain()
+
+
+def crear_manejador(lotes: MicroLotes):
+    """
+    Manejador de conexiones HTTP/1.1 (con keep-alive) para asyncio.start_server.
+    """
+    async def manejar(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                linea_pedido = await reader.readline()
+                if not linea_pedido:
+                    break
+                metodo, ruta, version = linea_pedido.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (linea := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    nombre, _, valor = linea.decode('latin-1').partition(':')
+                    headers[nombre.strip().lower()] = valor.strip()
+                mantener = headers.get('connection', '').lower() != 'close' and version.strip() == 'HTTP/1.1'
+                largo = int(headers.get('content-length', 0))
+                if largo > MAX_BYTES_PEDIDO:
+                    await _responder(writer, 400, {'error': 'Pedido demasiado grande'}, False)
+                    break
+                cuerpo = await reader.readexactly(largo) if largo else b''
+
+                if metodo == 'GET' and ruta == '/metricas':
+                    await _responder(writer, 200, lotes.metricas(), mantener)
+                elif metodo == 'POST' and ruta == '/predecir':
+                    try:
+                        lineas = _validar_lineas(json.loads(cuerpo))
+                    except ValueError as error:
+                        await _responder(writer, 400, {'error': str(error)}, mantener)
+                    else:
+                        try:
+                            probabilidad = await lotes.predecir(lineas)
+                        except Exception as error:
+                            await _responder(writer, 500, {'error': str(error)}, mantener)
+                        else:
+                            await _responder(writer, 200, {'probabilidad': probabilidad}, mantener)
+                else:
+                    await _responder(writer, 404, {'error': f'No existe {metodo} {ruta}'}, mantener)
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return manejar
+
+
+async def servir(predictor: PredictorCarrito, host: str = HOST_DEFAULT, puerto: int = PUERTO_DEFAULT,
+                 max_lote: int = MAX_LOTE_DEFAULT, max_espera: float = MAX_ESPERA_MS_DEFAULT / 1000):
+    """
+    Levanta el servidor y atiende pedidos hasta que se cancela.
+    """
+    lotes = MicroLotes(predictor, max_lote, max_espera)
+    consumidor = asyncio.create_task(lotes.correr())
+    servidor = await asyncio.start_server(crear_manejador(lotes), host, puerto)
+    print(f'Sirviendo el modelo de abandono en http://{host}:{puerto} (max_lote={max_lote}, max_espera={max_espera * 1000:g} ms)')
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        consumidor.cancel()
+
+
+class ClientePredictor:
+    """
+    Cliente del servidor de inferencia, con la misma interfaz que PredictorCarrito.predecir (lo usa el dashboard).
+    """
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def predecir(self, lineas: list) -> float:
+        pedido = urllib.request.Request(
+            f'{self.url}/predecir', data=json.dumps({'lineas': lineas}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        with urllib.request.urlopen(pedido, timeout=self.timeout) as respuesta:
+            return float(json.loads(respuesta.read())['probabilidad'])
+
+    @staticmethod
+    def mensaje_error(error: urllib.error.HTTPError) -> str:
+        """
+        El mensaje que manda el servidor en el cuerpo de una respuesta con error ({"error": ...}), o el motivo HTTP
+        si el cuerpo no es el json del servidor (por ejemplo un proxy en el medio).
+        """
+        try:
+            return json.loads(error.read())['error']
+        except (ValueError, KeyError, TypeError, OSError):
+            return str(error.reason)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de inferencia del modelo de abandono con micro-lotes')
+    parser.add_argument('--host', default=HOST_DEFAULT)
+    parser.add_argument('--puerto', type=int, default=PUERTO_DEFAULT)
+    parser.add_argument('--modelos', default=PATH_MODELOS, help='Directorio del modelo entrenado')
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE_DEFAULT, help='Cantidad maxima de carritos por lote')
+    parser.add_argument('--max-espera-ms', type=float, default=MAX_ESPERA_MS_DEFAULT, help='Espera maxima para juntar un lote')
+    args = parser.parse_args()
+
+    predictor = PredictorCarrito(*cargar_modelo(args.modelos))
+    try:
+        asyncio.run(servir(predictor, args.host, args.puerto, args.max_lote, args.max_espera_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+from prefect.testing.utilities import prefect_test_harness
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def prefect_local():
+    """
+    Una base de Prefect temporal para los tests que corren flows, asi no usan ni ensucian la del usuario.
+    """
+    with prefect_test_harness():
+        yield
@@ -0,0 +1,50 @@
+import hashlib
+import zipfile
+import pytest
+from prefect import flow
+
+from data_engineer import main as etl
+from data_engineer.bronze import FuenteDataset, FuenteLocal, adquirir_dataset
+
+
+CSV = b'TransactionNo,Date,ProductNo\n581482,12/9/2019,22485\n581475,12/9/2019,22596\n'
+
+
+@flow(name='test-adquirir-bronze')
+def adquirir(directorio: str, origen: str) -> tuple:
+    return etl.get_dataset_from_kaggle(directorio, 'no-se-usa/con-origen-local', 'transactions.csv', origen)
+
+
+def test_fuente_sin_implementar_no_se_puede_instanciar():
+    class SinDescargar(FuenteDataset):
+        def version(self) -> str:
+            return '1'
+
+    with pytest.raises(TypeError):
+        SinDescargar()
+
+
+def test_adquirir_desde_zip_y_sin_cambios(tmp_path):
+    with zipfile.ZipFile(tmp_path / 'dataset.zip', 'w') as archivo_zip:
+        archivo_zip.writestr('transactions.csv', CSV)
+    fuente = FuenteLocal(str(tmp_path / 'dataset.zip'))
+
+    resultado = adquirir_dataset(fuente, str(tmp_path / 'bronze'), 'transactions.csv')
+    assert resultado['descargado']
+    assert (tmp_path / 'bronze' / 'transactions.csv').read_bytes() == CSV
+    assert resultado['manifiesto']['sha256'] == hashlib.sha256(CSV).hexdigest()
+
+    # Misma version y mismo archivo publicado: no se vuelve a descargar
+    resultado = adquirir_dataset(fuente, str(tmp_path / 'bronze'), 'transactions.csv')
+    assert not resultado['descargado']
+
+
+@pytest.mark.usefixtures('prefect_local')
+def test_get_dataset_devuelve_el_hash_del_manifiesto(tmp_path):
+    """
+    El flow usa el sha256 del manifiesto para saber si bronze cambio, sin volver a leer el csv.
+    """
+    (tmp_path / 'transactions.csv').write_bytes(CSV)
+    path, hash_bronze = adquirir(str(tmp_path / 'bronze'), str(tmp_path / 'transactions.csv'))
+    assert path == str(tmp_path / 'bronze') + '/transactions.csv'
+    assert hash_bronze == hashlib.sha256(CSV).hexdigest()
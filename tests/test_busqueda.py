@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dashboard.busqueda import IndicePaises, IndiceTransacciones
+
+
+@pytest.fixture(scope='module')
+def transacciones() -> pd.Series:
+    """
+    Numeros de transaccion con filas repetidas y desordenadas, canceladas ('C...') y algun nulo.
+    """
+    rng = np.random.default_rng(11)
+    numeros = (536000 + rng.integers(0, 3000, 20_000)).astype(str).astype(object)
+    canceladas = rng.random(len(numeros)) < 0.1
+    numeros[canceladas] = 'C' + numeros[canceladas]
+    numeros[rng.random(len(numeros)) < 0.001] = None
+    return pd.Series(numeros)
+
+
+@pytest.mark.parametrize('texto', ['', '5', 'C', '53', '999', '6012', 'C5371', '536000', 'C536', '12345678', 'x'])
+def test_buscar_igual_que_contains(transacciones, texto):
+    indice = IndiceTransacciones(transacciones)
+    esperado = np.flatnonzero(transacciones.str.contains(texto, regex=False, na=False).to_numpy(dtype=bool))
+    np.testing.assert_array_equal(indice.buscar(texto), esperado)
+
+
+@pytest.mark.parametrize('texto', ['', '5', 'C', '5371', 'C5380', '538999', '9'])
+def test_buscar_prefijo_igual_que_startswith(transacciones, texto):
+    indice = IndiceTransacciones(transacciones)
+    esperado = np.flatnonzero(transacciones.str.startswith(texto, na=False).to_numpy(dtype=bool))
+    np.testing.assert_array_equal(indice.buscar_prefijo(texto), esperado)
+
+
+def test_indice_paises():
+    # Canceladas (3 filas) y concretadas (5 filas), cada bloque ordenado por pais
+    paises = pd.Series(['France', 'Spain', 'Spain', 'France', 'France', 'Germany', 'Spain', 'Spain'])
+    indice = IndicePaises(paises, filas_canceladas=3)
+
+    assert indice.paises == ['France', 'Germany', 'Spain']
+    assert indice.rango('France') == [(0, 1), (3, 5)]
+    assert indice.rango('Spain', 'canceladas') == [(1, 3)]
+    assert indice.rango('Germany', 'canceladas') == []
+    assert indice.rango('Germany', 'concretadas') == [(5, 6)]
+    assert indice.rango('Italy') == []
+    for pais in indice.paises:
+        posiciones = np.concatenate([np.arange(inicio, fin) for inicio, fin in indice.rango(pais)])
+        np.testing.assert_array_equal(posiciones, np.flatnonzero(paises == pais))
+
+
+def test_indice_paises_sin_ordenar():
+    with pytest.raises(ValueError):
+        IndicePaises(pd.Series(['France', 'Spain', 'France']), filas_canceladas=0)
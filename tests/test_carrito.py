@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dashboard.carrito import Carrito, ItemCarrito
+from ml_developers.features import Vocabulario, construir_matriz
+
+
+def item(cantidad: int, precio: float) -> ItemCarrito:
+    return ItemCarrito('Regency Cakestand', cantidad, precio, 'France', '22423')
+
+
+def test_totales_al_agregar_y_eliminar():
+    carrito = Carrito()
+    claves = [carrito.agregar_item(item(cantidad, precio)) for cantidad, precio in [(2, 1.1), (3, 2.2), (5, 0.3)]]
+    assert len(carrito) == 3
+    assert carrito.calcular_cantidad_total() == 10
+    assert carrito.calcular_total_precio() == pytest.approx(2.2 + 6.6 + 1.5)
+
+    carrito.eliminar_item(claves[1])
+    assert carrito.calcular_cantidad_total() == 7
+    assert carrito.calcular_total_precio() == pytest.approx(3.7)
+    # Eliminar dos veces la misma clave no cambia los totales
+    carrito.eliminar_item(claves[1])
+    assert carrito.calcular_cantidad_total() == 7
+    assert [clave for clave, _ in carrito.obtener_items()] == [claves[0], claves[2]]
+
+
+def test_sin_items_los_totales_vuelven_a_cero_exacto():
+    carrito = Carrito()
+    claves = [carrito.agregar_item(item(1, 0.1)) for _ in range(10)]
+    for clave in claves:
+        carrito.eliminar_item(clave)
+    assert carrito.calcular_total_precio() == 0.0
+    assert carrito.calcular_cantidad_total() == 0
+
+    carrito.agregar_item(item(4, 2.5))
+    carrito.vaciar_carrito()
+    assert len(carrito) == 0
+    assert carrito.calcular_total_precio() == 0.0
+
+
+def test_totales_iguales_a_recorrer_el_carrito():
+    productos = {f'Producto {i}': f'P{i:03d}' for i in range(50)}
+    carrito = Carrito.aleatorio(200, productos, ['France', 'Spain'], semilla=5)
+    for clave, _ in carrito.obtener_items()[::3]:
+        carrito.eliminar_item(clave)
+
+    items = carrito.obtener_carrito()
+    assert carrito.calcular_cantidad_total() == sum(item.cantidad for item in items)
+    assert carrito.calcular_total_precio() == pytest.approx(sum(item.calcular_total() for item in items))
+    assert carrito.lineas() == [item.linea() for item in items]
+
+
+def test_agregar_algo_que_no_es_un_item():
+    with pytest.raises(ValueError):
+        Carrito().agregar_item({'producto': 'Regency Cakestand'})
+
+
+def test_vector_igual_que_construir_matriz():
+    productos = {f'Producto {i}': f'P{i:03d}' for i in range(40)}
+    carrito = Carrito.aleatorio(60, productos, ['France', 'Spain'], semilla=8)
+    # Un producto fuera del vocabulario y una linea sin ProductNo no suman dummies pero si a los agregados
+    carrito.agregar_item(ItemCarrito('Producto nuevo', 2, 3.5, 'France', 'P999'))
+    carrito.agregar_item(ItemCarrito('Producto 1', 1, 1.25, 'France'))
+    lineas = pd.DataFrame(carrito.lineas()).assign(TransactionNo='581000')
+    vocabulario = Vocabulario.desde_lineas(lineas[lineas['ProductNo'] != 'P999'], drop_first=False)
+
+    _, matriz = construir_matriz(lineas, vocabulario)
+    vector = carrito.vector(vocabulario)
+
+    assert vector.shape == (1, vocabulario.cantidad)
+    np.testing.assert_allclose(vector.toarray(), matriz.toarray())
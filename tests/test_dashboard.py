@@ -0,0 +1,231 @@
+import contextlib
+import os
+from unittest import mock
+import pandas as pd
+import pyarrow as pa
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from dashboard.consultas import MotorConsultas
+from dashboard.datos import DatosSilver
+from dashboard.graficos import CacheGraficos
+from data_engineer.clientes import TABLA_CLIENTES, StoreClientes
+from data_engineer.gold import TABLA_PRODUCTOS
+from data_engineer.silver import ESQUEMA_SILVER
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def tocar(path: str):
+    """
+    Adelanta un segundo la fecha de modificacion de path (como si el ETL lo hubiera reescrito) y la restaura al salir.
+    """
+    info = os.stat(path)
+    os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+    try:
+        yield
+    finally:
+        os.utime(path, ns=(info.st_atime_ns, info.st_mtime_ns))
+
+
+def datos_chicos() -> DatosSilver:
+    tabla = pa.Table.from_pandas(pd.DataFrame({
+        'TransactionNo': ['C540001', '540002', '540003'],
+        'Date': pd.to_datetime(['2019-01-01', '2019-01-02', '2019-02-01']),
+        'ProductNo': ['P1', 'P2', 'P1'],
+        'ProductName': ['Uno', 'Dos', 'Uno'],
+        'Price': [1.5, 2.25, 1.5],
+        'Quantity': [-1, 2, 3],
+        'CustomerNo': [12000, 12001, 12000],
+        'Country': ['France', 'France', 'Germany']
+    }), preserve_index=False).cast(ESQUEMA_SILVER)
+    return DatosSilver(tabla, filas_canceladas=1, version='test')
+
+
+def test_sin_modificar_detecta_columnas_agregadas_y_reemplazadas():
+    datos = datos_chicos()
+    assert datos.sin_modificar()
+
+    datos.filtrar_pais('France').assign(Importe=1)
+    datos.buscar_transaccion('54')
+    assert datos.sin_modificar()
+
+    datos.ambas['Importe'] = datos.ambas['Price'] * datos.ambas['Quantity']
+    assert not datos.sin_modificar()
+
+    datos = datos_chicos()
+    datos.concretadas['Price'] = 0.0
+    assert not datos.sin_modificar()
+
+
+@pytest.fixture
+def pagina() -> str:
+    return 'Visualizaciones'
+
+
+@pytest.fixture
+def app(monkeypatch, pagina):
+    """
+    app.py con la pagina elegida en el menu (option_menu es un componente que AppTest no puede clickear),
+    por defecto Visualizaciones. Guarda los DatosSilver que abre la app para revisarlos despues de cada rerun.
+    """
+    monkeypatch.chdir(RAIZ)
+    abiertos = []
+    abrir = DatosSilver.abrir
+
+    def abrir_y_guardar(*args, **kwargs):
+        datos = abrir(*args, **kwargs)
+        abiertos.append(datos)
+        return datos
+
+    monkeypatch.setattr(DatosSilver, 'abrir', abrir_y_guardar)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    with mock.patch('streamlit_option_menu.option_menu', return_value=pagina):
+        yield AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=120), abiertos
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def test_visualizaciones_no_modifican_los_dataframes_compartidos(app):
+    """
+    Recorre los graficos de Visualizaciones con cada opcion de sus filtros (pais de los top productos, y algunos
+    productos del histograma de precios) y verifica que los dataframes compartidos de silver no cambian.
+    """
+    prueba, abiertos = app
+    prueba.run()
+    assert not prueba.exception
+    assert len(abiertos) == 1
+    datos = abiertos[0]
+    assert datos.sin_modificar()
+
+    selector_pais, selector_producto = prueba.selectbox
+    for pais in selector_pais.options[:4]:
+        prueba.selectbox[0].set_value(pais).run()
+        assert not prueba.exception
+        assert datos.sin_modificar()
+    for producto in selector_producto.options[:4]:
+        prueba.selectbox[1].set_value(producto).run()
+        assert not prueba.exception
+        assert datos.sin_modificar()
+
+    # La app no tuvo que volver a cargar los datos (lo hace si encuentra los dataframes modificados)
+    assert len(abiertos) == 1
+
+
+def test_dataframes_modificados_se_vuelven_a_cargar(app):
+    """
+    Si algo modifica los dataframes compartidos la app no falla: los vuelve a cargar en el siguiente rerun.
+    """
+    prueba, abiertos = app
+    prueba.run()
+    abiertos[0].ambas['Importe'] = 0.0
+
+    prueba.run()
+    assert not prueba.exception
+    assert len(abiertos) == 2
+    assert abiertos[1].sin_modificar()
+
+
+def test_datos_nuevos_del_etl_invalidan_las_caches(app, monkeypatch):
+    """
+    Cuando el ETL reescribe silver o gold cambia la version: se vuelven a abrir los datos y los graficos
+    se dibujan con la version nueva, sin reiniciar el proceso.
+    """
+    prueba, abiertos = app
+    versiones = []
+    render = CacheGraficos.render
+
+    def render_y_guardar(self, id_grafico, parametros, version, dibujar, formato='png'):
+        versiones.append(version)
+        return render(self, id_grafico, parametros, version, dibujar, formato)
+
+    monkeypatch.setattr(CacheGraficos, 'render', render_y_guardar)
+    prueba.run()
+    assert len(abiertos) == 1 and len(set(versiones)) == 1
+
+    path_gold = os.path.join(RAIZ, 'data', 'gold', TABLA_PRODUCTOS)
+    path_silver = next(
+        os.path.join(raiz, archivo)
+        for raiz, _, archivos in os.walk(os.path.join(RAIZ, 'data', 'silver', 'transacciones_canceladas.parquet'))
+        for archivo in archivos if archivo.endswith('.parquet')
+    )
+    for path in (path_gold, path_silver):
+        with tocar(path):
+            prueba.run()
+        assert not prueba.exception
+
+    assert len(set(versiones)) == 3
+    # Silver se vuelve a abrir solo cuando cambia silver
+    assert len(abiertos) == 2
+
+
+@pytest.mark.parametrize('pagina', ['Consultas'])
+def test_datos_nuevos_del_etl_invalidan_las_consultas(app, monkeypatch):
+    """
+    Las consultas avanzadas se guardan por la version de silver y de todo gold: reescribir una tabla de gold que
+    el dashboard no carga (el store de clientes) vuelve a abrir el motor y a ejecutar la consulta.
+    """
+    prueba, _ = app
+    llamadas = {'abrir': 0, 'ejecutar': 0}
+    abrir, ejecutar = MotorConsultas.abrir.__func__, MotorConsultas.ejecutar
+
+    def abrir_y_contar(cls, *args, **kwargs):
+        llamadas['abrir'] += 1
+        return abrir(cls, *args, **kwargs)
+
+    def ejecutar_y_contar(self, consulta):
+        llamadas['ejecutar'] += 1
+        return ejecutar(self, consulta)
+
+    monkeypatch.setattr(MotorConsultas, 'abrir', classmethod(abrir_y_contar))
+    monkeypatch.setattr(MotorConsultas, 'ejecutar', ejecutar_y_contar)
+    prueba.run()
+    assert not prueba.exception
+    prueba.run()
+    assert llamadas == {'abrir': 1, 'ejecutar': 1}
+
+    with tocar(os.path.join(RAIZ, 'data', 'gold', TABLA_CLIENTES)):
+        prueba.run()
+    assert not prueba.exception
+    assert llamadas == {'abrir': 2, 'ejecutar': 2}
+
+
+@pytest.mark.skipif(
+    not all(os.path.isdir(os.path.join(RAIZ, 'ml_developers', directorio)) for directorio in ['modelos', 'images']),
+    reason='La pagina del modelo necesita el modelo entrenado y sus graficos (ml_developers/modelos y ml_developers/images)'
+)
+@pytest.mark.parametrize('pagina', ['Resultados del Modelo'])
+def test_store_de_clientes_nuevo_del_etl_se_vuelve_a_abrir(app, monkeypatch):
+    """
+    El historial del cliente sale del store de gold: cuando el ETL lo actualiza se vuelve a abrir, sin reiniciar el proceso.
+    """
+    prueba, _ = app
+    abiertos = []
+    abrir = StoreClientes.abrir.__func__
+
+    def abrir_y_contar(cls, path):
+        abiertos.append(path)
+        return abrir(cls, path)
+
+    monkeypatch.setattr(StoreClientes, 'abrir', classmethod(abrir_y_contar))
+    prueba.run()
+    cliente = int(pd.read_parquet(os.path.join(RAIZ, 'data', 'gold', TABLA_CLIENTES), columns=['CustomerNo'])['CustomerNo'].iloc[0])
+    prueba.number_input[-1].set_value(cliente)
+
+    def predecir():
+        # Cada prediccion vacia el carrito: se agrega un producto y se predice
+        next(boton for boton in prueba.button if boton.label == 'Agregar al carrito').click().run()
+        prueba.button(key='predict').click().run()
+        assert not prueba.exception
+        assert any(f'Cliente {cliente}:' in caption.value for caption in prueba.caption)
+
+    predecir()
+    predecir()
+    assert len(abiertos) == 1
+    with tocar(os.path.join(RAIZ, 'data', 'gold', TABLA_CLIENTES)):
+        predecir()
+    assert len(abiertos) == 2
@@ -0,0 +1,54 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from dashboard.exportar import FORMATOS, exportar
+
+
+@pytest.fixture
+def df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'TransactionNo': ['581482', 'C581484', '581475', '581475', '536365'],
+        'ProductName': ['Regency Cakestand', 'Paper Chain Kit', 'Jumbo Bag "Red"', 'Ñandú, taza', None],
+        'Price': [12.75, 6.19, 2.1, 0.85, np.nan],
+        'Quantity': [12, -6, 10, 3, 1],
+        'Date': pd.to_datetime(['2019-12-09', '2019-12-09', '2019-12-08', '2019-12-08', '2018-12-01'])
+    })
+
+
+@pytest.mark.parametrize('filas_por_chunk', [1, 2, 5, 100])
+def test_csv(df, filas_por_chunk):
+    assert exportar(df, 'CSV', filas_por_chunk) == df.to_csv(index=False).encode('utf-8')
+
+
+@pytest.mark.parametrize('filas_por_chunk', [1, 2, 5, 100])
+def test_json(df, filas_por_chunk):
+    contenido = exportar(df, 'JSON', filas_por_chunk)
+    assert contenido == df.to_json(orient='records').encode('utf-8')
+    assert len(json.loads(contenido)) == len(df)
+
+
+@pytest.mark.parametrize('filas_por_chunk', [1, 2, 5, 100])
+def test_parquet(df, filas_por_chunk):
+    archivo = pq.ParquetFile(io.BytesIO(exportar(df, 'Parquet', filas_por_chunk)))
+    assert archivo.metadata.num_row_groups == -(-len(df) // filas_por_chunk)
+    pd.testing.assert_frame_equal(archivo.read().to_pandas(), df)
+
+
+@pytest.mark.parametrize('formato', list(FORMATOS))
+def test_sin_filas(df, formato):
+    vacio = df.iloc[:0]
+    contenido = exportar(vacio, formato)
+    if formato == 'Parquet':
+        assert pq.read_table(io.BytesIO(contenido)).schema.names == list(df.columns)
+    elif formato == 'JSON':
+        assert json.loads(contenido) == []
+    else:
+        assert contenido == vacio.to_csv(index=False).encode('utf-8')
+
+
+def test_formato_desconocido(df):
+    with pytest.raises(ValueError):
+        exportar(df, 'XLSX')
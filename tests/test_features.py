@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ml_developers.features import COLUMNAS_NUMERICAS, agregados_por_transaccion, agregar
+
+
+def lineas_al_azar(cantidad: int = 2000, semilla: int = 3) -> pd.DataFrame:
+    """
+    Lineas con productos repetidos dentro de la misma transaccion, ProductNo nulos y canceladas (Quantity negativa).
+    """
+    rng = np.random.default_rng(semilla)
+    numeros = rng.integers(0, 150, cantidad)
+    canceladas = numeros % 7 == 0
+    productos = np.array([f'P{producto:02d}' for producto in rng.integers(0, 30, cantidad)], dtype=object)
+    productos[rng.random(cantidad) < 0.05] = None
+    return pd.DataFrame({
+        'TransactionNo': np.where(canceladas, 'C', '') + (560000 + numeros).astype(str),
+        'ProductNo': productos,
+        'Price': np.round(rng.uniform(0.1, 30, cantidad), 2),
+        'Quantity': rng.integers(1, 20, cantidad) * np.where(canceladas, -1, 1)
+    })
+
+
+def agregados_pandas(lineas: pd.DataFrame) -> pd.DataFrame:
+    """
+    El groupby(...).agg del notebook, contra el que se compara agregar.
+    """
+    return (
+        lineas.assign(Quantity=lineas['Quantity'].abs())
+        .groupby('TransactionNo')
+        .agg(total_quantity=('Quantity', 'sum'), unique_products=('ProductNo', 'nunique'),
+             total_price=('Price', 'sum'), average_price=('Price', 'mean'))
+        .reset_index()
+    )
+
+
+def test_agregados_igual_que_groupby():
+    lineas = lineas_al_azar()
+    obtenido = agregados_por_transaccion(lineas)
+    esperado = agregados_pandas(lineas)
+
+    assert obtenido['TransactionNo'].tolist() == esperado['TransactionNo'].tolist()
+    for columna in COLUMNAS_NUMERICAS:
+        np.testing.assert_allclose(obtenido[columna].to_numpy(dtype=np.float64), esperado[columna].to_numpy(dtype=np.float64), err_msg=columna)
+    assert obtenido['Abandonado'].tolist() == esperado['TransactionNo'].str.startswith('C').astype(int).tolist()
+
+
+def test_producto_nulo_no_cuenta_como_producto():
+    lineas = pd.DataFrame({
+        'TransactionNo': ['1', '1', '1', '2', '2'],
+        'ProductNo': ['A', None, 'A', None, None],
+        'Price': [1.0, 2.0, 3.0, 4.0, 6.0],
+        'Quantity': [1, 1, 2, 5, 5]
+    })
+    obtenido = agregados_por_transaccion(lineas).set_index('TransactionNo')
+
+    assert obtenido.loc['1', 'unique_products'] == 1
+    assert obtenido.loc['2', 'unique_products'] == 0
+    # Las lineas sin producto igual suman precio y cantidad
+    assert obtenido.loc['2', 'total_price'] == pytest.approx(10.0)
+    assert obtenido.loc['2', 'average_price'] == pytest.approx(5.0)
+    assert obtenido.loc['2', 'total_quantity'] == 10
+
+
+def test_agregar_codigos_sin_lineas_quedan_en_cero():
+    agregados = agregar(np.array([2, 0, 2]), np.array([0, 1, 1]), np.array([1.0, 2.0, 3.0]), np.array([-1, 4, 2]), 4)
+
+    assert agregados['total_quantity'].tolist() == [4, 0, 3, 0]
+    assert agregados['unique_products'].tolist() == [1, 0, 2, 0]
+    assert agregados['average_price'].tolist() == [2.0, 0.0, 2.0, 0.0]
+
+
+def test_agregar_sin_lineas():
+    agregados = agregar(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), 3)
+    assert all(valores.tolist() == [0, 0, 0] for valores in agregados.values())
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from prefect import flow
+
+from data_engineer import main as etl
+from data_engineer.clientes import TABLA_CLIENTES, leer_store
+from data_engineer.gold import TABLA_TRANSACCIONES
+from data_engineer.incremental import (FiltroMarcaDeAgua, calcular_hash, combinar_marcas, es_formato_anterior, guardar_estado,
+                                       leer_estado, preparar_directorio, quitar_transaccion)
+from data_engineer.silver import concatenar_silver, leer_silver
+from ml_developers.features import TABLA_FEATURES
+
+
+PAISES = ['United Kingdom', 'France', 'Germany']
+
+
+def generar_bronze(transacciones: int = 240, semilla: int = 7) -> pd.DataFrame:
+    """
+    Un csv de bronze chico con el formato del de kaggle, ordenado por fecha y TransactionNo como llega el original
+    (las transacciones nuevas se agregan al final). Tiene canceladas y lineas sin CustomerNo.
+    """
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for i in range(transacciones):
+        fecha = pd.Timestamp('2019-01-01') + pd.Timedelta(days=i // 4)
+        numero = ('C' if rng.random() < 0.15 else '') + str(540000 + i)
+        cliente = float(rng.integers(12000, 12040))
+        pais = PAISES[rng.integers(len(PAISES))]
+        for _ in range(rng.integers(1, 7)):
+            producto = int(rng.integers(20))
+            filas.append({
+                'TransactionNo': numero,
+                'Date': f'{fecha.month}/{fecha.day}/{fecha.year}',
+                'ProductNo': f'P{producto:03d}',
+                'ProductName': f'Producto {producto}',
+                'Price': round(float(rng.uniform(1, 20)), 2),
+                'Quantity': int(rng.integers(1, 12)) * (-1 if numero.startswith('C') else 1),
+                'CustomerNo': np.nan if rng.random() < 0.02 else cliente,
+                'Country': pais
+            })
+    return pd.DataFrame(filas)
+
+
+def corte_dentro_de_transaccion(bronze: pd.DataFrame, fraccion: float) -> int:
+    """
+    Primera fila despues de fraccion del csv que parte una transaccion concretada en dos.
+    """
+    numeros = bronze['TransactionNo'].to_numpy()
+    for corte in range(int(len(bronze) * fraccion), len(bronze)):
+        if numeros[corte] == numeros[corte - 1] and not numeros[corte].startswith('C') and not pd.isna(bronze['CustomerNo'].iloc[corte - 1]):
+            return corte
+    raise AssertionError('No hay ninguna transaccion para partir')
+
+
+@flow(name='test-etl-incremental')
+def correr_etl(path_csv: str, directorio, marca: dict | None, workers: int, chunksize: int | None) -> dict:
+    return etl.procesar_bronze(
+        path_csv, chunksize, marca=marca, workers=workers,
+        path_canceladas=str(directorio / 'silver' / 'transacciones_canceladas.parquet'),
+        path_concretadas=str(directorio / 'silver' / 'transacciones_concretadas.parquet'),
+        path_gold=str(directorio / 'gold'),
+        path_modelos=str(directorio / 'modelos')
+    )
+
+
+def leer_resultado(directorio) -> dict:
+    silver = concatenar_silver([
+        leer_silver(str(directorio / 'silver' / nombre))
+        for nombre in ['transacciones_canceladas.parquet', 'transacciones_concretadas.parquet']
+    ])
+    columnas = list(silver.columns)
+    silver = silver.astype({columna: str for columna in ['ProductNo', 'ProductName', 'Country']})
+    clientes, _ = leer_store(str(directorio / 'gold' / TABLA_CLIENTES))
+    return {
+        'silver': silver.sort_values(columnas, ignore_index=True),
+        'transacciones': pd.read_parquet(directorio / 'gold' / TABLA_TRANSACCIONES),
+        'features': pd.read_parquet(directorio / 'gold' / TABLA_FEATURES).sort_values('TransactionNo', ignore_index=True),
+        'clientes': clientes
+    }
+
+
+def test_filtro_marca_de_agua_incluye_la_transaccion_de_la_marca():
+    bronze = generar_bronze(20)
+    chunk = bronze.assign(CustomerNo=bronze['CustomerNo'].fillna(0))
+    marca = {'fecha': '2019-01-03', 'transaccion': 540009}
+
+    filtrado = FiltroMarcaDeAgua(marca)(chunk)
+
+    assert filtrado['TransactionNo'].str.lstrip('C').astype(int).min() == 540009
+    assert len(filtrado) == (chunk['TransactionNo'].str.lstrip('C').astype(int) >= 540009).sum()
+
+
+def test_combinar_marcas():
+    marcas = [None, {'fecha': '2019-01-02', 'transaccion': 7}, {'fecha': '2019-01-02', 'transaccion': 9}, {'fecha': '2019-01-01', 'transaccion': 99}]
+    assert combinar_marcas(*marcas) == {'fecha': '2019-01-02', 'transaccion': 9}
+    assert combinar_marcas(None, None) is None
+
+
+def escribir_fragmento(path, particion: str, nombre: str, numeros: list):
+    directorio = path / particion
+    directorio.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({'TransactionNo': numeros, 'Quantity': range(len(numeros))}).to_parquet(directorio / f'{nombre}.parquet', index=False)
+
+
+def test_calcular_hash(tmp_path):
+    contenido = os.urandom(3 * 1024 + 17)
+    (tmp_path / 'bronze.csv').write_bytes(contenido)
+    # Con bloques chicos el hash es el mismo que el del contenido completo
+    assert calcular_hash(str(tmp_path / 'bronze.csv'), tamanio_bloque=1000) == hashlib.sha256(contenido).hexdigest()
+
+
+def test_leer_y_guardar_estado(tmp_path):
+    path = str(tmp_path / 'estado.json')
+    assert leer_estado(path) == {}
+    estado = {'hash_bronze': 'abc', 'marca': {'fecha': '2019-01-02', 'transaccion': 9}}
+    guardar_estado(path, estado)
+    assert leer_estado(path) == estado
+    assert os.listdir(tmp_path) == ['estado.json']
+
+
+def test_quitar_transaccion(tmp_path):
+    escribir_fragmento(tmp_path, 'YearMonth=2019-01/Country=France', 'part-00000-0', ['540001', '540002', 'C540002'])
+    escribir_fragmento(tmp_path, 'YearMonth=2019-01/Country=Spain', 'part-00000-0', ['540002'])
+    escribir_fragmento(tmp_path, 'YearMonth=2019-01/Country=Spain', 'part-00001-0', ['540003'])
+    # Otro mes: no se abre aunque tenga el mismo numero
+    escribir_fragmento(tmp_path, 'YearMonth=2019-02/Country=France', 'part-00000-0', ['540002'])
+
+    assert quitar_transaccion(str(tmp_path), {'fecha': '2019-01-31', 'transaccion': 540002}) == 3
+
+    francia = pq.read_table(tmp_path / 'YearMonth=2019-01/Country=France/part-00000-0.parquet')
+    assert francia['TransactionNo'].to_pylist() == ['540001']
+    # El fragmento que queda vacio se borra, los que no tenian la transaccion no se tocan
+    assert sorted(os.listdir(tmp_path / 'YearMonth=2019-01/Country=Spain')) == ['part-00001-0.parquet']
+    assert pq.read_table(tmp_path / 'YearMonth=2019-02/Country=France/part-00000-0.parquet').num_rows == 1
+    assert quitar_transaccion(str(tmp_path), {'fecha': '2019-03-01', 'transaccion': 540002}) == 0
+
+
+def test_preparar_directorio(tmp_path):
+    path = tmp_path / 'transacciones_concretadas.parquet'
+    # Un parquet monolitico del formato anterior se reemplaza por el directorio
+    path.write_bytes(b'PAR1')
+    assert preparar_directorio(str(path), vaciar=False) == 'part-00000'
+    assert path.is_dir()
+
+    escribir_fragmento(path, 'YearMonth=2019-01/Country=France', 'part-00000-0', ['540001', '540002'])
+    escribir_fragmento(path, 'YearMonth=2019-01/Country=Spain', 'part-00003-1', ['540003'])
+    marca = {'fecha': '2019-01-05', 'transaccion': 540002}
+    assert preparar_directorio(str(path), vaciar=False, marca=marca) == 'part-00004'
+    assert pq.read_table(path / 'YearMonth=2019-01/Country=France/part-00000-0.parquet')['TransactionNo'].to_pylist() == ['540001']
+
+    assert preparar_directorio(str(path), vaciar=True, marca=marca) == 'part-00000'
+    assert os.listdir(path) == []
+
+
+def test_preparar_directorio_no_borra_el_formato_anterior_con_marca(tmp_path):
+    path = tmp_path / 'transacciones_concretadas.parquet'
+    path.write_bytes(b'PAR1')
+    assert es_formato_anterior(str(tmp_path / 'transacciones_canceladas.parquet'), str(path))
+    # Con marca de agua se perderian las filas anteriores a la marca
+    with pytest.raises(ValueError):
+        preparar_directorio(str(path), vaciar=False, marca={'fecha': '2019-01-05', 'transaccion': 540002})
+    assert path.read_bytes() == b'PAR1'
+
+
+@pytest.mark.usefixtures('prefect_local')
+@pytest.mark.parametrize('workers, chunksize', [(1, None), (4, None), (4, 150)])
+def test_incremental_igual_a_reconstruir(tmp_path, workers, chunksize):
+    """
+    Una ejecucion sobre el 60% del csv (cortado a la mitad de una transaccion) y una incremental sobre el csv
+    completo dejan silver y gold igual que una reconstruccion completa: las lineas de la transaccion de la marca
+    que llegan despues no se pierden ni se duplican.
+    """
+    bronze = generar_bronze()
+    corte = corte_dentro_de_transaccion(bronze, 0.6)
+    bronze.iloc[:corte].to_csv(tmp_path / 'parcial.csv', index=False)
+    bronze.to_csv(tmp_path / 'completo.csv', index=False)
+
+    marca = correr_etl(str(tmp_path / 'parcial.csv'), tmp_path / 'incremental', None, workers, chunksize)
+    assert marca['transaccion'] == int(bronze['TransactionNo'].iloc[corte].lstrip('C'))
+    marca = correr_etl(str(tmp_path / 'completo.csv'), tmp_path / 'incremental', marca, workers, chunksize)
+    # Otra ejecucion incremental sin filas nuevas solo vuelve a escribir la transaccion de la marca
+    correr_etl(str(tmp_path / 'completo.csv'), tmp_path / 'incremental', marca, workers, chunksize)
+    correr_etl(str(tmp_path / 'completo.csv'), tmp_path / 'completo', None, workers, chunksize)
+
+    incremental, completo = leer_resultado(tmp_path / 'incremental'), leer_resultado(tmp_path / 'completo')
+    pd.testing.assert_frame_equal(incremental['silver'], completo['silver'])
+    pd.testing.assert_frame_equal(incremental['transacciones'], completo['transacciones'])
+    pd.testing.assert_frame_equal(incremental['features'], completo['features'])
+    pd.testing.assert_frame_equal(incremental['clientes'], completo['clientes'])
+
+
+@pytest.mark.usefixtures('prefect_local')
+@pytest.mark.parametrize('workers', [1, 4])
+def test_incremental_sobre_el_formato_anterior_reprocesa_todo(tmp_path, workers):
+    """
+    Si silver quedo en un solo archivo por dataset (formato anterior) la ejecucion incremental ignora la marca
+    y reprocesa todo el bronze, en lugar de borrar el archivo y quedarse solo con las filas posteriores a la marca.
+    """
+    bronze = generar_bronze()
+    corte = corte_dentro_de_transaccion(bronze, 0.6)
+    bronze.iloc[:corte].to_csv(tmp_path / 'parcial.csv', index=False)
+    bronze.to_csv(tmp_path / 'completo.csv', index=False)
+
+    marca = correr_etl(str(tmp_path / 'parcial.csv'), tmp_path / 'incremental', None, workers, None)
+    path_concretadas = tmp_path / 'incremental' / 'silver' / 'transacciones_concretadas.parquet'
+    monolitico = leer_silver(str(path_concretadas))
+    shutil.rmtree(path_concretadas)
+    monolitico.to_parquet(path_concretadas, index=False)
+
+    correr_etl(str(tmp_path / 'completo.csv'), tmp_path / 'incremental', marca, workers, None)
+    correr_etl(str(tmp_path / 'completo.csv'), tmp_path / 'completo', None, workers, None)
+
+    assert path_concretadas.is_dir()
+    incremental, completo = leer_resultado(tmp_path / 'incremental'), leer_resultado(tmp_path / 'completo')
+    pd.testing.assert_frame_equal(incremental['silver'], completo['silver'])
+    pd.testing.assert_frame_equal(incremental['clientes'], completo['clientes'])
+
+
+def archivos_silver(directorio) -> list:
+    return sorted(
+        os.path.relpath(os.path.join(raiz, archivo), directorio / 'silver')
+        for raiz, _, archivos in os.walk(directorio / 'silver') for archivo in archivos if archivo.endswith('.parquet')
+    )
+
+
+@pytest.mark.usefixtures('prefect_local')
+def test_paralelo_deja_los_mismos_archivos_que_en_serie(tmp_path):
+    """
+    Los fragmentos que escriben los chunks en paralelo se compactan: queda un archivo por particion, con los mismos
+    nombres y las mismas filas (en el mismo orden) que escribiendo en serie.
+    """
+    generar_bronze().to_csv(tmp_path / 'bronze.csv', index=False)
+    correr_etl(str(tmp_path / 'bronze.csv'), tmp_path / 'serie', None, 1, None)
+    correr_etl(str(tmp_path / 'bronze.csv'), tmp_path / 'paralelo', None, 4, 150)
+
+    archivos = archivos_silver(tmp_path / 'serie')
+    assert archivos_silver(tmp_path / 'paralelo') == archivos
+    for archivo in archivos:
+        assert pq.read_table(tmp_path / 'paralelo' / 'silver' / archivo).equals(pq.read_table(tmp_path / 'serie' / 'silver' / archivo))
@@ -0,0 +1,66 @@
+import threading
+import time
+import pytest
+from data_engineer.metricas import REGISTRO, a_prometheus, instrumentar, resumir, segundos_de_pared
+
+
+@instrumentar
+def calcular(segundos: float):
+    fin = time.thread_time() + segundos
+    while time.thread_time() < fin:
+        pass
+
+
+@instrumentar
+def esperar(segundos: float, empezo: threading.Event):
+    empezo.set()
+    time.sleep(segundos)
+
+
+def correr_juntas() -> list:
+    """
+    Una etapa que solo espera y otra que usa CPU, al mismo tiempo en dos threads.
+    """
+    REGISTRO.extraer(None)
+    empezo = threading.Event()
+    thread = threading.Thread(target=esperar, args=(0.6, empezo))
+    thread.start()
+    empezo.wait()
+    calcular(0.3)
+    thread.join()
+    return [etapa.a_dict() for etapa in REGISTRO.extraer(None)]
+
+
+def test_cpu_por_thread_y_concurrencia():
+    etapas = {etapa['etapa']: etapa for etapa in correr_juntas()}
+
+    # El CPU de la etapa que calcula no se le cuenta a la que espera
+    assert etapas['esperar']['cpu_segundos'] < 0.1
+    assert etapas['calcular']['cpu_segundos'] == pytest.approx(0.3, abs=0.1)
+    assert etapas['esperar']['concurrencia'] == etapas['calcular']['concurrencia'] == 2
+    assert etapas['esperar']['rss_proceso_pico_bytes'] > 0
+
+    calcular(0.01)
+    assert REGISTRO.extraer(None)[0].concurrencia == 1
+
+
+def test_segundos_de_pared_no_suma_ejecuciones_superpuestas():
+    ejecuciones = [
+        {'etapa': 'write_chunk_to_silver', 'inicio': '2024-01-01T00:00:00.000+00:00', 'segundos': 4.0},
+        {'etapa': 'write_chunk_to_silver', 'inicio': '2024-01-01T00:00:01.000+00:00', 'segundos': 4.0},
+        {'etapa': 'write_chunk_to_silver', 'inicio': '2024-01-01T00:00:10.000+00:00', 'segundos': 2.0},
+    ]
+    assert segundos_de_pared(ejecuciones) == pytest.approx(7.0)
+
+    resumen = resumir([{**ejecucion, 'cpu_segundos': 1.0, 'concurrencia': i + 1} for i, ejecucion in enumerate(ejecuciones)])
+    assert resumen[0]['ejecuciones'] == 3
+    assert resumen[0]['segundos'] == pytest.approx(7.0)
+    assert resumen[0]['cpu_segundos'] == pytest.approx(3.0)
+    assert resumen[0]['concurrencia'] == 3
+    assert resumen[0]['filas_entrada'] is None
+
+
+def test_prometheus():
+    texto = a_prometheus(correr_juntas(), {'flow': 'etl'})
+    assert '# HELP etl_etapa_rss_proceso_pico_bytes Memoria residente maxima de todo el proceso' in texto
+    assert 'etl_etapa_concurrencia{flow="etl",etapa="esperar"} 2' in texto
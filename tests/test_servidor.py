@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import urllib.error
+import pytest
+from ml_developers.servidor import ClientePredictor, MicroLotes, crear_manejador
+
+
+class PredictorFijo:
+    """
+    Predictor de prueba: devuelve 0.25 por carrito, o falla si alguna linea tiene Quantity 0.
+    """
+    def predecir_lote(self, carritos: list) -> list:
+        if any(linea['Quantity'] == 0 for lineas in carritos for linea in lineas):
+            raise ValueError('Quantity no puede ser 0')
+        return [0.25] * len(carritos)
+
+
+@pytest.fixture
+def url():
+    """
+    Levanta el servidor en un puerto libre en un thread aparte y devuelve su url.
+    """
+    loop = asyncio.new_event_loop()
+    listo = threading.Event()
+    estado = {}
+
+    async def levantar():
+        lotes = MicroLotes(PredictorFijo(), max_espera=0)
+        estado['consumidor'] = asyncio.create_task(lotes.correr())
+        estado['servidor'] = await asyncio.start_server(crear_manejador(lotes), '127.0.0.1', 0)
+        estado['puerto'] = estado['servidor'].sockets[0].getsockname()[1]
+        listo.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(levantar()), loop.run_forever()), daemon=True)
+    thread.start()
+    listo.wait(10)
+    yield f'http://127.0.0.1:{estado["puerto"]}'
+
+    async def bajar():
+        estado['consumidor'].cancel()
+        estado['servidor'].close()
+    asyncio.run_coroutine_threadsafe(bajar(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+def linea(cantidad: int = 1) -> dict:
+    return {'ProductNo': '22423', 'ProductName': 'Regency Cakestand', 'Country': 'France', 'Price': 12.75, 'Quantity': cantidad}
+
+
+def test_predecir(url):
+    assert ClientePredictor(url).predecir([linea()]) == 0.25
+
+
+@pytest.mark.parametrize('lineas, codigo, mensaje', [
+    ([], 400, 'El pedido tiene que ser un objeto con una lista "lineas" no vacia'),
+    ([linea(0)], 500, 'Quantity no puede ser 0')
+])
+def test_el_error_del_servidor_llega_al_cliente(url, lineas, codigo, mensaje):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        ClientePredictor(url).predecir(lineas)
+    assert error.value.code == codigo
+    assert ClientePredictor.mensaje_error(error.value) == mensaje
+
+
+def test_sin_servidor_es_un_error_de_conexion():
+    # Un puerto donde no escucha nadie: OSError pero no HTTPError (el dashboard los muestra distinto)
+    with pytest.raises(OSError) as error:
+        ClientePredictor('http://127.0.0.1:9', timeout=1).predecir([linea()])
+    assert not isinstance(error.value, urllib.error.HTTPError)
@@ -0,0 +1,48 @@
+import os
+import pandas as pd
+import pytest
+
+from data_engineer.silver import escribir_canceladas_y_concretadas, hash_silver, leer_silver, version_silver
+
+
+def escribir(directorio, precios) -> tuple:
+    chunk = pd.DataFrame({
+        'TransactionNo': ['C540001', '540002', '540003'],
+        'Date': ['1/1/2019', '1/2/2019', '2/1/2019'],
+        'ProductNo': ['P1', 'P2', 'P1'],
+        'ProductName': ['Uno', 'Dos', 'Uno'],
+        'Price': precios,
+        'Quantity': [-1, 2, 3],
+        'CustomerNo': [12000, 12001, 12000],
+        'Country': ['France', 'France', 'Germany']
+    })
+    paths = str(directorio / 'canceladas.parquet'), str(directorio / 'concretadas.parquet')
+    escribir_canceladas_y_concretadas([chunk], *paths)
+    return paths
+
+
+def test_price_no_pierde_precision(tmp_path):
+    precios = [1234567.89, 0.01, 99999.99]
+    _, path_concretadas = escribir(tmp_path, precios)
+    assert leer_silver(path_concretadas)['Price'].tolist() == precios[1:]
+
+
+def test_hash_silver_depende_del_contenido_y_no_de_las_fechas(tmp_path):
+    paths = escribir(tmp_path / 'a', [1.5, 2.25, 1.5])
+    hash_inicial, version_inicial = hash_silver(*paths), version_silver(*paths)
+
+    for raiz, _, archivos in os.walk(paths[1]):
+        for archivo in archivos:
+            info = os.stat(os.path.join(raiz, archivo))
+            os.utime(os.path.join(raiz, archivo), ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+    assert hash_silver(*paths) == hash_inicial
+    assert version_silver(*paths) != version_inicial
+
+    # Los mismos datos en otro directorio tienen el mismo hash, otros datos no
+    assert hash_silver(*escribir(tmp_path / 'b', [1.5, 2.25, 1.5])) == hash_inicial
+    assert hash_silver(*escribir(tmp_path / 'c', [1.5, 2.5, 1.5])) != hash_inicial
+
+
+def test_dataset_inexistente(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        hash_silver(str(tmp_path / 'no-existe.parquet'))